@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+#############################################################################
+# This script measures how Combine-Convert-Full.crl.python2.py and Fix-SQUID-Data.crl.python2_v2.py scale. It writes a synthetic site
+# in the .sam / sample / .jr6 / .txt formats these scripts read, times the parsing, merging/sorting, rotation and writing stages
+# separately, and then times both scripts end to end on copies of the site. Results are reported as samples per second and peak memory.
+
+  # Note: Run "python Benchmark-Combine-Fix.crl.python2.py --help" for the options. See the READ ME for details.
+  # Note: Rotation times need numpy, as Fix-SQUID-Data does. Peak memory is not available on Windows.
+
+# Script written by Casey Luskin.
+# For support, please contact Casey Luskin at caseyl@uj.ac.za or casey.luskin@gmail.com
+#
+#############################################################################
+
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+import argparse
+import subprocess
+import imp
+import csv
+try:
+    import resource   # Unix only
+except ImportError:
+    resource = None
+
+scriptdir = os.path.dirname(os.path.realpath(__file__))
+combinescript = os.path.join(scriptdir, "Combine-Convert-Full.crl.python2.py")
+fixscript = os.path.join(scriptdir, "Fix-SQUID-Data.crl.python2_v2.py")
+datafilesmodule = os.path.join(scriptdir, "datafiles.py")
+
+benchsitename = "BENCH"
+
+####################### SYNTHETIC SITES #######################
+
+def samplenames(sitename, samplecount):
+    """ Returns the names of the samples of a synthetic site: SITE0001A, SITE0002A, ... """
+    return(["%s%04dA" % (sitename, samplenum) for samplenum in range(1, samplecount + 1)])
+
+def splitmix(samplecount, mix):
+    """
+    Splits samplecount into Squid-only, Spinner-only and combined samples in the proportions
+    given by mix, a (squid, spinner, both) tuple of weights.
+    """
+    totalweight = float(sum(mix))
+    squidcount = int(round(samplecount * mix[0] / totalweight))
+    spinnercount = int(round(samplecount * mix[1] / totalweight))
+    spinnercount = min(spinnercount, samplecount - squidcount)
+    return(squidcount, spinnercount, samplecount - squidcount - spinnercount)
+
+def squidsteps(stepcount):
+    """ Returns stepcount Squid step names: NRM, then AF steps, then thermal steps """
+    afcount = stepcount // 2
+    steps = ["NRM"] + ["AF%4d" % (5 * stepnum) for stepnum in range(1, afcount)]
+    steps = steps + ["TT%4d" % (100 + 20 * stepnum) for stepnum in range(stepcount - len(steps))]
+    return(steps)
+
+def spinnersteps(stepcount):
+    """ Returns stepcount Spinner step names as they appear in .jr6 and .txt files: NRM, AF5, T120, ... """
+    steps = ["NRM"]
+    for stepnum in range(1, stepcount):
+        if stepnum % 2:
+            steps.append("AF%d" % (5 * stepnum))
+        else:
+            steps.append("T%d" % (100 + 10 * stepnum))
+    return(steps)
+
+def writesyntheticsite(dirpath, sitename, samplecount, stepcount, mix, seed):
+    """
+    Writes a synthetic site into dirpath: SITE.sam and one RAPID sample file for every sample with Squid data,
+    and SITE.jr6 and SITE.txt with the steps of every sample with Spinner data. Returns the number of samples
+    of each kind as a (squid, spinner, both) tuple.
+    """
+    rand = random.Random(seed)
+    squidcount, spinnercount, bothcount = splitmix(samplecount, mix)
+    names = samplenames(sitename, samplecount)
+    squidnames = names[:squidcount + bothcount]
+    spinnernames = names[squidcount:]
+    if not(os.path.isdir(dirpath)):
+        os.makedirs(dirpath)
+
+    samfile = open(os.path.join(dirpath, sitename + ".sam"),'w')
+    samfile.write(sitename + "\n" + " -25.5  28.1   2.0\n" + "".join([name + "\n" for name in squidnames]))
+    samfile.close()
+
+    for name in squidnames:
+        samplelines = [name + " synthetic\n", "      0%6.1f%6.1f%6.1f%6.1f   1.0\n" % (rand.uniform(0, 359.9), rand.uniform(0, 89.9), rand.uniform(0, 359.9), rand.uniform(0, 89.9))]
+        for step in squidsteps(stepcount):
+            samplelines.append("%-6s%6.1f%6.1f%6.1f%6.1f%9.2E%6.1f%6.1f%6.1f 1.2E-07 3.4E-07 5.6E-07 SQUID\n" % (step, rand.uniform(0, 359.9), rand.uniform(-89.9, 89.9), rand.uniform(0, 359.9), rand.uniform(-89.9, 89.9),
+                                                                                                         rand.uniform(1e-6, 9e-4), rand.uniform(0, 9.9), rand.uniform(0, 359.9), rand.uniform(-89.9, 89.9)))
+        samplefile = open(os.path.join(dirpath, name),'w')
+        samplefile.write("".join(samplelines))
+        samplefile.close()
+
+    jr6lines = []
+    txtlines = []
+    for name in spinnernames:
+        for step in spinnersteps(stepcount):
+            jr6lines.append("%-41s%03d %03d %03d %03d\n" % ("%-10s %s" % (name, step), rand.randint(0, 359), rand.randint(0, 89), rand.randint(0, 359), rand.randint(0, 89)))
+            txtlines.append("\n%s  Rema6  %s\n" % (name, step))
+            txtlines.extend(["-\n"] * 11)
+            txtlines.append("Modulus  %.1f  E-05A/m  Prec.  %.1f%%\n" % (rand.uniform(100, 99999), rand.uniform(0, 9.9)))
+            txtlines.extend(["-\n"] * 3)
+            txtlines.append("SPEC.  D/I  %.1f  %.1f\n" % (rand.uniform(0, 359.9), rand.uniform(-89.9, 89.9)))
+            txtlines.append("GEOGR.S.  %.1f  %.1f\n" % (rand.uniform(0, 359.9), rand.uniform(-89.9, 89.9)))
+            txtlines.append("TILT C.  %.1f  %.1f\n" % (rand.uniform(0, 359.9), rand.uniform(-89.9, 89.9)))
+            txtlines.extend(["-\n"] * 3)
+    jr6file = open(os.path.join(dirpath, sitename + ".jr6"),'w')
+    jr6file.write("".join(jr6lines))
+    jr6file.close()
+    txtfile = open(os.path.join(dirpath, sitename + ".txt"),'w')
+    txtfile.write("".join(txtlines))
+    txtfile.close()
+    return((squidcount, spinnercount, bothcount))
+
+####################### MEASURING #######################
+
+def peakmemory():
+    """ Returns the peak resident memory of this process so far in MB, or None where it cannot be measured """
+    if resource == None:
+        return(None)
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":   # bytes on Mac, kB elsewhere
+        return(maxrss / 1048576.0)
+    return(maxrss / 1024.0)
+
+def loadfixprocedures():
+    """
+    Returns the functions of Fix-SQUID-Data as a dictionary, without running the program itself:
+    everything above its "# Program:" line is procedures.
+    """
+    source = open(fixscript,'r').read()
+    procedures = {"__name__":"fixsquid", "__file__":fixscript}
+    exec(compile(source.split("\n# Program:", 1)[0], fixscript, 'exec'), procedures)
+    return(procedures)
+
+class Stopwatch:
+    def __init__(watch, repeats):
+        watch.repeats = repeats
+        watch.results = []   # (stage, seconds, peak memory in MB)
+        return
+    def measure(watch, stage, function):  # Runs function repeats times and keeps the best time; returns its last result.
+        besttime = None
+        for repeat in range(watch.repeats):
+            starttime = time.time()
+            result = function()
+            elapsed = time.time() - starttime
+            if (besttime == None) or (elapsed < besttime):
+                besttime = elapsed
+        watch.results.append((stage, besttime, peakmemory()))
+        return(result)
+
+def runscript(script, sitedir, arguments, answers, donetext):
+    """
+    Runs a script on the site in sitedir with the given command line arguments and answers to its prompts.
+    Returns whether its output contained donetext, the elapsed time and the peak memory of the script in MB
+    (None where not available). The scripts end normally even when a site fails, so the exit code says little.
+    """
+    outfile = tempfile.TemporaryFile()
+    starttime = time.time()
+    process = subprocess.Popen([sys.executable, script] + arguments, cwd=sitedir, stdin=subprocess.PIPE, stdout=outfile, stderr=subprocess.STDOUT)
+    process.stdin.write(answers)
+    process.stdin.close()
+    if hasattr(os, "wait4"):
+        pid, status, usage = os.wait4(process.pid, 0)
+        elapsed = time.time() - starttime
+        process.returncode = status
+        if sys.platform == "darwin":
+            peak = usage.ru_maxrss / 1048576.0
+        else:
+            peak = usage.ru_maxrss / 1024.0
+    else:
+        process.wait()
+        elapsed = time.time() - starttime
+        peak = None
+    outfile.seek(0)
+    done = donetext in outfile.read()
+    outfile.close()
+    return(done, elapsed, peak)
+
+####################### STAGES #######################
+
+def benchstages(sitedir, outdir, watch):  # Times each stage of the pipeline in this process, using the code of the two scripts.
+    combine = imp.load_source("combineconvert", combinescript)
+    combine.batchmode = True   # no prompts
+    fix = loadfixprocedures()
+
+    samname = os.path.join(sitedir, benchsitename + ".sam")
+    squidnames = [line.strip() for line in open(samname,'r').readlines()[2:] if line.strip()]
+    jr6index = combine.indexjr6file(os.path.join(sitedir, benchsitename + ".jr6"))
+    allnames = sorted(set(squidnames) | set(jr6index))
+
+    def parse():
+        sampledata = {}
+        for name in squidnames:
+            sampledata[name] = combine.readsamplefile(os.path.join(sitedir, name))
+        combine.indexjr6file(os.path.join(sitedir, benchsitename + ".jr6"))
+        txttuples, txtflags = combine.readtxtfile(os.path.join(sitedir, benchsitename + ".txt"), benchsitename, allnames)
+        return(sampledata, txttuples)
+
+    def merge():
+        merged = {}
+        for name in allnames:
+            steps = []
+            if name in sampledata:
+                steps.extend([combine.Measurement(*steptuple) for dataline, steptuple in sampledata[name][2] if steptuple != None])
+            steps.extend([combine.Measurement(*steptuple) for steptuple in txttuples.get(name, [])])
+            steps.sort(key = lambda step: step.sortkey)
+            merged[name] = steps
+        return(merged)
+
+    def rotate():
+        coreplatestrike = []
+        coreplatedip = []
+        sitestrike = []
+        sitedip = []
+        coredec = []
+        coreinc = []
+        for name in squidnames:
+            header = combine.sampleheaderformat.parse(sampledata[name][1])
+            for step in merged[name]:
+                if step.source == "Squid":
+                    coreplatestrike.append(float(header["coreplatestrike"]))
+                    coreplatedip.append(float(header["coreplatedip"]))
+                    sitestrike.append(float(header["beddingstrike"]))
+                    sitedip.append(float(header["beddingdip"]))
+                    coredec.append(step.coredec)
+                    coreinc.append(-step.coreinc)
+        np = fix["np"]
+        return(fix["rotatesite"](np.array(coreplatestrike), np.array(coreplatedip), np.array(sitestrike), np.array(sitedip), np.array(coredec), np.array(coreinc)))
+
+    def write():
+        for name in allnames:
+            samplefile = open(os.path.join(outdir, name),'w')
+            samplefile.write(name + "\n" + combine.sampleheaderformat.format(("0", 123.4, 45.6, 210.0, 12.0, "1.0")) + "".join([step.dataline for step in merged[name]]))
+            samplefile.close()
+
+    savedstdout = sys.stdout
+    sys.stdout = open(os.devnull,'w')   # the parsers print notes about the data
+    try:
+        sampledata, txttuples = watch.measure("parse", parse)
+        merged = watch.measure("merge/sort", merge)
+        if "np" in fix:
+            watch.measure("rotation", rotate)
+        watch.measure("write", write)
+    finally:
+        sys.stdout.close()
+        sys.stdout = savedstdout
+
+def benchscripts(sitedir, workdir, watch):  # Times both scripts end to end, each run on a fresh copy of the site.
+    combinetimes = []
+    fixtimes = []
+    for repeat in range(watch.repeats):
+        rundir = os.path.join(workdir, "run%s" % repeat)
+        shutil.copytree(sitedir, rundir)
+        for script in [combinescript, fixscript, datafilesmodule]:   # run copies, so that backups made next to the scripts stay in rundir
+            shutil.copy(script, rundir)
+        combinetimes.append(runscript(os.path.join(rundir, os.path.basename(combinescript)), rundir, ["--site", benchsitename], "", "1 sites converted"))
+        fixtimes.append(runscript(os.path.join(rundir, os.path.basename(fixscript)), rundir, [], benchsitename + "\nn\nn\n\n", "Program Complete"))
+        shutil.rmtree(rundir)
+    for stage, times in [("Combine-Convert (end to end)", combinetimes), ("Fix-SQUID (end to end)", fixtimes)]:
+        if not(all([done for done, elapsed, peak in times])):
+            print('\n' + "WARNING: %s did not finish converting the synthetic site; its time is not meaningful." % stage)
+        besttime, peak = min([(elapsed, peak) for done, elapsed, peak in times])
+        watch.results.append((stage, besttime, peak))
+
+def printresults(watch, samplecount):
+    print("\n%-32s %10s %14s %14s" % ("Stage", "Seconds", "Samples/sec", "Peak MB"))
+    for stage, seconds, peak in watch.results:
+        if seconds > 0:
+            rate = "%.1f" % (samplecount / seconds)
+        else:
+            rate = "-"
+        if peak == None:
+            peakstr = "n/a"
+        else:
+            peakstr = "%.1f" % peak
+        print("%-32s %10.3f %14s %14s" % (stage, seconds, rate, peakstr))
+
+def saveresults(csvname, watch, samplecount, stepcount, mixcounts):  # Appends one row per stage to a CSV file, so runs can be compared over time.
+    newfile = not(os.path.isfile(csvname))
+    csvfile = open(csvname,'ab')
+    writer = csv.writer(csvfile)
+    if newfile:
+        writer.writerow(["date", "samples", "steps", "squid", "spinner", "both", "stage", "seconds", "samples/sec", "peak MB"])
+    date = time.strftime("%Y-%m-%d %H:%M:%S")
+    for stage, seconds, peak in watch.results:
+        rate = ""
+        if seconds > 0:
+            rate = "%.1f" % (samplecount / seconds)
+        writer.writerow([date, samplecount, stepcount, mixcounts[0], mixcounts[1], mixcounts[2], stage, "%.4f" % seconds, rate, "" if peak == None else "%.1f" % peak])
+    csvfile.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Times Combine-Convert and Fix-SQUID on a synthetic site.")
+    parser.add_argument("--samples", metavar="N", type=int, default=200, help="number of samples in the synthetic site (default: 200)")
+    parser.add_argument("--steps", metavar="N", type=int, default=20, help="number of demag steps per sample and instrument (default: 20)")
+    parser.add_argument("--mix", metavar="SQUID:SPINNER:BOTH", default="2:1:1", help="proportions of Squid-only, Spinner-only and combined samples (default: 2:1:1)")
+    parser.add_argument("--repeat", metavar="N", type=int, default=3, help="times each stage is run; the best time is kept (default: 3)")
+    parser.add_argument("--seed", metavar="N", type=int, default=1, help="seed for the synthetic data (default: 1)")
+    parser.add_argument("--stages-only", action="store_true", help="skip the end to end runs of the two scripts")
+    parser.add_argument("--keep", metavar="FOLDER", help="write the synthetic site to FOLDER and keep it")
+    parser.add_argument("--csv", metavar="FILE", help="append the results to a CSV file")
+    args = parser.parse_args()
+
+    try:
+        mix = tuple([float(weight) for weight in args.mix.split(":")])
+        if len(mix) != 3 or min(mix) < 0 or sum(mix) == 0:
+            raise ValueError
+    except ValueError:
+        parser.error("--mix must be three non-negative numbers such as 2:1:1")
+    if args.samples < 1 or args.steps < 2 or args.repeat < 1:
+        parser.error("--samples and --repeat must be at least 1, --steps at least 2")
+
+    workdir = tempfile.mkdtemp(prefix="benchsite")
+    try:
+        if args.keep:
+            sitedir = os.path.abspath(args.keep)
+        else:
+            sitedir = os.path.join(workdir, "site")
+        mixcounts = writesyntheticsite(sitedir, benchsitename, args.samples, args.steps, mix, args.seed)
+        print('\n' + "Synthetic site %s written to %s: %s Squid-only, %s Spinner-only and %s combined samples, %s steps each." % ((benchsitename, sitedir) + mixcounts + (args.steps,)))
+
+        outdir = os.path.join(workdir, "out")
+        os.makedirs(outdir)
+        watch = Stopwatch(args.repeat)
+        benchstages(sitedir, outdir, watch)
+        if not(args.stages_only):
+            benchscripts(sitedir, workdir, watch)
+        printresults(watch, args.samples)
+        if args.csv:
+            saveresults(args.csv, watch, args.samples, args.steps, mixcounts)
+            print('\n' + "Results appended to %s." % args.csv)
+    finally:
+        shutil.rmtree(workdir)
@@ -6,6 +6,7 @@
 
   # Note: This program appends a "p" at the end of the name of any Spinner steps.
   # Note: This program uses site dec of 0.0 and uses data that forces all sample declinations to zero. See flowchart for details. 
+  # Note: Run with --batch FOLDER to convert every site found under FOLDER in parallel. See the READ ME for details.
 
 # Script mostly written by Casey Luskin based upon an original core written by Michiel de Kock
 # For support, please contact Casey Luskin at caseyl@uj.ac.za or casey.luskin@gmail.com
@@ -13,213 +14,52 @@
 #############################################################################
 
 import os
-import re
 import sys
-from shutil import copy
-
+import argparse
+import csv
+import json
+import multiprocessing
+from StringIO import StringIO
+from datafiles import loadbackupindex, savebackupindex, nextbackupdirname, backupfiles
+from datafiles import Measurement, parsestepname, readrapidstep, measurementtuple
+from datafiles import loadsitecache, savesitecache, cachedparse, storecachedparse, readsamplefile
+from datafiles import samsitelineformat, sampleheaderformat, squidstepformat, spinnerstepformat, jr6orientationformat
+
+scriptdir = os.path.dirname(os.path.realpath(__file__)) # the backup folders are kept next to this script
 postfix = ['th','st','nd','rd','th','th','th','th','th','th']
-stepsort_dict = {'NRM':1, 'AF':2, 'TT':3}
-
-os.system('mode con: cols=150 lines=60')
-scriptdir = os.path.dirname(os.path.realpath(__file__))
-
-backupdirnum = 0 # Calculate Backup Dir Name
-for root, dirs, files in os.walk(scriptdir, topdown=False):
-    for name in dirs:
-        if "Backup" in name:
-            newbackupnum_str = re.sub('[^0-9]', "", name)
-            if (newbackupnum_str != ''):
-                newbackupnum = int(newbackupnum_str)
-                if newbackupnum > backupdirnum:
-                    backupdirnum = newbackupnum
-backupdirnum = backupdirnum + 1
-backupdirnum_str = str(backupdirnum)
-backupdirname = "Backup" + backupdirnum_str
-
-print('\n' + "Hello. This script is ready to convert/combine your Jr6 Spinner and Rapid Squid data files for a single data.")
-print ("\nWARNING: This script will OVERWRITE any Rapid Squid datafiles in this folder. It is recommended that you back up your original datafiles before proceeding...")
-print (" - HOWEVER: This script will automatically back up your original datafiles into a backup folder, \"%s\"." % backupdirname)
-sitename = raw_input('\n' + "Please enter the site name: ")
-
-sitename = sitename.upper()
-samname = sitename + ".sam"
-txtname = sitename + ".txt"
-jr6name = sitename + ".jr6"
-sampresent = os.path.isfile(samname)
-txtpresent = os.path.isfile(txtname)
-jr6present = os.path.isfile(jr6name)
-dosquid = sampresent
-dospinner = (txtpresent and jr6present)
-squidconvertmode = False
-spinnerconvertmode = False
-combinemode = False
-
-if not(dosquid) and not(dospinner):
-    if not(txtpresent) and not(jr6present):
-        print('\n' + "No sam file, no txt file, and no jr6 file present for site %s. Program cannot run." % sitename)
-    elif not(txtpresent):
-        print('\n' + "No sam file present and no txt file present for site %s. Program cannot run." % sitename)
-    else:
-        print('\n' + "No sam file present and no jr6 file present for site %s. Program cannot run." % sitename)
-    endchoice = raw_input('\n' + "----- This program will now end. Press enter to exit. -----")
-    sys.exit()
-elif dosquid and not(dospinner):
-    squidconvertmode = True
-    if not(txtpresent):
-        print ('\n' + "Sam file present but no txt file present for site %s." % sitename)
-    else:
-        print ('\n' + "Sam file present but no jr6 file present for site %s." % sitename)
-    print('\n' + "Program will run in Convert Squid Only Mode.")
-elif not(dosquid) and dospinner:
-    spinnerconvertmode = True
-    print('\n' + "Txt file and jr6 files present, but no sam file present for site %s." % sitename)
-    print('\n' + "Program will run in Convert Spinner Only Mode.")
-else:
-    combinemode = True
-    print ('\n' + "Sam file, txt file, and jr6 file all found for site %s." % sitename)
-    print('\n' + "Program will run in Combine Squid and Spinner Mode.")
-
-samplelist = [] # Create the list of samples
-if squidconvertmode or combinemode:
-    f = open(samname,'r') #Opens the .sam file for reading to get sample names.
-    first_line = f.readline()
-    first_line_List = first_line.split()
-    if first_line_List[0] == 'CIT':   # some .sam files have a "CIT" at the first line and the first sample isn't until the 4th line; others have the first sample on the third line. This does a check for which kind.
-        squidstartlist = 2
-    else:
-        squidstartlist = 1
-    for linenum, line in enumerate(f):
-        linelist = line.split()
-        if linenum >= squidstartlist:
-            samnamenew = linelist[0].upper()
-            samplelist.append(samnamenew)
-    f.close()
-if spinnerconvertmode or combinemode:
-    f = open (jr6name,'r') #Opens the jr6 file for reading
-    for line in f:
-        linelist = line.split()
-        if linelist != []:
-            if sitename == linelist[0]:
-                samnamenewspace = linelist[0],linelist[1]
-                samnamenew = ''.join(samnamenewspace)
-                samnamenew = samnamenew.upper()
-                samplelist.append(samnamenew)
-            else:
-                samnamenew = linelist[0].upper()
-                samplelist.append(samnamenew)
-    f.close()
-    
-sampleset = set(samplelist)
-samplelist = list(sampleset)
-samplelistsorted = sorted(samplelist)
-n = len(samplelistsorted)
-
-print ("\n-----------------------------------------------\n")
-
-if n > 1:
-    print ("%s samples found in site %s. " % (n, sitename) + "Here are their names:")
-elif n == 1:
-    print ("%s sample found in site %s. " % (n, sitename) + "Here is its name:")
-print (samplelistsorted)
-
-print ("\n-----------------------------------------------\n")
-
-# Create backup folder:
-os.makedirs(backupdirname)
-print("Backup folder \"%s\" created." % backupdirname)
-backupdirpath = scriptdir + "\\" + backupdirname
-
-# Save data files in backup folder:
-if squidconvertmode or combinemode: # copy any Squid files
-    copy(samname, backupdirpath) 
-    for filename in samplelistsorted:
-        if os.path.isfile(filename):
-            copy(filename, backupdirpath)
-
-if spinnerconvertmode or combinemode: # copy any Spinner files
-    copy(jr6name, backupdirpath)
-    copy(txtname, backupdirpath)
-
-print ("*** IMPORTANT NOTE: Original sample data files have been automatically backed up to folder \"%s\"." % backupdirname)
-
-# Create new sam file:
-tempsamname = samname + ".temp"
-if os.path.isfile(tempsamname):
-    os.remove(tempsamname)
-if squidconvertmode or combinemode:
-    os.rename(samname,tempsamname)
-
-    oldsam = open(tempsamname,'r') #Opens the .sam file for reading
-    newsam = open(samname,'w') #Creates a new .sam file for reading
-
-    first_line = oldsam.readline()
-    newsam.write(first_line)
-
-    if squidstartlist == 2:   # some .sam files have a "CIT" at the first line and the first sample isn't until the 4th line; others have the first sample on the third line. This does a check for which kind.
-        second_line = oldsam.readline()
-        newsam.write(second_line)
-
-    dataline = oldsam.readline()
-    dataline_list = dataline.split()
-
-    sitelat = dataline_list[0]
-    sitelon = dataline_list[1]
-    latspacer = (5 - (len(sitelat)) ) * " "
-    lonspacer = (6 - (len(sitelon)) ) * " "
-    
-    dataline_write = latspacer + sitelat + lonspacer + sitelon + "   0.0"
-    newsam.write(dataline_write)
 
-    for samplename in samplelistsorted:
-        newsam.write("\n" + samplename)
-    newsam.write("\n")
-    oldsam.close()
-    newsam.close()
-    if os.path.isfile(tempsamname):
-        os.remove(tempsamname)
+batchmode = False # Set in worker processes when converting sites with --batch; disables all prompts.
 
-if spinnerconvertmode: 
-    newsam = open(samname,'w') #Creates a new .sam file for reading
-    newsam.write(sitename + '\n')
+yesdashes = False
+nodashes = False
 
-    entersitelat = raw_input('\n' + "Please enter the site latitude: ")
-    try:   # verify that the site latitude entered is a number.
-        float(entersitelat)
-    except ValueError:
-        enterfloat = False
-        while not(enterfloat):
-            entersitelat = raw_input('\n'+ "Invalid response. Site latitude must be a number." + '\n' + "Please re-enter the site latitude: ")
-            try:
-                float(entersitelat)
-                enterfloat = True
-            except ValueError:  
-                enterfloat = False
+yesspaces = False
+nospaces = False
 
-    entersitelon = raw_input('\n' + "Please enter the site longitude: ")
-    try:   # verify that the site longitude entered is a number.
-        float(entersitelon)
-    except ValueError:
-        enterfloat = False
-        while not(enterfloat):
-            entersitelon = raw_input('\n'+ "Invalid response. Site longitude must be a number." + '\n' + "Please re-enter the site longitude: ")
-            try:
-                float(entersitelon)
-                enterfloat = True
-            except ValueError:  
-                enterfloat = False
+nogeog = False
+yesgeog = False
 
-    latspacer = (5 - (len(entersitelat)) ) * " "
-    lonspacer = (6 - (len(entersitelon)) ) * " "
-    
-    dataline_write = latspacer + entersitelat + lonspacer + entersitelon + "   0.0"
-    newsam.write(dataline_write)
+notilt = False
+yestilt = False
 
-    for samplename in samplelistsorted:
-        newsam.write("\n" + samplename)
-    newsam.write("\n")
-    newsam.close()
+class ConvertException(Exception):  # Raised in batch mode when a site cannot be converted.
+    def __init__(self, value):
+        self.value = value
+    def __str__(self):
+        return repr(self.value)
+
+class SkipSiteException(Exception):  # Raised in batch mode when a site needs user input or lacks a complete file set.
+    def __init__(self, value):
+        self.value = value
+    def __str__(self):
+        return repr(self.value)
+
+def endprogram(reason):  # Ends the program, or in batch mode abandons only the current site.
+    if batchmode:
+        raise ConvertException(reason)
+    endchoice = raw_input('\n' + "----- This program will now end. Press enter to exit. -----")
+    sys.exit()
 
-# Load data from data files:
 class Createnewsample:
     def __init__(sample,newsamplename):
         sample.name = newsamplename
@@ -233,528 +73,963 @@ class Createnewsample:
         sample.sampfilepresent = False
         return
 
-sampledatalist = [] # Create sample data list
-for samplename in samplelistsorted:
-    sampledatalist.append(Createnewsample(samplename))
+def input_default(prompt, default):
+    return raw_input("%s" % (prompt)) or default
 
-if squidconvertmode or combinemode:
-    for sample in sampledatalist:
-        if os.path.isfile(sample.name):
-            sample.lastdatasource = "Squid"
-            sample.sampfilepresent = True
-            samplefile = open(sample.name,'r')
-            sample.firstline = samplefile.readline()
-            secondline = samplefile.readline()
-            sample.coreplatestrike = secondline[8:13].replace(" ","")
-            sample.coreplatedip = secondline[14:19].replace(" ","")
-            sample.beddingstrike = secondline[20:25].replace(" ","")
-            sample.beddingdip = secondline[26:31].replace(" ","")
-            for linenum, dataline in enumerate(samplefile):
-                dataline_list = dataline.split()
-                if (dataline_list[0] == "NRM") or ("p" in dataline_list[0]) or (re.sub('[0-9]', '', dataline_list[0]) in ["NRMp","Tp","T","T.","AFp","A","Ap","A."]):
-                    dmagstep = dataline_list[0]
+def indexjr6file(jr6name):  # Reads the jr6 file once and keeps the first line found for each sample, which holds its orientation data.
+    jr6index = {}
+    jr6file = open(jr6name,'r')
+    for dataline in jr6file:
+        dataline_list = dataline.split()
+        if dataline_list != []:
+            if not(dataline_list[0] in jr6index):
+                jr6index[dataline_list[0]] = dataline
+    jr6file.close()
+    return(jr6index)
+
+def indextxtfile(txtname, sitename, samplelistsorted):  # Reads the txt file once, block by block, and sorts every measurement into a list of steps for its specimen.
+    global yesdashes, nodashes, yesspaces, nospaces, nogeog, yesgeog, notilt, yestilt
+
+    txtindex = {}
+    specimen = ""
+    dmagstep = "NRM"
+    measurementnum = 0
+    try:
+        with open(txtname) as txtfile:
+            for line1 in txtfile:
+                line2 = txtfile.next()
+                line3 = txtfile.next()
+                line4 = txtfile.next()
+                line5 = txtfile.next()
+                line6 = txtfile.next()
+                line7 = txtfile.next()
+                line8 = txtfile.next()
+                line9 = txtfile.next()
+                line10 = txtfile.next()
+                line11 = txtfile.next()
+                line12 = txtfile.next()
+                line13 = txtfile.next()
+                line14 = txtfile.next()
+                line15 = txtfile.next()
+                line16 = txtfile.next()
+                line17 = txtfile.next()
+                line18 = txtfile.next()
+                line19 = txtfile.next()
+                line20 = txtfile.next()
+                line21 = txtfile.next()
+                            
+                measurementnum = measurementnum + 1
+                if 11 <= measurementnum % 100 <= 19:
+                    postfixindex = 0
                 else:
-                    dmagstep = dataline_list[0] + dataline_list[1]
-                    
-                dmagstep_mod = re.sub('[0-9]', '', dmagstep)
-                if dmagstep_mod in ["TT","Tp","T","T."]:
-                    dmagstep_type = "TT"
-                    dmagstep_num = int(re.sub('[^0-9]','', dmagstep))
-                elif dmagstep_mod in ["AF","AFp","A","Ap","A."]:
-                    dmagstep_type = "AF"
-                    dmagstep_num = int(re.sub('[^0-9]','', dmagstep))
-                elif dmagstep_mod in ["NRM","NRMp"]:
-                    dmagstep_type = "NRM"
-                    dmagstep_num = 0
+                    postfixindex = measurementnum % 10
+            
+                words1 = line2.split()
+                       
+                if words1: # Check if line is empty and there's an error.
+                    if sitename == words1[0]:  # Automatically Determine if spaces are within samples names
+                        yesspaces = True
+                        # check for words1[1]
+                        specnamespace = words1[0],words1[1]
+                        specimen = ''.join(specnamespace)
+                        dmagstepindex = 3
+                    elif words1[0] in samplelistsorted:
+                        nospaces = True
+                        specimen = (words1[0])
+                        dmagstepindex = 2
+                    elif not (words1[0] in samplelistsorted): # Check first word isn't a sample name, meaning there's an error.
+                        print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find a sample name but instead found: '%s'" % words1[0])
+                        print ("The format error occurred in the %s%s measurement of the .txt file." % (measurementnum, postfix[postfixindex]))
+                        endprogram("Formatting error in the %s%s measurement of the .txt file." % (measurementnum, postfix[postfixindex]))
+                else: # Check if there's an empty line instead of the filename.
+                    print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find a sample name but instead found an empty line.")
+                    print ("The format error occurred in the %s%s measurement of the .txt file." % (measurementnum, postfix[postfixindex]))
+                    endprogram("Formatting error in the %s%s measurement of the .txt file." % (measurementnum, postfix[postfixindex]))
+
+                if len(words1) <= (dmagstepindex - 1): # Check if a demag step is present. 
+                    print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find a Demag Step but found nothing there.")
+                    print ("The format error occurred in the %s%s measurement of the .txt file: Sample %s" % (measurementnum, postfix[postfixindex], specimen))
+                    endprogram("Formatting error in the %s%s measurement of the .txt file." % (measurementnum, postfix[postfixindex]))
+
+                if '-' in specimen:
+                    dashes = True
                 else:
-                    dmagstep_type = dmagstep_mod
-                sortpriority = stepsort_dict[dmagstep_type]
-                newstep = (sortpriority,dmagstep_type,dmagstep_num,"Squid",dataline)
-                sample.data.append(newstep)
-            samplefile.close()
-
-yesdashes = False
-nodashes = False
-
-yesspaces = False
-nospaces = False
-
-nogeog = False
-yesgeog = False
-
-notilt = False
-yestilt = False
+                    nodashes = True
+
+                dmagstep = words1[dmagstepindex]
+                
+                words2 = line14.split()
+
+                if not(words2):   # check if words2 is empty, if so meaning there's an error in .txt file)
+                    print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find specimen Modulus measurements but instead found an empty line.")
+                    print ("The format error occurred in the %s%s measurement of the .txt file: Sample %s, Step %s." % (measurementnum, postfix[postfixindex], specimen, dmagstep))
+                    endprogram("Formatting error in the %s%s measurement of the .txt file." % (measurementnum, postfix[postfixindex]))
+                elif not(words2[0] == 'Modulus'):  # check if words3 does not begin with 'Modulus' again meaning there's an error in .txt file)
+                    print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find 'Modulus' but instead found: '%s'" % words2[0])
+                    print ("The format error occurred in the %s%s measurement of the .txt file: Sample %s, Step %s." % (measurementnum, postfix[postfixindex], specimen, dmagstep))
+                    endprogram("Formatting error in the %s%s measurement of the .txt file." % (measurementnum, postfix[postfixindex]))
+          
+                if len(words2) <= 1: # Check if a modulus measurement is present.
+                    print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find modulus measurements name but found nothing there.")
+                    print ("The format error occurred in the %s%s measurement of the .txt file: Sample %s, Step %s." % (measurementnum, postfix[postfixindex], specimen, dmagstep))
+                    endprogram("Formatting error in the %s%s measurement of the .txt file." % (measurementnum, postfix[postfixindex]))
+
+                modulus = words2[1]
+
+                try: # Check if the modulus measurement is actually a number.
+                    float(modulus)     
+                except ValueError: 
+                    print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find modulus found a non-number: %s." % modulus)
+                    print ("The format error occurred in the %s%s measurement of the .txt file: Sample %s, Step %s." % (measurementnum, postfix[postfixindex], specimen, dmagstep))
+                    endprogram("Formatting error in the %s%s measurement of the .txt file." % (measurementnum, postfix[postfixindex]))
+                      
+                modnum = float(modulus)
+                modint = int(modnum)
+                lenmodint = len(str(modint))
+                powerlenmodint = lenmodint - 1
+                modreduced = float(modnum / (10**powerlenmodint))
+                modfinal = str("%.2f" % round(modreduced,2))
+
+                if len(words2) <= 2: # Check if a modulus power is present.
+                    print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find modulus power but found nothing there.")
+                    print ("The format error occurred in the %s%s measurement of the .txt file: Sample %s, Step %s." % (measurementnum, postfix[postfixindex], specimen, dmagstep))
+                    endprogram("Formatting error in the %s%s measurement of the .txt file." % (measurementnum, postfix[postfixindex]))
+           
+                power = words2[2]
+                power10 = str(power.strip('A/m'))
+            
+                try: # Check if modulus power is a number.
+                    powernum = int(power10.strip('E-'))
+                except ValueError: 
+                    print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find modulus power but found a non-number: %s." % str(power10.strip('E-')))
+                    print ("The format error occurred in the %s%s measurement of the .txt file: Sample %s, Step %s." % (measurementnum, postfix[postfixindex], specimen, dmagstep))
+                    endprogram("Formatting error in the %s%s measurement of the .txt file." % (measurementnum, postfix[postfixindex]))
+            
+                powernum = powernum + 2 - powerlenmodint
+           
+                intensity = "%sE-0%s" % (modfinal, powernum)
+
+                if len(words2) <= 4: # Check if precision measurement is present.
+                    print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find precision but found nothing there.")
+                    print ("The format error occurred in the %s%s measurement of the .txt file: Sample %s, Step %s." % (measurementnum, postfix[postfixindex], specimen, dmagstep))
+                    endprogram("Formatting error in the %s%s measurement of the .txt file." % (measurementnum, postfix[postfixindex]))
+
+                error = words2[4]
+                error = error[:-1]
+            
+                try: # Check if precision measurement is a number.
+                    float(error)     
+                except ValueError:
+                    print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find precision but found a non-number: %s." % error)
+                    print ("The format error occurred in the %s%s measurement of the .txt file: Sample %s, Step %s." % (measurementnum, postfix[postfixindex], specimen, dmagstep))
+                    endprogram("Formatting error in the %s%s measurement of the .txt file." % (measurementnum, postfix[postfixindex]))
+
+                words3 = line18.split()
+
+                if not(words3):   # check if words3 is empty, if so meaning there's an error in .txt file)
+                    print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find Core measurements but instead found an empty line.")
+                    print ("The format error occurred in the %s%s measurement of the .txt file: Sample %s, Step %s." % (measurementnum, postfix[postfixindex], specimen, dmagstep))
+                    endprogram("Formatting error in the %s%s measurement of the .txt file." % (measurementnum, postfix[postfixindex]))
+                elif not(words3[0] == 'SPEC.'):  # check if words3 does not begin with 'SPEC' again meaning there's an error in .txt file)
+                    print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find Core measurements name but instead found: '%s.'" % words3[0])
+                    print ("The format error occurred in the %s%s measurement of the .txt file: Sample %s, Step %s." % (measurementnum, postfix[postfixindex], specimen, dmagstep))
+                    endprogram("Formatting error in the %s%s measurement of the .txt file." % (measurementnum, postfix[postfixindex]))
+
+                if len(words3) <= 2: # Check if a Core Dec measurement is present.
+                    print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find Core Dec but found nothing there.")
+                    print ("The format error occurred in the %s%s measurement of the .txt file: Sample %s, Step %s." % (measurementnum, postfix[postfixindex], specimen, dmagstep))
+                    endprogram("Formatting error in the %s%s measurement of the .txt file." % (measurementnum, postfix[postfixindex]))
+                
+                coredecl = (words3[2])
+
+                try: # Check if Core Dec measurement is a number.
+                    float(coredecl)     
+                except ValueError:
+                    print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find Core Dec but found a non-number: %s." % coredecl)
+                    print ("The format error occurred in the %s%s measurement of the .txt file: Sample %s, Step %s." % (measurementnum, postfix[postfixindex], specimen, dmagstep))
+                    endprogram("Formatting error in the %s%s measurement of the .txt file." % (measurementnum, postfix[postfixindex]))
+                
+                cD = str(coredecl)
+
+                if len(words3) <= 3: # Check if a Core Inc measurement is present.
+                    print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find Core Inc but found nothing there.")
+                    print ("The format error occurred in the %s%s measurement of the .txt file: Sample %s, Step %s." % (measurementnum, postfix[postfixindex], specimen, dmagstep))
+                    endprogram("Formatting error in the %s%s measurement of the .txt file." % (measurementnum, postfix[postfixindex]))
+                
+                coreincl = (words3[3])
+
+                try: # Check if Core Inc measurement is a number.
+                    float(coreincl)     
+                except ValueError:
+                    print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find Core Inc but found a non-number: %s." % coreincl)
+                    print ("The format error occurred in the %s%s measurement of the .txt file: Sample %s, Step %s." % (measurementnum, postfix[postfixindex], specimen, dmagstep))
+                    endprogram("Formatting error in the %s%s measurement of the .txt file." % (measurementnum, postfix[postfixindex]))
+                
+                cI = str(coreincl)
+
+                geogwords = line19.split() # Determine if there is geographic coordinates for a given sample
+            
+                if not(geogwords): # check if line is empty, meaning there's an error in .txt file)
+                        print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Unexpectedly found an empty line.")
+                        print ("The format error occurred in the %s%s measurement of the .txt file: Sample %s, Step %s." % (measurementnum, postfix[postfixindex], specimen, dmagstep))
+                        endprogram("Formatting error in the %s%s measurement of the .txt file." % (measurementnum, postfix[postfixindex]))
+
+                usegeog = False
+                if geogwords[0] == 'GEOGR.S.':
+                    usegeog = True
+                    yesgeog = True
+                    line22 = txtfile.next()   # process to line22 if geographic coordinates present. 
+            
+                    if len(geogwords) <= 1: # Check if a Geographic Dec measurement is present.
+                        print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find Geographic Dec but found nothing there.")
+                        print ("The format error occurred in the %s%s measurement of the .txt file: Sample %s, Step %s." % (measurementnum, postfix[postfixindex], specimen, dmagstep))
+                        endprogram("Formatting error in the %s%s measurement of the .txt file." % (measurementnum, postfix[postfixindex]))
+                
+                    geodecl = (geogwords[1])
+
+                    try: # Check if Geographic Dec measurement is a number.
+                        float(geodecl)     
+                    except ValueError:
+                        print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find Geographic Dec but found a non-number: %s." % geodecl)
+                        print ("The format error occurred in the %s%s measurement of the .txt file: Sample %s, Step %s." % (measurementnum, postfix[postfixindex], specimen, dmagstep))
+                        endprogram("Formatting error in the %s%s measurement of the .txt file." % (measurementnum, postfix[postfixindex]))
+                
+                    if len(geogwords) <= 2: # Check if a Geographic Inc measurement is present.
+                        print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find Geographic Inc but found nothing there.")
+                        print ("The format error occurred in the %s%s measurement of the .txt file: Sample %s, Step %s." % (measurementnum, postfix[postfixindex], specimen, dmagstep))
+                        endprogram("Formatting error in the %s%s measurement of the .txt file." % (measurementnum, postfix[postfixindex]))
+                
+                    geoincl = (geogwords[2])
+
+                    try: # Check if Geographic Inc measurement is a number.
+                        float(geoincl)     
+                    except ValueError:
+                        print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find Geographic Inc but found a non-number: %s." % geoincl)
+                        print ("The format error occurred in the %s%s measurement of the .txt file: Sample %s, Step %s." % (measurementnum, postfix[postfixindex], specimen, dmagstep))
+                        endprogram("Formatting error in the %s%s measurement of the .txt file." % (measurementnum, postfix[postfixindex]))
 
-if spinnerconvertmode or combinemode:
-    for sample in sampledatalist:
-        jr6file = open(jr6name,'r')
-        samplefound = False
-        for dataline in jr6file:
-            dataline_list = dataline.split()
-            if dataline_list[0] == sample.name:
-                samplefound = True
-                sample.lastdatasource = "Spinner"
-                cpsnew = dataline[41:44]
-                sample.coreplatestrike = str(float(cpsnew))
+                else:
+                    nogeog = True
+                    print("Warning: Sample %s at step %s does not have geographic coordinates." % (specimen, dmagstep))
+                    geodecl = coredecl
+                    geoincl = coreincl
 
-                cpdnew = dataline[45:48]
-                sample.coreplatedip = str(float(cpdnew))
+                gD = str(geodecl)
 
-                bsnew = dataline[49:52]
-                sample.beddingstrike = str(float(bsnew))
+                gI = str(geoincl)
 
-                bdnew = dataline[53:56]
-                sample.beddingdip = str(float(bdnew))
-                break
-
-        dmagstep = "NRM"
-        if samplefound:
-            measurementnum = 0
-            try:
-                with open(txtname) as txtfile:
-                    for line1 in txtfile:
-                        line2 = txtfile.next()
-                        line3 = txtfile.next()
-                        line4 = txtfile.next()
-                        line5 = txtfile.next()
-                        line6 = txtfile.next()
-                        line7 = txtfile.next()
-                        line8 = txtfile.next()
-                        line9 = txtfile.next()
-                        line10 = txtfile.next()
-                        line11 = txtfile.next()
-                        line12 = txtfile.next()
-                        line13 = txtfile.next()
-                        line14 = txtfile.next()
-                        line15 = txtfile.next()
-                        line16 = txtfile.next()
-                        line17 = txtfile.next()
-                        line18 = txtfile.next()
-                        line19 = txtfile.next()
-                        line20 = txtfile.next()
-                        line21 = txtfile.next()
-                                        
-                        measurementnum = measurementnum + 1
-                        if 11 <= measurementnum % 100 <= 19:
-                            postfixindex = 0
-                        else:
-                            postfixindex = measurementnum % 10
-                        
-                        words1 = line2.split()
-                                   
-                        if words1: # Check if line is empty and there's an error.
-                            if sitename == words1[0]:  # Automatically Determine if spaces are within samples names
-                                yesspaces = True
-                                # check for words1[1]
-                                specnamespace = words1[0],words1[1]
-                                specimen = ''.join(specnamespace)
-                                dmagstepindex = 3
-                            elif words1[0] in samplelistsorted:
-                                nospaces = True
-                                specimen = (words1[0])
-                                dmagstepindex = 2
-                            elif not (words1[0] in samplelistsorted): # Check first word isn't a sample name, meaning there's an error.
-                                print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find a sample name but instead found: '%s'" % words1[0])
-                                print ("The format error occurred in the %s%s measurement of the .txt file." % (measurementnum, postfix[postfixindex]))
-                                endchoice = raw_input('\n' + "----- This program will now end. Press enter to exit. -----")
-                                sys.exit()
-                        else: # Check if there's an empty line instead of the filename.
-                            print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find a sample name but instead found an empty line.")
-                            print ("The format error occurred in the %s%s measurement of the .txt file." % (measurementnum, postfix[postfixindex]))
-                            endchoice = raw_input('\n' + "----- This program will now end. Press enter to exit. -----")
-                            sys.exit()
-
-                        if len(words1) <= (dmagstepindex - 1): # Check if a demag step is present. 
-                            print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find a Demag Step but found nothing there.")
-                            print ("The format error occurred in the %s%s measurement of the .txt file: Sample %s" % (measurementnum, postfix[postfixindex], specimen))
-                            endchoice = raw_input('\n' + "----- This program will now end. Press enter to exit. -----")
-                            sys.exit()
-
-                        if '-' in specimen:
-                            dashes = True
-                        else:
-                            nodashes = True
-
-                        dmagstep = words1[dmagstepindex]
-                        dmagstepspace = (6 - len(dmagstep)) * " "
+                if geogwords[0] == 'TILT':
+                    tiltwords = geogwords
+                    line22 = txtfile.next()   # process to line22 if tilt coordinates present but geographic coordinates not present.
+                    yestilt = True
+                else:
+                    tiltwords = line20.split() # Determine if there is a tilt correction and use line 23 if there is a tilt correction
                             
-                        words2 = line14.split()
-
-                        if not(words2):   # check if words2 is empty, if so meaning there's an error in .txt file)
-                            print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find specimen Modulus measurements but instead found an empty line.")
-                            print ("The format error occurred in the %s%s measurement of the .txt file: Sample %s, Step %s." % (measurementnum, postfix[postfixindex], specimen, dmagstep))
-                            endchoice = raw_input('\n' + "----- This program will now end. Press enter to exit. -----")
-                            sys.exit()
-                        elif not(words2[0] == 'Modulus'):  # check if words3 does not begin with 'Modulus' again meaning there's an error in .txt file)
-                            print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find 'Modulus' but instead found: '%s'" % words2[0])
-                            print ("The format error occurred in the %s%s measurement of the .txt file: Sample %s, Step %s." % (measurementnum, postfix[postfixindex], specimen, dmagstep))
-                            endchoice = raw_input('\n' + "----- This program will now end. Press enter to exit. -----")
-                            sys.exit()
-                      
-                        if len(words2) <= 1: # Check if a modulus measurement is present.
-                            print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find modulus measurements name but found nothing there.")
+                if usegeog and not(tiltwords): # check if line is empty, meaning there's an error in .txt file)
+                        print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Unexpectedly found an empty line.")
+                        print ("The format error occurred in the %s%s measurement of the .txt file: Sample %s, Step %s." % (measurementnum, postfix[postfixindex], specimen, dmagstep))
+                        endprogram("Formatting error in the %s%s measurement of the .txt file." % (measurementnum, postfix[postfixindex]))
+
+                if tiltwords:
+                    if tiltwords[0] == 'TILT':
+                        if not(geogwords[0] == 'TILT'):
+                            yestilt = True
+                            line23 = txtfile.next()   # process to line23 if tilt coordinates present after geographic coordinates
+                    
+                        if len(tiltwords) <= 2: # Check if a Tilt Dec measurement is present.
+                            print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find Tilt Dec but found nothing there.")
                             print ("The format error occurred in the %s%s measurement of the .txt file: Sample %s, Step %s." % (measurementnum, postfix[postfixindex], specimen, dmagstep))
-                            endchoice = raw_input('\n' + "----- This program will now end. Press enter to exit. -----")
-                            sys.exit()
-
-                        modulus = words2[1]
+                            endprogram("Formatting error in the %s%s measurement of the .txt file." % (measurementnum, postfix[postfixindex]))
+                
+                        tiltdecl = (tiltwords[2])
 
-                        try: # Check if the modulus measurement is actually a number.
-                            float(modulus)     
-                        except ValueError: 
-                            print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find modulus found a non-number: %s." % modulus)
-                            print ("The format error occurred in the %s%s measurement of the .txt file: Sample %s, Step %s." % (measurementnum, postfix[postfixindex], specimen, dmagstep))
-                            endchoice = raw_input('\n' + "----- This program will now end. Press enter to exit. -----")
-                            sys.exit()          
-                                  
-                        modnum = float(modulus)
-                        modint = int(modnum)
-                        lenmodint = len(str(modint))
-                        powerlenmodint = lenmodint - 1
-                        modreduced = float(modnum / (10**powerlenmodint))
-                        modfinal = str("%.2f" % round(modreduced,2))
-
-                        if len(words2) <= 2: # Check if a modulus power is present.
-                            print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find modulus power but found nothing there.")
-                            print ("The format error occurred in the %s%s measurement of the .txt file: Sample %s, Step %s." % (measurementnum, postfix[postfixindex], specimen, dmagstep))
-                            endchoice = raw_input('\n' + "----- This program will now end. Press enter to exit. -----")
-                            sys.exit()
-                       
-                        power = words2[2]
-                        power10 = str(power.strip('A/m'))
-                        
-                        try: # Check if modulus power is a number.
-                            powernum = int(power10.strip('E-'))
-                        except ValueError: 
-                            print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find modulus power but found a non-number: %s." % str(power10.strip('E-')))
+                        try: # Check if Tilt Dec measurement is a number.
+                            float(tiltdecl)     
+                        except ValueError:
+                            print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find Tilt Inc but found a non-number: %s." % tiltdecl)
                             print ("The format error occurred in the %s%s measurement of the .txt file: Sample %s, Step %s." % (measurementnum, postfix[postfixindex], specimen, dmagstep))
-                            endchoice = raw_input('\n' + "----- This program will now end. Press enter to exit. -----")
-                            sys.exit()
-                        
-                        powernum = powernum + 2 - powerlenmodint
-                       
-                        intensity = "%sE-0%s" % (modfinal, powernum)
+                            endprogram("Formatting error in the %s%s measurement of the .txt file." % (measurementnum, postfix[postfixindex]))
 
-                        if len(words2) <= 4: # Check if precision measurement is present.
-                            print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find precision but found nothing there.")
+                        if len(tiltwords) <= 3: # Check if a Tilt Inc measurement is present.
+                            print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find Tilt Inc but found nothing there.")
                             print ("The format error occurred in the %s%s measurement of the .txt file: Sample %s, Step %s." % (measurementnum, postfix[postfixindex], specimen, dmagstep))
-                            endchoice = raw_input('\n' + "----- This program will now end. Press enter to exit. -----")
-                            sys.exit()
-
-                        error = words2[4]
-                        error = error[:-1]
-                        errorspace = (6 - len(error) ) * " "
-                        
-                        try: # Check if precision measurement is a number.
-                            float(error)     
+                            endprogram("Formatting error in the %s%s measurement of the .txt file." % (measurementnum, postfix[postfixindex]))
+                    
+                        tiltincl = (tiltwords[3])
+
+                        try: # Check if Tilt Inc measurement is a number.
+                            float(tiltincl)     
                         except ValueError:
-                            print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find precision but found a non-number: %s." % error)
+                            print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find Tilt Inc but found a non-number: %s." % tiltincl)
                             print ("The format error occurred in the %s%s measurement of the .txt file: Sample %s, Step %s." % (measurementnum, postfix[postfixindex], specimen, dmagstep))
-                            endchoice = raw_input('\n' + "----- This program will now end. Press enter to exit. -----")
-                            sys.exit()
+                            endprogram("Formatting error in the %s%s measurement of the .txt file." % (measurementnum, postfix[postfixindex]))
+                    else:
+                        notilt = True
+                        tiltdecl = geodecl
+                        tiltincl = geoincl
+                else:
+                    notilt = True
+                    tiltdecl = geodecl
+                    tiltincl = geoincl    
+
+                tD = str(tiltdecl)
+
+                tI = str(tiltincl)
+       
+                dmagstep_type, dmagstep_num = parsestepname(dmagstep)
+                dmagstep = dmagstep + "p"
+            
+                dataline = spinnerstepformat.format((dmagstep, gD, gI, tD, tI, intensity, error, cD, cI))
+
+                newstep = Measurement(dmagstep_type, dmagstep_num, "Spinner", float(geodecl), float(geoincl), float(tiltdecl), float(tiltincl), float(coredecl), float(coreincl), float(intensity), float(error), dataline)
+                txtindex.setdefault(specimen, []).append(newstep)
+    except StopIteration:
+        print ('\n' + "Problem encountered with sample %s, step %s." % (specimen, dmagstep)) # do whatever you need to do with line1 alone
+        if not(batchmode):
+            continuechoice = raw_input('\n' + "----- Please press enter to continue. -----")
+    return(txtindex)
+
+def readtxtfile(txtname, sitename, samplelistsorted):  # Parses the txt file into a form that can be cached: steps as plain tuples, plus the flags used for the notes at the end.
+    txtindex = indextxtfile(txtname, sitename, samplelistsorted)
+    txttuples = {}
+    for specimen in txtindex:
+        txttuples[specimen] = [measurementtuple(step) for step in txtindex[specimen]]
+    return((txttuples, (yesdashes, nodashes, yesspaces, nospaces, nogeog, yesgeog, notilt, yestilt)))
+
+datcolumn_dict = {   # Columns read from a 2G .dat file, by their header names in lower case.
+    "specimen": ["sample id", "sample", "specimen"],
+    "treatment": ["treatment type", "treatment"],
+    "afx": ["af x"], "afy": ["af y"], "afz": ["af z"],
+    "temperature": ["temp c", "temperature"],
+    "coredec": ["declination", "core declination"],
+    "coreinc": ["inclination", "core inclination"],
+    "intensity": ["intensity"],
+    "geogdec": ["geographic declination", "geog declination"],
+    "geoginc": ["geographic inclination", "geog inclination"],
+    "tiltdec": ["tilt corrected declination", "tilt declination"],
+    "tiltinc": ["tilt corrected inclination", "tilt inclination"]}
+datvaluelist = ["afx", "afy", "afz", "temperature", "coredec", "coreinc", "intensity", "geogdec", "geoginc", "tiltdec", "tiltinc"]
+
+datnrmlist = ["", "NONE", "NRM"]
+dataflist = ["DEGAUSS", "AF", "AFD"]
+datthermallist = ["THERMAL", "TT", "THD", "HEAT"]
+
+def readdatfile(datname, samplelistsorted):  # Streams the 2G .dat file one row at a time and returns the steps of the site's samples as plain tuples.
+    datfile = open(datname,'r')
+    headerline = datfile.readline()
+    if "\t" in headerline:
+        delimiter = "\t"
+    else:
+        delimiter = ","
+    headerlist = [name.strip().strip('"').lower() for name in headerline.split(delimiter)]
+    columns = {}
+    for field in datcolumn_dict:
+        for name in datcolumn_dict[field]:
+            if name in headerlist:
+                columns[field] = headerlist.index(name)
+                break
+    for field in ["specimen", "coredec", "coreinc", "intensity"]:
+        if not(field in columns):
+            print ('\n'+ "Advisory FORMATTING ERROR in .dat file: Expected to find a '%s' column in the first line but found: %s" % (datcolumn_dict[field][0], headerline.strip()))
+            datfile.close()
+            endprogram("Formatting error in the first line of the .dat file.")
+    if not("geogdec" in columns and "geoginc" in columns):
+        print("Warning: The .dat file does not have geographic coordinates; core coordinates are used instead.")
+    if not("tiltdec" in columns and "tiltinc" in columns):
+        print("Warning: The .dat file does not have tilt corrected coordinates; geographic coordinates are used instead.")
+
+    samplenames = set(samplelistsorted)
+    dattuples = {}
+    othersamples = set()
+    skippedsteps = 0
+    for linenum, row in enumerate(csv.reader(datfile, delimiter=delimiter)):
+        if len(row) <= columns["specimen"] or row[columns["specimen"]].strip() == "":
+            continue
+        specimen = row[columns["specimen"]].replace(" ","").upper()
+        if not(specimen in samplenames):   # a sample needs its orientation from the .sam or .jr6 file
+            othersamples.add(specimen)
+            continue
+
+        values = {}
+        try:
+            for field in datvaluelist:
+                if (field in columns) and (columns[field] < len(row)) and (row[columns[field]].strip() != ""):
+                    values[field] = float(row[columns[field]])
+            coredec = values["coredec"]
+            coreinc = values["coreinc"]
+            intensity = values["intensity"]
+        except (ValueError, KeyError):
+            print ('\n'+ "Advisory FORMATTING ERROR in .dat file: Expected to find core declination, inclination and intensity numbers but found: %s" % delimiter.join(row))
+            print ("The format error occurred in line %s of the .dat file: Sample %s." % (linenum + 2, specimen))
+            datfile.close()
+            endprogram("Formatting error in line %s of the .dat file." % (linenum + 2))
+
+        aflevel = max(values.get("afx", 0), values.get("afy", 0), values.get("afz", 0)) / 10   # gauss to mT
+        temperature = values.get("temperature", 0)
+        if (columns.get("treatment") != None) and (columns["treatment"] < len(row)):
+            treatment = row[columns["treatment"]].strip().upper()
+        elif aflevel > 0:
+            treatment = "AF"
+        elif temperature > 0:
+            treatment = "TT"
+        else:
+            treatment = "NRM"
+
+        if treatment in datnrmlist:
+            dmagstep_type, dmagstep_num = "NRM", 0
+            dmagstep = "NRM"
+        elif treatment in dataflist:
+            dmagstep_type, dmagstep_num = "AF", int(round(aflevel))
+            dmagstep = "AF%4d" % dmagstep_num
+        elif treatment in datthermallist:
+            dmagstep_type, dmagstep_num = "TT", int(round(temperature))
+            dmagstep = "TT%4d" % dmagstep_num
+        else:   # IRM, ARM and other treatments are not demagnetization steps
+            skippedsteps = skippedsteps + 1
+            continue
+
+        geogdec = values.get("geogdec", coredec)
+        geoginc = values.get("geoginc", coreinc)
+        tiltdec = values.get("tiltdec", geogdec)
+        tiltinc = values.get("tiltinc", geoginc)
+        dataline = squidstepformat.format((dmagstep, geogdec, geoginc, tiltdec, tiltinc, "%.2E" % intensity, "0.0", "%.1f" % coredec, "%.1f" % coreinc, "0.00E+00 0.00E+00 0.00E+00 2G\n"))
+        newstep = Measurement(dmagstep_type, dmagstep_num, "2G", geogdec, geoginc, tiltdec, tiltinc, coredec, coreinc, intensity, 0.0, dataline)
+        dattuples.setdefault(specimen, []).append(measurementtuple(newstep))
+    datfile.close()
+
+    if othersamples:
+        print("\nThe .dat file has steps for samples that are in neither the .sam nor the .jr6 file. Without an orientation they are left out: %s" % sorted(othersamples))
+    if skippedsteps:
+        print("\n%s steps in the .dat file are not NRM, AF or thermal steps and are left out." % skippedsteps)
+    return(dattuples)
+
+def convertsite(sitename, backupdirname, backupindex, siteentry=None):  # Converts and/or combines the data files of one site in the current folder. siteentry holds the site's manifest values, if any.
+    global yesdashes, nodashes, yesspaces, nospaces, nogeog, yesgeog, notilt, yestilt
+
+    yesdashes = nodashes = False
+    yesspaces = nospaces = False
+    nogeog = yesgeog = False
+    notilt = yestilt = False
+
+    sitename = sitename.upper()
+    samname = sitename + ".sam"
+    txtname = sitename + ".txt"
+    jr6name = sitename + ".jr6"
+    datname = sitename + ".dat"
+    sampresent = os.path.isfile(samname)
+    txtpresent = os.path.isfile(txtname)
+    jr6present = os.path.isfile(jr6name)
+    datpresent = os.path.isfile(datname)
+    dosquid = sampresent
+    dospinner = (txtpresent and jr6present)
+    squidconvertmode = False
+    spinnerconvertmode = False
+    combinemode = False
+
+    if not(dosquid) and not(dospinner):
+        if not(txtpresent) and not(jr6present):
+            print('\n' + "No sam file, no txt file, and no jr6 file present for site %s. Program cannot run." % sitename)
+        elif not(txtpresent):
+            print('\n' + "No sam file present and no txt file present for site %s. Program cannot run." % sitename)
+        else:
+            print('\n' + "No sam file present and no jr6 file present for site %s. Program cannot run." % sitename)
+        if datpresent:
+            print("The .dat file of site %s has no sample orientations, so it cannot be converted on its own." % sitename)
+        if batchmode:
+            raise SkipSiteException("Incomplete set of data files.")
+        endprogram("No data files found for site %s." % sitename)
+    elif dosquid and not(dospinner):
+        squidconvertmode = True
+        if not(txtpresent):
+            print ('\n' + "Sam file present but no txt file present for site %s." % sitename)
+        else:
+            print ('\n' + "Sam file present but no jr6 file present for site %s." % sitename)
+        print('\n' + "Program will run in Convert Squid Only Mode.")
+    elif not(dosquid) and dospinner:
+        spinnerconvertmode = True
+        print('\n' + "Txt file and jr6 files present, but no sam file present for site %s." % sitename)
+        print('\n' + "Program will run in Convert Spinner Only Mode.")
+        manifestlatlon = (siteentry != None) and (siteentry["latitude"] != None) and (siteentry["longitude"] != None)
+        if batchmode and not(manifestlatlon):   # without a manifest, the site latitude and longitude must be entered by hand when there is no sam file.
+            raise SkipSiteException("No sam file and no site latitude and longitude in the manifest.")
+    else:
+        combinemode = True
+        print ('\n' + "Sam file, txt file, and jr6 file all found for site %s." % sitename)
+        print('\n' + "Program will run in Combine Squid and Spinner Mode.")
+    if datpresent:
+        print('\n' + "2G dat file found for site %s. Its steps will be combined with the samples in the other data files." % sitename)
 
-                        words3 = line18.split()
+    samplelist = [] # Create the list of samples
+    if squidconvertmode or combinemode:
+        f = open(samname,'r') #Opens the .sam file for reading to get sample names.
+        first_line = f.readline()
+        first_line_List = first_line.split()
+        if first_line_List[0] == 'CIT':   # some .sam files have a "CIT" at the first line and the first sample isn't until the 4th line; others have the first sample on the third line. This does a check for which kind.
+            squidstartlist = 2
+        else:
+            squidstartlist = 1
+        for linenum, line in enumerate(f):
+            linelist = line.split()
+            if linenum >= squidstartlist:
+                samnamenew = linelist[0].upper()
+                samplelist.append(samnamenew)
+        f.close()
+    if spinnerconvertmode or combinemode:
+        f = open (jr6name,'r') #Opens the jr6 file for reading
+        for line in f:
+            linelist = line.split()
+            if linelist != []:
+                if sitename == linelist[0]:
+                    samnamenewspace = linelist[0],linelist[1]
+                    samnamenew = ''.join(samnamenewspace)
+                    samnamenew = samnamenew.upper()
+                    samplelist.append(samnamenew)
+                else:
+                    samnamenew = linelist[0].upper()
+                    samplelist.append(samnamenew)
+        f.close()
+    
+    sampleset = set(samplelist)
+    samplelist = list(sampleset)
+    samplelistsorted = sorted(samplelist)
+    n = len(samplelistsorted)
+
+    print ("\n-----------------------------------------------\n")
+
+    if n > 1:
+        print ("%s samples found in site %s. " % (n, sitename) + "Here are their names:")
+    elif n == 1:
+        print ("%s sample found in site %s. " % (n, sitename) + "Here is its name:")
+    print (samplelistsorted)
+
+    print ("\n-----------------------------------------------\n")
+
+    # Save data files in backup folder:
+    backuplist = []
+    if squidconvertmode or combinemode: # copy any Squid files
+        backuplist.append(samname)
+        for filename in samplelistsorted:
+            if os.path.isfile(filename):
+                backuplist.append(filename)
+
+    if spinnerconvertmode or combinemode: # copy any Spinner files
+        backuplist.append(jr6name)
+        backuplist.append(txtname)
+
+    if datpresent: # copy any 2G file
+        backuplist.append(datname)
+
+    unchangedcount = backupfiles(scriptdir, backupdirname, backuplist, backupindex)
+    if not(batchmode): # in batch mode the index is saved once all sites are done
+        savebackupindex(scriptdir, backupindex)
+    print("Backup folder \"%s\" created." % backupdirname)
+    if unchangedcount:
+        print("  (%s data files are unchanged since an earlier backup, so they were not copied again.)" % unchangedcount)
+
+    print ("*** IMPORTANT NOTE: Original sample data files have been automatically backed up to folder \"%s\"." % backupdirname)
+
+    # Create new sam file:
+    tempsamname = samname + ".temp"
+    if os.path.isfile(tempsamname):
+        os.remove(tempsamname)
+    if squidconvertmode or combinemode:
+        os.rename(samname,tempsamname)
+
+        oldsam = open(tempsamname,'r') #Opens the .sam file for reading
+        newsam = open(samname,'w') #Creates a new .sam file for reading
+
+        first_line = oldsam.readline()
+        newsam.write(first_line)
+
+        if squidstartlist == 2:   # some .sam files have a "CIT" at the first line and the first sample isn't until the 4th line; others have the first sample on the third line. This does a check for which kind.
+            second_line = oldsam.readline()
+            newsam.write(second_line)
+
+        dataline = oldsam.readline()
+        dataline_list = dataline.split()
+
+        sitelat = dataline_list[0]
+        sitelon = dataline_list[1]
+        newsam.write(samsitelineformat.format((sitelat, sitelon, "0.0")) + "\n")
+        newsam.write("".join([samplename + "\n" for samplename in samplelistsorted]))
+        oldsam.close()
+        newsam.close()
+        if os.path.isfile(tempsamname):
+            os.remove(tempsamname)
+
+    if spinnerconvertmode: 
+        newsam = open(samname,'w') #Creates a new .sam file for reading
+        newsam.write(sitename + '\n')
+
+        if manifestlatlon:
+            entersitelat = siteentry["latitude"]
+            entersitelon = siteentry["longitude"]
+            print('\n' + "Site latitude (%s) and longitude (%s) taken from the manifest." % (entersitelat, entersitelon))
+        else:
+            entersitelat = raw_input('\n' + "Please enter the site latitude: ")
+            try:   # verify that the site latitude entered is a number.
+                float(entersitelat)
+            except ValueError:
+                enterfloat = False
+                while not(enterfloat):
+                    entersitelat = raw_input('\n'+ "Invalid response. Site latitude must be a number." + '\n' + "Please re-enter the site latitude: ")
+                    try:
+                        float(entersitelat)
+                        enterfloat = True
+                    except ValueError:  
+                        enterfloat = False
+
+            entersitelon = raw_input('\n' + "Please enter the site longitude: ")
+            try:   # verify that the site longitude entered is a number.
+                float(entersitelon)
+            except ValueError:
+                enterfloat = False
+                while not(enterfloat):
+                    entersitelon = raw_input('\n'+ "Invalid response. Site longitude must be a number." + '\n' + "Please re-enter the site longitude: ")
+                    try:
+                        float(entersitelon)
+                        enterfloat = True
+                    except ValueError:  
+                        enterfloat = False
 
-                        if not(words3):   # check if words3 is empty, if so meaning there's an error in .txt file)
-                            print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find Core measurements but instead found an empty line.")
-                            print ("The format error occurred in the %s%s measurement of the .txt file: Sample %s, Step %s." % (measurementnum, postfix[postfixindex], specimen, dmagstep))
-                            endchoice = raw_input('\n' + "----- This program will now end. Press enter to exit. -----")
-                            sys.exit()
-                        elif not(words3[0] == 'SPEC.'):  # check if words3 does not begin with 'SPEC' again meaning there's an error in .txt file)
-                            print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find Core measurements name but instead found: '%s.'" % words3[0])
-                            print ("The format error occurred in the %s%s measurement of the .txt file: Sample %s, Step %s." % (measurementnum, postfix[postfixindex], specimen, dmagstep))
-                            endchoice = raw_input('\n' + "----- This program will now end. Press enter to exit. -----")
-                            sys.exit()
+        newsam.write(samsitelineformat.format((entersitelat, entersitelon, "0.0")) + "\n")
+        newsam.write("".join([samplename + "\n" for samplename in samplelistsorted]))
+        newsam.close()
 
-                        if len(words3) <= 2: # Check if a Core Dec measurement is present.
-                            print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find Core Dec but found nothing there.")
-                            print ("The format error occurred in the %s%s measurement of the .txt file: Sample %s, Step %s." % (measurementnum, postfix[postfixindex], specimen, dmagstep))
-                            endchoice = raw_input('\n' + "----- This program will now end. Press enter to exit. -----")
-                            sys.exit()
-                            
-                        coredecl = (words3[2])
+    cachefiles = loadsitecache(sitename) # Data files that have not changed since the last run are not parsed again.
 
-                        try: # Check if Core Dec measurement is a number.
-                            float(coredecl)     
-                        except ValueError:
-                            print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find Core Dec but found a non-number: %s." % coredecl)
-                            print ("The format error occurred in the %s%s measurement of the .txt file: Sample %s, Step %s." % (measurementnum, postfix[postfixindex], specimen, dmagstep))
-                            endchoice = raw_input('\n' + "----- This program will now end. Press enter to exit. -----")
-                            sys.exit()
-                            
-                        cD = str(coredecl)
-                        cDspace = (4 - len(cD) ) * " "
+    sampledatalist = [] # Create sample data list
+    for samplename in samplelistsorted:
+        sampledatalist.append(Createnewsample(samplename))
 
-                        if len(words3) <= 3: # Check if a Core Inc measurement is present.
-                            print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find Core Inc but found nothing there.")
-                            print ("The format error occurred in the %s%s measurement of the .txt file: Sample %s, Step %s." % (measurementnum, postfix[postfixindex], specimen, dmagstep))
-                            endchoice = raw_input('\n' + "----- This program will now end. Press enter to exit. -----")
-                            sys.exit()
-                            
-                        coreincl = (words3[3])
+    if squidconvertmode or combinemode:
+        for sample in sampledatalist:
+            if os.path.isfile(sample.name):
+                sample.lastdatasource = "Squid"
+                sample.sampfilepresent = True
+                sample.firstline, secondline, steplist = cachedparse(cachefiles, sample.name, readsamplefile)
+                sampleheader = sampleheaderformat.parse(secondline)
+                sample.coreplatestrike = sampleheader["coreplatestrike"]
+                sample.coreplatedip = sampleheader["coreplatedip"]
+                sample.beddingstrike = sampleheader["beddingstrike"]
+                sample.beddingdip = sampleheader["beddingdip"]
+                for dataline, steptuple in steplist:
+                    if steptuple != None:
+                        sample.data.append(Measurement(*steptuple))
+                    elif dataline.split() != []:
+                        sample.data.append(readrapidstep(dataline, "Squid")) # a line readsamplefile could not read; reading it again reports the problem.
+
+    if spinnerconvertmode or combinemode:
+        jr6index = cachedparse(cachefiles, jr6name, indexjr6file)
+        txttuples, txtflags = cachedparse(cachefiles, txtname, lambda txtname: readtxtfile(txtname, sitename, samplelistsorted), (sitename, tuple(samplelistsorted)))
+        yesdashes, nodashes, yesspaces, nospaces, nogeog, yesgeog, notilt, yestilt = txtflags
+        for sample in sampledatalist:
+            if sample.name in jr6index:
+                dataline = jr6index[sample.name]
+                sample.lastdatasource = "Spinner"
+                orientation = jr6orientationformat.parse(dataline)
+                sample.coreplatestrike = str(float(orientation["coreplatestrike"]))
+                sample.coreplatedip = str(float(orientation["coreplatedip"]))
+                sample.beddingstrike = str(float(orientation["beddingstrike"]))
+                sample.beddingdip = str(float(orientation["beddingdip"]))
 
-                        try: # Check if Core Inc measurement is a number.
-                            float(coreincl)     
-                        except ValueError:
-                            print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find Core Inc but found a non-number: %s." % coreincl)
-                            print ("The format error occurred in the %s%s measurement of the .txt file: Sample %s, Step %s." % (measurementnum, postfix[postfixindex], specimen, dmagstep))
-                            endchoice = raw_input('\n' + "----- This program will now end. Press enter to exit. -----")
-                            sys.exit()
-                            
-                        cI = str(coreincl)
-                        cIspace = (6 - len(cI) ) * " "
-
-                        geogwords = line19.split() # Determine if there is geographic coordinates for a given sample
-                        
-                        if not(geogwords): # check if line is empty, meaning there's an error in .txt file)
-                                print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Unexpectedly found an empty line.")
-                                print ("The format error occurred in the %s%s measurement of the .txt file: Sample %s, Step %s." % (measurementnum, postfix[postfixindex], specimen, dmagstep))
-                                endchoice = raw_input('\n' + "----- This program will now end. Press enter to exit. -----")
-                                sys.exit()
-
-                        usegeog = False
-                        if geogwords[0] == 'GEOGR.S.':
-                            usegeog = True
-                            yesgeog = True
-                            line22 = txtfile.next()   # process to line22 if geographic coordinates present. 
-                        
-                            if len(geogwords) <= 1: # Check if a Geographic Dec measurement is present.
-                                print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find Geographic Dec but found nothing there.")
-                                print ("The format error occurred in the %s%s measurement of the .txt file: Sample %s, Step %s." % (measurementnum, postfix[postfixindex], specimen, dmagstep))
-                                endchoice = raw_input('\n' + "----- This program will now end. Press enter to exit. -----")
-                                sys.exit()
-                            
-                            geodecl = (geogwords[1])
-
-                            try: # Check if Geographic Dec measurement is a number.
-                                float(geodecl)     
-                            except ValueError:
-                                print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find Geographic Dec but found a non-number: %s." % geodecl)
-                                print ("The format error occurred in the %s%s measurement of the .txt file: Sample %s, Step %s." % (measurementnum, postfix[postfixindex], specimen, dmagstep))
-                                endchoice = raw_input('\n' + "----- This program will now end. Press enter to exit. -----")
-                                sys.exit()
-                            
-                            if len(geogwords) <= 2: # Check if a Geographic Inc measurement is present.
-                                print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find Geographic Inc but found nothing there.")
-                                print ("The format error occurred in the %s%s measurement of the .txt file: Sample %s, Step %s." % (measurementnum, postfix[postfixindex], specimen, dmagstep))
-                                endchoice = raw_input('\n' + "----- This program will now end. Press enter to exit. -----")
-                                sys.exit()
-                            
-                            geoincl = (geogwords[2])
-
-                            try: # Check if Geographic Inc measurement is a number.
-                                float(geoincl)     
-                            except ValueError:
-                                print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find Geographic Inc but found a non-number: %s." % geoincl)
-                                print ("The format error occurred in the %s%s measurement of the .txt file: Sample %s, Step %s." % (measurementnum, postfix[postfixindex], specimen, dmagstep))
-                                endchoice = raw_input('\n' + "----- This program will now end. Press enter to exit. -----")
-                                sys.exit()
-
-                        else:
-                            nogeog = True
-                            print("Warning: Sample %s at step %s does not have geographic coordinates." % (specimen, dmagstep))
-                            geodecl = coredecl
-                            geoincl = coreincl
-
-                        gD = str(geodecl)
-
-                        gI = str(geoincl)
-                        gIspace = (6 - len(gI) ) * " "
-
-                        if geogwords[0] == 'TILT':
-                            tiltwords = geogwords
-                            line22 = txtfile.next()   # process to line22 if tilt coordinates present but geographic coordinates not present.
-                            yestilt = True
-                        else:
-                            tiltwords = line20.split() # Determine if there is a tilt correction and use line 23 if there is a tilt correction
-                                        
-                        if usegeog and not(tiltwords): # check if line is empty, meaning there's an error in .txt file)
-                                print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Unexpectedly found an empty line.")
-                                print ("The format error occurred in the %s%s measurement of the .txt file: Sample %s, Step %s." % (measurementnum, postfix[postfixindex], specimen, dmagstep))
-                                endchoice = raw_input('\n' + "----- This program will now end. Press enter to exit. -----")
-                                sys.exit()
-
-                        if tiltwords:
-                            if tiltwords[0] == 'TILT':
-                                if not(geogwords[0] == 'TILT'):
-                                    yestilt = True
-                                    line23 = txtfile.next()   # process to line23 if tilt coordinates present after geographic coordinates
-                                
-                                if len(tiltwords) <= 2: # Check if a Tilt Dec measurement is present.
-                                    print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find Tilt Dec but found nothing there.")
-                                    print ("The format error occurred in the %s%s measurement of the .txt file: Sample %s, Step %s." % (measurementnum, postfix[postfixindex], specimen, dmagstep))
-                                    endchoice = raw_input('\n' + "----- This program will now end. Press enter to exit. -----")
-                                    sys.exit()
-                            
-                                tiltdecl = (tiltwords[2])
-
-                                try: # Check if Tilt Dec measurement is a number.
-                                    float(tiltdecl)     
-                                except ValueError:
-                                    print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find Tilt Inc but found a non-number: %s." % tiltdecl)
-                                    print ("The format error occurred in the %s%s measurement of the .txt file: Sample %s, Step %s." % (measurementnum, postfix[postfixindex], specimen, dmagstep))
-                                    endchoice = raw_input('\n' + "----- This program will now end. Press enter to exit. -----")
-                                    sys.exit()
-
-                                if len(tiltwords) <= 3: # Check if a Tilt Inc measurement is present.
-                                    print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find Tilt Inc but found nothing there.")
-                                    print ("The format error occurred in the %s%s measurement of the .txt file: Sample %s, Step %s." % (measurementnum, postfix[postfixindex], specimen, dmagstep))
-                                    endchoice = raw_input('\n' + "----- This program will now end. Press enter to exit. -----")
-                                    sys.exit()
-                                
-                                tiltincl = (tiltwords[3])
-
-                                try: # Check if Tilt Inc measurement is a number.
-                                    float(tiltincl)     
-                                except ValueError:
-                                    print ('\n'+ "Advisory FORMATTING ERROR in .txt file: Expected to find Tilt Inc but found a non-number: %s." % tiltincl)
-                                    print ("The format error occurred in the %s%s measurement of the .txt file: Sample %s, Step %s." % (measurementnum, postfix[postfixindex], specimen, dmagstep))
-                                    endchoice = raw_input('\n' + "----- This program will now end. Press enter to exit. -----")
-                                    sys.exit()     
-                            else:
-                                notilt = True
-                                tiltdecl = geodecl
-                                tiltincl = geoincl
-                        else:
-                            notilt = True
-                            tiltdecl = geodecl
-                            tiltincl = geoincl    
-
-                        tD = str(tiltdecl)
-                        tDspace = (6 - len(tD) ) * " "
-
-                        tI = str(tiltincl)
-                        tIspace = (6 - len(tI) ) * " "
-                   
-                        dmagstep_mod = re.sub('[0-9]', '', dmagstep)    
-                        if dmagstep_mod in ["TT","Tp","T","T."]:
-                            dmagstep_type = "TT"
-                            dmagstep_num = int(re.sub('[^0-9]','', dmagstep))
-                        elif dmagstep_mod in ["AF","AFp","A","Ap","A."]:
-                            dmagstep_type = "AF"
-                            dmagstep_num = int(re.sub('[^0-9]','', dmagstep))
-                        elif dmagstep_mod in ["NRM","NRMp"]:
-                            dmagstep_type = "NRM"
-                            dmagstep_num = 0
-                        else:
-                            dmagstep_type = dmagstep_mod
-                        sortpriority = stepsort_dict[dmagstep_type]
-                        dmagstep = dmagstep + "p"
-                        gDspace = (10 - (len(dmagstep) + len(gD) )) * " "
-                        
-                        if sample.name == specimen:
-                            dataline = ("%s%s%s%s%s%s%s%s%s   %s%s%s%s%s%s%s   0.00E+00 0.00E+00 0.00E+00 JR6\n" % (dmagstep, gDspace, gD, gIspace, gI, tDspace, tD, tIspace, tI, intensity, errorspace, error, cDspace, cD, cIspace, cI))
-
-                            newstep = (sortpriority,dmagstep_type,dmagstep_num,"Spinner",dataline)
-                            sample.data.append(newstep)
-            except StopIteration:
-                print ('\n' + "Problem encountered with sample %s, step %s." % (sample.name, dmagstep)) # do whatever you need to do with line1 alone
-                continuechoice = raw_input('\n' + "----- Please press enter to continue. -----")
-
-            txtfile.close()
-        jr6file.close()
-        
+                for steptuple in txttuples.get(sample.name, []):
+                    sample.data.append(Measurement(*steptuple))
 
-print("\n-----------------------------------------------\n")
-print("Writing Sample Files\n")
+    if datpresent:
+        dattuples = cachedparse(cachefiles, datname, lambda datname: readdatfile(datname, samplelistsorted), tuple(samplelistsorted))
+        for sample in sampledatalist:
+            for steptuple in dattuples.get(sample.name, []):
+                sample.data.append(Measurement(*steptuple))
 
-def input_default(prompt, default):
-    return raw_input("%s" % (prompt)) or default
+    print("\n-----------------------------------------------\n")
+    print("Writing Sample Files\n")
 
-for sample in sampledatalist:
-    datalist = sample.data
-    datalist = sorted(datalist, key = lambda item: item[2])
-    datalist = sorted(datalist, key = lambda item: item[0])    
-    sample.data = datalist
-    samplefile = open(sample.name,"w")
-    if squidconvertmode or combinemode:
-        if combinemode and not(sample.sampfilepresent):
-            samplefile.write(sample.name + "\n")
+    for sample in sampledatalist:
+        sample.data.sort(key = lambda step: step.sortkey) # stable, so Squid steps stay ahead of Spinner and then 2G steps at the same level
+        if squidconvertmode or combinemode:
+            if combinemode and not(sample.sampfilepresent):
+                newfirstline = sample.name + "\n"
+            else:
+                newfirstline = sample.firstline
         else:
-            samplefile.write(sample.firstline)
-    else:
-        samplefile.write(sample.name + "\n")
+            newfirstline = sample.name + "\n"
     
-    if sample.lastdatasource == "Squid":
-        originalcps = sample.coreplatestrike
-        print("\nSample %s: Original core plate strike taken from Squid sample file is: %s" % (sample.name, originalcps))
-        sample.coreplatestrike = input_default("\nPlease enter a new core plate strike for sample %s or hit enter to accept default value (%s): " % (sample.name, originalcps),originalcps)
-        try:   # verify that the coreplatestrike entered is a number.
-            float(sample.coreplatestrike)
-        except ValueError:
-            enterfloat = False
-            while not(enterfloat):
-                sample.coreplatestrike = input_default("\nInvalid response. Core plate strike must be a number.\nPlease re-enter core plate strike or or hit enter to accept default value (%s): " % (originalcps),originalcps)
-                try:
-                    float(sample.coreplatestrike)
-                    enterfloat = True
-                except ValueError:  
-                    enterfloat = False
-
-        originalbd = sample.beddingstrike
-        print("\nSample %s: Original bedding strike taken from Squid sample file is: %s" % (sample.name, originalbd))
-        sample.beddingstrike = input_default("\nPlease enter a new bedding strike for sample %s or hit enter to accept default value (%s): " % (sample.name, originalbd),originalbd)
-        try:   # verify that the beddingstrike entered is a number.
-            float(sample.beddingstrike)
-        except ValueError:
-            enterfloat = False
-            while not(enterfloat):
-                sample.beddingstrike = input_default("\nInvalid response. Bedding strike must be a number.\nPlease re-enter bedding strike or or hit enter to accept default value (%s): " % (originalbd),originalbd)
-                try:
-                    float(sample.coreplatestrike)
-                    enterfloat = True
-                except ValueError:  
-                    enterfloat = False
+        sampleentry = None
+        if siteentry != None:
+            sampleentry = siteentry["samples"].get(sample.name)
+
+        if sampleentry != None:   # strikes given in the manifest replace the ones from the data files.
+            if sampleentry["coreplatestrike"] != None:
+                sample.coreplatestrike = sampleentry["coreplatestrike"]
+                print("Sample %s: Core plate strike taken from the manifest: %s" % (sample.name, sample.coreplatestrike))
+            if sampleentry["beddingstrike"] != None:
+                sample.beddingstrike = sampleentry["beddingstrike"]
+                print("Sample %s: Bedding strike taken from the manifest: %s" % (sample.name, sample.beddingstrike))
+        elif sample.lastdatasource == "Squid" and not(batchmode):   # batch mode keeps the strikes from the Squid sample files.
+            originalcps = sample.coreplatestrike
+            print("\nSample %s: Original core plate strike taken from Squid sample file is: %s" % (sample.name, originalcps))
+            sample.coreplatestrike = input_default("\nPlease enter a new core plate strike for sample %s or hit enter to accept default value (%s): " % (sample.name, originalcps),originalcps)
+            try:   # verify that the coreplatestrike entered is a number.
+                float(sample.coreplatestrike)
+            except ValueError:
+                enterfloat = False
+                while not(enterfloat):
+                    sample.coreplatestrike = input_default("\nInvalid response. Core plate strike must be a number.\nPlease re-enter core plate strike or or hit enter to accept default value (%s): " % (originalcps),originalcps)
+                    try:
+                        float(sample.coreplatestrike)
+                        enterfloat = True
+                    except ValueError:  
+                        enterfloat = False
+
+            originalbd = sample.beddingstrike
+            print("\nSample %s: Original bedding strike taken from Squid sample file is: %s" % (sample.name, originalbd))
+            sample.beddingstrike = input_default("\nPlease enter a new bedding strike for sample %s or hit enter to accept default value (%s): " % (sample.name, originalbd),originalbd)
+            try:   # verify that the beddingstrike entered is a number.
+                float(sample.beddingstrike)
+            except ValueError:
+                enterfloat = False
+                while not(enterfloat):
+                    sample.beddingstrike = input_default("\nInvalid response. Bedding strike must be a number.\nPlease re-enter bedding strike or or hit enter to accept default value (%s): " % (originalbd),originalbd)
+                    try:
+                        float(sample.coreplatestrike)
+                        enterfloat = True
+                    except ValueError:  
+                        enterfloat = False
         
-    cps = float(sample.coreplatestrike)
-    cps_space = (6 - len(str(cps)) ) * " "
-    
-    cpd = float(sample.coreplatedip)
-    cpd_space = (6 - len(str(cpd)) ) * " "
+        cps = float(sample.coreplatestrike)
+        cpd = float(sample.coreplatedip)
+        bs = float(sample.beddingstrike)
+        bd = float(sample.beddingdip)
+        newsecondline = sampleheaderformat.format(("0", cps, cpd, bs, bd, "1.0"))
+
+        samplefile = open(sample.name,"w")
+        samplefile.write(newfirstline + newsecondline + "".join([step.dataline for step in sample.data])) # the whole file in one write
+        samplefile.close()
+        storecachedparse(cachefiles, sample.name, (newfirstline, newsecondline, [(step.dataline, measurementtuple(step)) for step in sample.data]))
+
+    savesitecache(sitename, cachefiles)
+
+    print("All Sample Files Written Successfully!")    
+    print ("\n-----------------------------------------------\n")
+    print ("Other Notes:")
+
+    if yestilt and not(notilt):
+        print ('\n' + "All samples in your site have tilt corrected data.")
+    elif not(yestilt) and notilt:
+        print ('\n' + "Your site does not have any tilt corrected data.")
+    elif yestilt and notilt:
+        print ('\n' + "Your site datafile has a mix of samples with and without a tilt correction.")
+
+    if yesgeog and not(nogeog):
+        print ("All samples in your site have data in geographic coordinates.")
+    elif not(yesgeog) and nogeog:
+        print ("Your datafile does not has geographic coordinates..")
+    elif yesgeog and nogeog:
+        print ("Your site datafile has a mix of samples with and without geographic coordinates.")
     
-    bs = float(sample.beddingstrike)
-    bs_space = (6 - len(str(bs)) ) * " "
-    
-    bd = float(sample.beddingdip)
-    bd_space = (6 - len(str(bd)) ) * " "
-
-    samplefile.write("      0%s%.1f%s%.1f%s%.1f%s%.1f   1.0\n" % (cps_space,cps,cpd_space,cpd,bs_space,bs,bd_space,bd) )
-
-    for step in sample.data:
-        samplefile.write(step[4])
-
-    samplefile.close()
+    if yesspaces and not(nospaces):
+        print ("Your data file use spaces within sample names.")
+    elif not(yesspaces) and nospaces:
+        print ("Your data files do NOT use spaces within sample names.")
+    elif yesspaces and nospaces:
+        print ("Your data files use a mix of some samples names that have spaces and some that do NOT have spaces.")
+
+    if yesdashes and not(nodashes):
+        print ("Your data files use dashes within sample names.")
+    elif not(yesdashes) and nodashes:
+        print ("Your data files do NOT use dashes within sample names.")
+    elif yesdashes and nodashes:
+        print ("Your data files use a mix of some samples names that have dashes and some that do NOT have dashes.")
+
+def findsites(topdir):  # Walks the folder tree and lists every site with a sam file or a jr6 and txt file pair.
+    sitelist = []
+    skippedlist = []
+    for root, dirs, files in os.walk(os.path.abspath(topdir)):
+        dirs[:] = sorted([name for name in dirs if not("Backup" in name)])   # never convert the backed up copies of a site
+        sitenames = set()
+        for name in files:
+            stem, extension = os.path.splitext(name)
+            if extension.lower() in [".sam", ".jr6"]:
+                sitenames.add(stem)
+        for sitename in sorted(sitenames):
+            if os.path.isfile(os.path.join(root, sitename + ".sam")) or os.path.isfile(os.path.join(root, sitename + ".txt")):
+                sitelist.append((root, sitename))
+            else:
+                skippedlist.append((root, sitename, "Jr6 file present but no sam file and no txt file."))
+    return(sitelist, skippedlist)
+
+def manifestvalue(value, description):  # Checks that a manifest value is a number and returns it as the text to write, or None if it is blank.
+    if value == None:
+        return(None)
+    value = str(value).strip()
+    if value == "":
+        return(None)
+    try:
+        float(value)
+    except ValueError:
+        raise ConvertException("Manifest error: %s must be a number, but found: '%s'" % (description, value))
+    return(value)
+
+def readmanifest(manifestname):
+    """
+    Reads a CSV or JSON manifest of site latitudes and longitudes and of sample core plate
+    and bedding strikes. Returns a dictionary of SITE: {"latitude", "longitude", "samples"}.
+    CSV columns: site, sample, latitude, longitude, coreplatestrike, beddingstrike
+      (rows without a sample give the site latitude and longitude).
+    JSON: {"SITE": {"latitude": .., "longitude": .., "samples": {"SAMPLE": {"coreplatestrike": .., "beddingstrike": ..}}}}
+    """
+    manifest = {}
+    def getsiteentry(sitename):
+        return(manifest.setdefault(sitename.strip().upper(), {"latitude":None, "longitude":None, "samples":{}}))
+
+    if manifestname.lower().endswith(".json"):
+        with open(manifestname) as f:
+            try:
+                manifestdata = json.load(f)
+            except ValueError as e:
+                raise ConvertException("Manifest error: %s is not a valid JSON file (%s)" % (manifestname, e))
+        for sitename, sitedata in manifestdata.items():
+            siteentry = getsiteentry(sitename)
+            siteentry["latitude"] = manifestvalue(sitedata.get("latitude"), "latitude of site %s" % sitename)
+            siteentry["longitude"] = manifestvalue(sitedata.get("longitude"), "longitude of site %s" % sitename)
+            for samplename, sampledata in sitedata.get("samples", {}).items():
+                siteentry["samples"][samplename.strip().upper()] = {
+                    "coreplatestrike":manifestvalue(sampledata.get("coreplatestrike"), "core plate strike of sample %s" % samplename),
+                    "beddingstrike":manifestvalue(sampledata.get("beddingstrike"), "bedding strike of sample %s" % samplename)}
+    else:
+        with open(manifestname,'rb') as f:
+            for rownum, row in enumerate(csv.DictReader(f)):
+                if not(row.get("site")):
+                    raise ConvertException("Manifest error: row %s of %s has no site name." % (rownum + 2, manifestname))
+                siteentry = getsiteentry(row["site"])
+                if row.get("sample"):
+                    siteentry["samples"][row["sample"].strip().upper()] = {
+                        "coreplatestrike":manifestvalue(row.get("coreplatestrike"), "core plate strike in row %s" % (rownum + 2)),
+                        "beddingstrike":manifestvalue(row.get("beddingstrike"), "bedding strike in row %s" % (rownum + 2))}
+                else:
+                    siteentry["latitude"] = manifestvalue(row.get("latitude"), "latitude in row %s" % (rownum + 2))
+                    siteentry["longitude"] = manifestvalue(row.get("longitude"), "longitude in row %s" % (rownum + 2))
+    return(manifest)
+
+def convertsitebatch(siteinfo):  # Runs in a worker process: converts one site and returns its result, printed messages and backed up files.
+    global batchmode
+    batchmode = True
+    sitedir, sitename, backupdirname, backupindex, siteentry = siteinfo
+    sitelog = StringIO()
+    sys.stdout = sitelog
+    try:
+        os.chdir(sitedir)
+        convertsite(sitename, backupdirname, backupindex, siteentry)
+        result = "Converted"
+        reason = ""
+    except SkipSiteException as e:
+        result = "Skipped"
+        reason = e.value
+    except ConvertException as e:
+        result = "Failed"
+        reason = e.value
+    except Exception as e:
+        result = "Failed"
+        reason = "%s: %s" % (type(e).__name__, e)
+    finally:
+        sys.stdout = sys.__stdout__
+    return(sitedir, sitename, result, reason, sitelog.getvalue(), backupindex["files"])
+
+def runsites(sitelist, skippedlist, processes, manifest):  # Converts the listed sites without prompting, one site per worker task, and prints a summary.
+    backupindex = loadbackupindex(scriptdir, "Backup") # Each site gets its own Backup folder, reserved here before any worker starts.
+    tasklist = []
+    for sitedir, sitename in sitelist:
+        backupdirname = nextbackupdirname(scriptdir, backupindex)
+        tasklist.append((sitedir, sitename, backupdirname, backupindex, manifest.get(sitename.upper())))
+    savebackupindex(scriptdir, backupindex)
+
+    convertedlist = []
+    failedlist = []
+    if processes == 1:   # no need for worker processes
+        pool = None
+        results = (convertsitebatch(task) for task in tasklist)
+    else:
+        pool = multiprocessing.Pool(processes)
+        results = pool.imap_unordered(convertsitebatch, tasklist)
+    for sitedir, sitename, result, reason, sitelog, backedupfiles in results:
+        backupindex["files"].update(backedupfiles)
+        print("\n----- Site %s (%s): %s -----" % (sitename, sitedir, result))
+        print(sitelog)
+        if result == "Converted":
+            convertedlist.append((sitedir, sitename))
+        elif result == "Skipped":
+            skippedlist.append((sitedir, sitename, reason))
+        else:
+            failedlist.append((sitedir, sitename, reason))
+    if pool != None:
+        pool.close()
+        pool.join()
+    savebackupindex(scriptdir, backupindex)
+
+    print("\n===============================================\n")
+    print("Batch Summary: %s sites converted, %s sites skipped, %s sites failed." % (len(convertedlist), len(skippedlist), len(failedlist)))
+    if convertedlist:
+        print("\nConverted:")
+        for sitedir, sitename in sorted(convertedlist):
+            print("  %s (%s)" % (sitename, sitedir))
+    if skippedlist:
+        print("\nSkipped:")
+        for sitedir, sitename, reason in sorted(skippedlist):
+            print("  %s (%s): %s" % (sitename, sitedir, reason))
+    if failedlist:
+        print("\nFailed:")
+        for sitedir, sitename, reason in sorted(failedlist):
+            print("  %s (%s): %s" % (sitename, sitedir, reason))
+    return(failedlist)
+
+def runbatch(topdir, processes, manifest):  # Converts every site found under topdir in parallel.
+    sitelist, skippedlist = findsites(topdir)
+    print('\n' + "%s sites found under folder %s." % (len(sitelist), os.path.abspath(topdir)))
+    return(runsites(sitelist, skippedlist, processes, manifest))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Converts and/or combines Spinner and Rapid Squid data files into Rapid Squid format.")
+    parser.add_argument("--batch", metavar="FOLDER", help="convert every site found in FOLDER and its subfolders without prompting")
+    parser.add_argument("--site", metavar="NAME", help="convert the site NAME in the current folder without prompting")
+    parser.add_argument("--manifest", metavar="FILE", help="CSV or JSON file of site latitudes/longitudes and sample strikes to use instead of prompting")
+    parser.add_argument("--processes", metavar="N", type=int, default=None, help="number of worker processes used with --batch (default: one per CPU)")
+    args = parser.parse_args()
+
+    if args.batch and args.site:
+        parser.error("use either --batch or --site, not both")
+    if args.manifest and not(args.batch or args.site):
+        parser.error("--manifest needs --batch or --site")
+
+    manifest = {}
+    if args.manifest:
+        try:
+            manifest = readmanifest(args.manifest)
+        except ConvertException as e:
+            print('\n' + e.value)
+            sys.exit(1)
+        except IOError as e:
+            print('\n' + "Manifest error: %s" % e)
+            sys.exit(1)
+
+    if args.batch:
+        failedlist = runbatch(args.batch, args.processes, manifest)
+    elif args.site:
+        failedlist = runsites([(os.getcwd(), args.site.upper())], [], 1, manifest)
+
+    if args.batch or args.site:
+        if failedlist:
+            sys.exit(1)
+    else:
+        os.system('mode con: cols=150 lines=60')
+        backupindex = loadbackupindex(scriptdir, "Backup")
+        backupdirname = nextbackupdirname(scriptdir, backupindex)
 
-print("All Sample Files Written Successfully!")    
-print ("\n-----------------------------------------------\n")
-print ("Other Notes:")
+        print('\n' + "Hello. This script is ready to convert/combine your Jr6 Spinner and Rapid Squid data files for a single data.")
+        print ("\nWARNING: This script will OVERWRITE any Rapid Squid datafiles in this folder. It is recommended that you back up your original datafiles before proceeding...")
+        print (" - HOWEVER: This script will automatically back up your original datafiles into a backup folder, \"%s\"." % backupdirname)
+        sitename = raw_input('\n' + "Please enter the site name: ")
 
-if yestilt and not(notilt):
-    print ('\n' + "All samples in your site have tilt corrected data.")
-elif not(yestilt) and notilt:
-    print ('\n' + "Your site does not have any tilt corrected data.")
-elif yestilt and notilt:
-    print ('\n' + "Your site datafile has a mix of samples with and without a tilt correction.")
+        convertsite(sitename, backupdirname, backupindex)
 
-if yesgeog and not(nogeog):
-    print ("All samples in your site have data in geographic coordinates.")
-elif not(yesgeog) and nogeog:
-    print ("Your datafile does not has geographic coordinates..")
-elif yesgeog and nogeog:
-    print ("Your site datafile has a mix of samples with and without geographic coordinates.")
-    
-if yesspaces and not(nospaces):
-    print ("Your data file use spaces within sample names.")
-elif not(yesspaces) and nospaces:
-    print ("Your data files do NOT use spaces within sample names.")
-elif yesspaces and nospaces:
-    print ("Your data files use a mix of some samples names that have spaces and some that do NOT have spaces.")
-
-if yesdashes and not(nodashes):
-    print ("Your data files use dashes within sample names.")
-elif not(yesdashes) and nodashes:
-    print ("Your data files do NOT use dashes within sample names.")
-elif yesdashes and nodashes:
-    print ("Your data files use a mix of some samples names that have dashes and some that do NOT have dashes.")
-    
-endchoice = raw_input('\n' + "----- Program complete. Goodbye! Please press enter to exit. -----")
+        endchoice = raw_input('\n' + "----- Program complete. Goodbye! Please press enter to exit. -----")
@@ -66,6 +66,7 @@ else:
 
 print ("Opening workbook %s" % excelfilename)
 from xlrd import open_workbook
+from workbookreader import readsheet, rowcount, sitesdata, measurementsdata
 wb = open_workbook(excelfilename)
 
 degree_sign = u'\xb0'
@@ -84,227 +85,205 @@ sampleFile.write('\n' + "<Folder>")
 sampleFile.write('\n' + "   <name>Sites</name>")
 sampleFile.write('\n' + "	<open>1</open>")
 
-for sheet in wb.sheets(): # Write Site KML Code
-    if sheet.name == sitesheet:
-        number_of_rows = sheet.nrows
-        number_of_columns = sheet.ncols
-        
-        for row in range(1, number_of_rows):
-            rowitems = []
-            values = []
-            for col in range(number_of_columns):
-                value  = (sheet.cell(row,col).value)
-                rowitems.append(value)
+sites = readsheet(wb, sitesheet, sitesdata)
+for row in range(rowcount(sites)): # Write Site KML Code
+    sitenum = sites["sitenum"][row]
+    sitename = sites["sitename"][row]
+    latitude = sites["latitude"][row]
+    longitude = sites["longitude"][row]
+    dipdir = sites["dipdir"][row]
+    dip = sites["dip"][row]
 
-            sitenum = int(round(rowitems[0]))
-            sitename = rowitems[1]
-            latitude = rowitems[2]
-            longitude = rowitems[3]
-            sitedec = rowitems[4]
-            sitedec_stdev = rowitems[5]
-            dipdir = rowitems[6]
-            measnum = rowitems[7]
-            dip = rowitems[10]
-            
-            structuralnotes = rowitems[11]
-            structuralnotes_decoded = structuralnotes.replace(linebreak,"  ").replace(leftsinglequote, "'").replace(rightsinglequote, "'").replace(leftdoublequote, "\"").replace(rightdoublequote, "\"").replace(endash,"--").replace(emdash,"--").replace(degree_symbol," degrees").encode('latin1')
+    structuralnotes = sites["structuralnotes"][row]
+    structuralnotes_decoded = structuralnotes.replace(linebreak,"  ").replace(leftsinglequote, "'").replace(rightsinglequote, "'").replace(leftdoublequote, "\"").replace(rightdoublequote, "\"").replace(endash,"--").replace(emdash,"--").replace(degree_symbol," degrees").encode('latin1')
 
-            sitenotes = rowitems[12]
-            sitenotes_decoded = sitenotes.replace(linebreak,"  ").replace(leftsinglequote, "'").replace(rightsinglequote, "'").replace(leftdoublequote, "\"").replace(rightdoublequote, "\"").replace(endash,"--").replace(emdash,"--").replace(degree_symbol," degrees").encode('latin1')
+    sitenotes = sites["sitenotes"][row]
+    sitenotes_decoded = sitenotes.replace(linebreak,"  ").replace(leftsinglequote, "'").replace(rightsinglequote, "'").replace(leftdoublequote, "\"").replace(rightdoublequote, "\"").replace(endash,"--").replace(emdash,"--").replace(degree_symbol," degrees").encode('latin1')
 
-            sampleFile.write('\n' + "	<Document>")
-            sampleFile.write('\n' + "		<name>%s. %s (Site)</name>" % (sitenum, sitename))
-            sampleFile.write('\n' + "		<StyleMap id=\"m_ylw-pushpin\">")
-            sampleFile.write('\n' + "			<Pair>")
-            sampleFile.write('\n' + "				<key>normal</key>")
-            sampleFile.write('\n' + "				<styleUrl>#s_ylw-pushpin</styleUrl>")
-            sampleFile.write('\n' + "			</Pair>")
-            sampleFile.write('\n' + "			<Pair>")
-            sampleFile.write('\n' + "				<key>highlight</key>")
-            sampleFile.write('\n' + "				<styleUrl>#s_ylw-pushpin_hl</styleUrl>")
-            sampleFile.write('\n' + "			</Pair>")
-            sampleFile.write('\n' + "		</StyleMap>")
-            sampleFile.write('\n' + "		<Style id=\"s_ylw-pushpin\">")
-            sampleFile.write('\n' + "			<IconStyle>")
-            sampleFile.write('\n' + "				<scale>1.1</scale>")
-            sampleFile.write('\n' + "				<Icon>")
-            sampleFile.write('\n' + "					<href>http://maps.google.com/mapfiles/kml/pushpin/ylw-pushpin.png</href>")
-            sampleFile.write('\n' + "				</Icon>")
-            sampleFile.write('\n' + "				<hotSpot x=\"20\" y=\"2\" xunits=\"pixels\" yunits=\"pixels\"/>")
-            sampleFile.write('\n' + "			</IconStyle>")
-            sampleFile.write('\n' + "		</Style>")
-            sampleFile.write('\n' + "		<Style id=\"s_ylw-pushpin_hl\">")
-            sampleFile.write('\n' + "			<IconStyle>")
-            sampleFile.write('\n' + "				<scale>1.3</scale>")
-            sampleFile.write('\n' + "				<Icon>")
-            sampleFile.write('\n' + "					<href>http://maps.google.com/mapfiles/kml/pushpin/ylw-pushpin.png</href>")
-            sampleFile.write('\n' + "				</Icon>")
-            sampleFile.write('\n' + "				<hotSpot x=\"20\" y=\"2\" xunits=\"pixels\" yunits=\"pixels\"/>")
-            sampleFile.write('\n' + "			</IconStyle>")
-            sampleFile.write('\n' + "		</Style>")
-            sampleFile.write('\n' + "		<Placemark>")
-            sampleFile.write('\n' + "			<name>%s. %s</name>" % (sitenum, sitename))
-            sampleFile.write('\n' + "			<LookAt>")
-            sampleFile.write('\n' + "				<longitude>%s</longitude>" % longitude)
-            sampleFile.write('\n' + "				<latitude>%s</latitude>" % latitude)
-            sampleFile.write('\n' + "            		<altitude>0</altitude>")
-            sampleFile.write('\n' + "				<heading>-2.153898092502043e-007</heading>")
-            sampleFile.write('\n' + "				<tilt>0</tilt>")
-            sampleFile.write('\n' + "				<range>8412.23478461989</range>")
-            sampleFile.write('\n' + "				<gx:altitudeMode>relativeToSeaFloor</gx:altitudeMode>")
-            sampleFile.write('\n' + "			</LookAt>")
-            sampleFile.write('\n' + "			<styleUrl>#m_ylw-pushpin</styleUrl>")
-            sampleFile.write('\n' + "			<Point>")
-            sampleFile.write('\n' + "				<gx:drawOrder>1</gx:drawOrder>")
-            sampleFile.write('\n' + "				<coordinates>%s,%s</coordinates>" % (longitude, latitude))
-            sampleFile.write('\n' + "			</Point>")
-            sampleFile.write('\n' + "			<name>%s. Site %s</name>" % (sitenum, sitename))
-            sampleFile.write('\n' + "			<description><p><b>Site %s Notes:</b> %s</p>" % (sitename, sitenotes_decoded))
-            sampleFile.write('\n' + "			             <p><b>Site %s Structural Data:</b><br>Dip: %s" % (sitename, dip))
-            sampleFile.write(degree_sign.encode('utf8'))
-            sampleFile.write("</br><br>Dip Dir: %s" % dipdir)
-            sampleFile.write (degree_sign.encode('utf8'))
-            sampleFile.write(".</br></p>")
-            sampleFile.write('\n' + "			             <p><b>Site %s Structural Notes:</b> " % sitename)
-            sampleFile.write("%s</p></description>" % (structuralnotes_decoded))
-            sampleFile.write('\n' + "		</Placemark>")
-            sampleFile.write('\n' + "	</Document>")
-            sampleFile.write('\n')
+    sampleFile.write('\n' + "	<Document>")
+    sampleFile.write('\n' + "		<name>%s. %s (Site)</name>" % (sitenum, sitename))
+    sampleFile.write('\n' + "		<StyleMap id=\"m_ylw-pushpin\">")
+    sampleFile.write('\n' + "			<Pair>")
+    sampleFile.write('\n' + "				<key>normal</key>")
+    sampleFile.write('\n' + "				<styleUrl>#s_ylw-pushpin</styleUrl>")
+    sampleFile.write('\n' + "			</Pair>")
+    sampleFile.write('\n' + "			<Pair>")
+    sampleFile.write('\n' + "				<key>highlight</key>")
+    sampleFile.write('\n' + "				<styleUrl>#s_ylw-pushpin_hl</styleUrl>")
+    sampleFile.write('\n' + "			</Pair>")
+    sampleFile.write('\n' + "		</StyleMap>")
+    sampleFile.write('\n' + "		<Style id=\"s_ylw-pushpin\">")
+    sampleFile.write('\n' + "			<IconStyle>")
+    sampleFile.write('\n' + "				<scale>1.1</scale>")
+    sampleFile.write('\n' + "				<Icon>")
+    sampleFile.write('\n' + "					<href>http://maps.google.com/mapfiles/kml/pushpin/ylw-pushpin.png</href>")
+    sampleFile.write('\n' + "				</Icon>")
+    sampleFile.write('\n' + "				<hotSpot x=\"20\" y=\"2\" xunits=\"pixels\" yunits=\"pixels\"/>")
+    sampleFile.write('\n' + "			</IconStyle>")
+    sampleFile.write('\n' + "		</Style>")
+    sampleFile.write('\n' + "		<Style id=\"s_ylw-pushpin_hl\">")
+    sampleFile.write('\n' + "			<IconStyle>")
+    sampleFile.write('\n' + "				<scale>1.3</scale>")
+    sampleFile.write('\n' + "				<Icon>")
+    sampleFile.write('\n' + "					<href>http://maps.google.com/mapfiles/kml/pushpin/ylw-pushpin.png</href>")
+    sampleFile.write('\n' + "				</Icon>")
+    sampleFile.write('\n' + "				<hotSpot x=\"20\" y=\"2\" xunits=\"pixels\" yunits=\"pixels\"/>")
+    sampleFile.write('\n' + "			</IconStyle>")
+    sampleFile.write('\n' + "		</Style>")
+    sampleFile.write('\n' + "		<Placemark>")
+    sampleFile.write('\n' + "			<name>%s. %s</name>" % (sitenum, sitename))
+    sampleFile.write('\n' + "			<LookAt>")
+    sampleFile.write('\n' + "				<longitude>%s</longitude>" % longitude)
+    sampleFile.write('\n' + "				<latitude>%s</latitude>" % latitude)
+    sampleFile.write('\n' + "            		<altitude>0</altitude>")
+    sampleFile.write('\n' + "				<heading>-2.153898092502043e-007</heading>")
+    sampleFile.write('\n' + "				<tilt>0</tilt>")
+    sampleFile.write('\n' + "				<range>8412.23478461989</range>")
+    sampleFile.write('\n' + "				<gx:altitudeMode>relativeToSeaFloor</gx:altitudeMode>")
+    sampleFile.write('\n' + "			</LookAt>")
+    sampleFile.write('\n' + "			<styleUrl>#m_ylw-pushpin</styleUrl>")
+    sampleFile.write('\n' + "			<Point>")
+    sampleFile.write('\n' + "				<gx:drawOrder>1</gx:drawOrder>")
+    sampleFile.write('\n' + "				<coordinates>%s,%s</coordinates>" % (longitude, latitude))
+    sampleFile.write('\n' + "			</Point>")
+    sampleFile.write('\n' + "			<name>%s. Site %s</name>" % (sitenum, sitename))
+    sampleFile.write('\n' + "			<description><p><b>Site %s Notes:</b> %s</p>" % (sitename, sitenotes_decoded))
+    sampleFile.write('\n' + "			             <p><b>Site %s Structural Data:</b><br>Dip: %s" % (sitename, dip))
+    sampleFile.write(degree_sign.encode('utf8'))
+    sampleFile.write("</br><br>Dip Dir: %s" % dipdir)
+    sampleFile.write (degree_sign.encode('utf8'))
+    sampleFile.write(".</br></p>")
+    sampleFile.write('\n' + "			             <p><b>Site %s Structural Notes:</b> " % sitename)
+    sampleFile.write("%s</p></description>" % (structuralnotes_decoded))
+    sampleFile.write('\n' + "		</Placemark>")
+    sampleFile.write('\n' + "	</Document>")
+    sampleFile.write('\n')
 sampleFile.write("</Folder>" + '\n') # Write End of Site Folder
 
 sampleFile.write('\n' + "<Folder>") # Write Folder for Measurements
 sampleFile.write('\n' + "<name>Dip/Dip Dir Measurements</name>")
 sampleFile.write('\n' + "	<open>1</open>")
 
-for sheet in wb.sheets(): # Write measurement kml code
-    if sheet.name == measuresheet:
-        number_of_rows = sheet.nrows
-        number_of_columns = sheet.ncols
-        for row in range(1, number_of_rows):
-            rowitems = []
-            values = []
-            for col in range(number_of_columns):
-                value  = (sheet.cell(row,col).value)
-                rowitems.append(value)
+measurements = readsheet(wb, measuresheet, measurementsdata)
+for row in range(rowcount(measurements)): # Write measurement kml code
+    measnum = measurements["measnum"][row]
+    latitude = measurements["latitude"][row]
+    longitude = measurements["longitude"][row]
 
-            measnum = int(round(rowitems[0]))
-            latitude = rowitems[1]
-            longitude = rowitems[2]
+    dip = measurements["dip"][row]
+    dipdir = measurements["dipdir"][row]
+    if dipdir > 352:
+        dipdir = 0            
+    arrownum = min(arrownumlist, key=lambda x:abs(x-dipdir))
 
-            dip = int(round(rowitems[4]))
-            dipdir = int(round(rowitems[5]))
-            if dipdir > 352:
-                dipdir = 0            
-            arrownum = min(arrownumlist, key=lambda x:abs(x-dipdir))
+    uncorrecteddipdir_text = measurements["uncorrecteddipdir"][row]
+    try:
+        uncorrecteddipdir = int(uncorrecteddipdir_text)
+    except:
+        uncorrecteddipdir = uncorrecteddipdir_text.replace(linebreak,"  ").replace(leftsinglequote, "'").replace(rightsinglequote, "'").replace(leftdoublequote, "\"").replace(rightdoublequote, "\"").replace(endash,"--").replace(emdash,"--").replace(degree_symbol," degrees").encode('latin1')
+    
+    deccorrection_text = measurements["deccorrection"][row]
+    try:
+        deccorrection = int(deccorrection_text)
+    except:
+        deccorrection = deccorrection_text.replace(linebreak,"  ").replace(leftsinglequote, "'").replace(rightsinglequote, "'").replace(leftdoublequote, "\"").replace(rightdoublequote, "\"").replace(endash,"--").replace(emdash,"--").replace(degree_symbol," degrees").encode('latin1')
 
-            uncorrecteddipdir_text = rowitems[6]
-            try:
-                uncorrecteddipdir = int(uncorrecteddipdir_text)
-            except:
-                uncorrecteddipdir = uncorrecteddipdir_text.replace(linebreak,"  ").replace(leftsinglequote, "'").replace(rightsinglequote, "'").replace(leftdoublequote, "\"").replace(rightdoublequote, "\"").replace(endash,"--").replace(emdash,"--").replace(degree_symbol," degrees").encode('latin1')
-            
-            deccorrection_text = rowitems[7]
-            try:
-                deccorrection = int(deccorrection_text)
-            except:
-                deccorrection = deccorrection_text.replace(linebreak,"  ").replace(leftsinglequote, "'").replace(rightsinglequote, "'").replace(leftdoublequote, "\"").replace(rightdoublequote, "\"").replace(endash,"--").replace(emdash,"--").replace(degree_symbol," degrees").encode('latin1')
+    measurementOK_text = measurements["measurementOK"][row]
+    measurementOK_text_decoded = measurementOK_text.replace(linebreak,"  ").replace(leftsinglequote, "'").replace(rightsinglequote, "'").replace(leftdoublequote, "\"").replace(rightdoublequote, "\"").replace(endash,"--").replace(emdash,"--").replace(degree_symbol," degrees").encode('latin1')
+    if measurementOK_text_decoded == "":
+        measurementOK_text_decoded = "??"
+    if measurementOK_text_decoded == "Yes":
+        arrowcolor = goodcolor
+        arrowpath = goodarrowpath
+    else:
+        arrowcolor = badcolor
+        arrowpath = badarrowpath
 
-            measurementOK_text = rowitems[8]
-            measurementOK_text_decoded = measurementOK_text.replace(linebreak,"  ").replace(leftsinglequote, "'").replace(rightsinglequote, "'").replace(leftdoublequote, "\"").replace(rightdoublequote, "\"").replace(endash,"--").replace(emdash,"--").replace(degree_symbol," degrees").encode('latin1')
-            if measurementOK_text_decoded == "":
-                measurementOK_text_decoded = "??"
-            if measurementOK_text_decoded == "Yes":
-                arrowcolor = goodcolor
-                arrowpath = goodarrowpath
-            else:
-                arrowcolor = badcolor
-                arrowpath = badarrowpath
+    dec_explanation = measurements["dec_explanation"][row]
+    dec_explanation_decoded = dec_explanation.replace(linebreak,"  ").replace(leftsinglequote, "'").replace(rightsinglequote, "'").replace(leftdoublequote, "\"").replace(rightdoublequote, "\"").replace(endash,"--").replace(emdash,"--").replace(degree_symbol," degrees").encode('latin1')
+    
+    tripnotes = measurements["tripnotes"][row]
+    tripnotes_decoded = tripnotes.replace(linebreak,"  ").replace(leftsinglequote, "'").replace(rightsinglequote, "'").replace(leftdoublequote, "\"").replace(rightdoublequote, "\"").replace(endash,"--").replace(emdash,"--").replace(degree_symbol," degrees").encode('latin1')
+    
+    lithnotes = measurements["lithnotes"][row]
+    lithnotes_decoded = lithnotes.replace(linebreak,"  ").replace(leftsinglequote, "'").replace(rightsinglequote, "'").replace(leftdoublequote, "\"").replace(rightdoublequote, "\"").replace(endash,"--").replace(emdash,"--").replace(degree_symbol," degrees").encode('latin1')
 
-            dec_explanation = rowitems[9]
-            dec_explanation_decoded = dec_explanation.replace(linebreak,"  ").replace(leftsinglequote, "'").replace(rightsinglequote, "'").replace(leftdoublequote, "\"").replace(rightdoublequote, "\"").replace(endash,"--").replace(emdash,"--").replace(degree_symbol," degrees").encode('latin1')
-            
-            tripnotes = rowitems[10]
-            tripnotes_decoded = tripnotes.replace(linebreak,"  ").replace(leftsinglequote, "'").replace(rightsinglequote, "'").replace(leftdoublequote, "\"").replace(rightdoublequote, "\"").replace(endash,"--").replace(emdash,"--").replace(degree_symbol," degrees").encode('latin1')
-            
-            lithnotes = rowitems[11]
-            lithnotes_decoded = lithnotes.replace(linebreak,"  ").replace(leftsinglequote, "'").replace(rightsinglequote, "'").replace(leftdoublequote, "\"").replace(rightdoublequote, "\"").replace(endash,"--").replace(emdash,"--").replace(degree_symbol," degrees").encode('latin1')
-
-            sampleFile.write('\n' + "<Document>")
-            sampleFile.write('\n' + "	<name>%s. Dip/Dip Dir: %s" % (measnum, dip) + degree_sign.encode('utf8') + "/%s" % dipdir + degree_sign.encode('utf8') + "</name>")
-            sampleFile.write('\n' + "	<Style id=\"sh_Arrow%s\">" % arrownum + '\n')
-            sampleFile.write('\n' + "	<color>%s</color>" % arrowcolor)
-            sampleFile.write('\n' + "		<IconStyle>")
-            sampleFile.write('\n' + "			<Icon>")
-            sampleFile.write('\n' + "				<href>%s%s.png</href>" % (arrowpath, arrownum) + '\n')
-            sampleFile.write('\n' + "			</Icon>")
-            sampleFile.write('\n' + "			<hotSpot x=\"1.0\" y=\"1.0\" xunits=\"fraction\" yunits=\"fraction\"/>")
-            sampleFile.write('\n' + "		</IconStyle>")            
-            sampleFile.write('\n' + "		<LabelStyle>")
-            sampleFile.write('\n' + "			<color>ff00ffff</color>")
-            sampleFile.write('\n' + "		</LabelStyle>")
-            sampleFile.write('\n' + "		<ListStyle>")
-            sampleFile.write('\n' + "		</ListStyle>")
-            sampleFile.write('\n' + "	</Style>")
-            sampleFile.write('\n' + "	<StyleMap id=\"msn_Arrow%s\">" % arrownum + '\n')
-            sampleFile.write('\n' + "		<Pair>")
-            sampleFile.write('\n' + "			<key>normal</key>")
-            sampleFile.write('\n' + "			<styleUrl>#sn_Arrow%s</styleUrl>" % arrownum + '\n')
-            sampleFile.write('\n' + "		</Pair>")
-            sampleFile.write('\n' + "		<Pair>")
-            sampleFile.write('\n' + "			<key>highlight</key>")
-            sampleFile.write('\n' + "			<styleUrl>#sh_Arrow%s</styleUrl>" % arrownum + '\n')
-            sampleFile.write('\n' + "		</Pair>")
-            sampleFile.write('\n' + "  </StyleMap>")
-            sampleFile.write('\n' + "	<Style id=\"sn_Arrow%s\">" % arrownum + '\n')
-            sampleFile.write('\n' + "		<IconStyle>")
-            sampleFile.write('\n' + "			<color>%s</color>" % arrowcolor)
-            sampleFile.write('\n' + "			<Icon>")
-            sampleFile.write('\n' + "				<href>%s%s.png</href>" % (arrowpath, arrownum) + '\n')
-            sampleFile.write('\n' + "			</Icon>")
-            sampleFile.write('\n' + "			<hotSpot x=\"1.0\" y=\"1.0\" xunits=\"fraction\" yunits=\"fraction\"/>")
-            sampleFile.write('\n' + "		</IconStyle>")
-            sampleFile.write('\n' + "		<LabelStyle>")
-            sampleFile.write('\n' + "			<color>ff00ffff</color>" )
-            sampleFile.write('\n' + "		</LabelStyle>")
-            sampleFile.write('\n' + "		<ListStyle>")
-            sampleFile.write('\n' + "		</ListStyle>")
-            sampleFile.write('\n' + "	</Style>")
-            sampleFile.write('\n' + "	<Placemark>")           
-            sampleFile.write('\n' + "		<name>%s. Dip/Dip Dir: %s" % (measnum, dip) + degree_sign.encode('utf8') +"/%s" % dipdir + degree_sign.encode('utf8') + "</name>")
-            sampleFile.write('\n' + "		<description><![CDATA[<TABLE><TR><TD><img src=\"file:///%s%s.png\"/></TD><TD><b>Dip:</b> %s" % (arrowpath, arrownum, dip) + degree_sign.encode('utf8') +
-                                    "<BR><b>Dip Dir (Corrected):</b> %s" % (dipdir) + degree_sign.encode('utf8') +
-                                    "<BR></TD></TR></TABLE><BR><b>Uncorrected Dip Dir:</b> %s" % (uncorrecteddipdir) + degree_sign.encode('utf8') +
-                                    "<BR><BR><b>Dec Correction Applied in Calculations To Restore to True Dip Dir:</b> %s" % (deccorrection) + degree_sign.encode('utf8') + 
-                                    "<BR><BR><b>Am I Absolutely 100%% Sure About Dec Correction Based Upon Field Notes?</b> %s<BR><i>...Explanation:</i> %s<BR><BR><b>Trip Notes:</b> %s<BR><BR><b>Site Notes:</b> %s]]></description>" % (measurementOK_text_decoded, dec_explanation_decoded, tripnotes_decoded, lithnotes_decoded))
-            sampleFile.write('\n' + "		<LookAt>")
-            sampleFile.write('\n' + "			<longitude>%s</longitude>" % longitude)
-            sampleFile.write('\n' + "			<latitude>%s</latitude>" % latitude + '\n')
-            sampleFile.write('\n' + "			<altitude>0</altitude>")
-            sampleFile.write('\n' + "			<heading>0.005035767148373351</heading>")
-            sampleFile.write('\n' + "			<tilt>0</tilt>")
-            sampleFile.write('\n' + "			<range>2322.042274646679</range>")
-            sampleFile.write('\n' + "			<gx:altitudeMode>relativeToSeaFloor</gx:altitudeMode>")
-            sampleFile.write('\n' + "		</LookAt>")
-            if not (measnum in weirdset) and 1==2:
-                sampleFile.write('\n' + "		<styleUrl>#msn_Arrow%s</styleUrl>" % arrownum + '\n')
-            else:
-                sampleFile.write('\n' + "  <StyleMap id=\"msn_Arrow%s\">" % arrownum + '\n')
-                sampleFile.write('\n' + "		<Pair>")
-                sampleFile.write('\n' + "			<key>normal</key>")
-                sampleFile.write('\n' + "			<styleUrl>#sn_Arrow%s</styleUrl>" % arrownum + '\n')
-                sampleFile.write('\n' + "		</Pair>")
-                sampleFile.write('\n' + "		<Pair>")
-                sampleFile.write('\n' + "			<key>highlight</key>")
-                sampleFile.write('\n' + "			<styleUrl>#sh_Arrow%s</styleUrl>" % arrownum + '\n')
-                sampleFile.write('\n' + "		</Pair>")
-                sampleFile.write('\n' + "  </StyleMap>")
-            sampleFile.write('\n' + "		<Point>")
-            sampleFile.write('\n' + "			<gx:drawOrder>1</gx:drawOrder>")
-            sampleFile.write('\n' + "			<coordinates>%s,%s,0</coordinates>"  % (longitude, latitude) + '\n')
-            sampleFile.write('\n' + "		</Point>")
-            sampleFile.write('\n' + "	</Placemark>")
-            sampleFile.write('\n' + "</Document>")
-            sampleFile.write('\n')
+    sampleFile.write('\n' + "<Document>")
+    sampleFile.write('\n' + "	<name>%s. Dip/Dip Dir: %s" % (measnum, dip) + degree_sign.encode('utf8') + "/%s" % dipdir + degree_sign.encode('utf8') + "</name>")
+    sampleFile.write('\n' + "	<Style id=\"sh_Arrow%s\">" % arrownum + '\n')
+    sampleFile.write('\n' + "	<color>%s</color>" % arrowcolor)
+    sampleFile.write('\n' + "		<IconStyle>")
+    sampleFile.write('\n' + "			<Icon>")
+    sampleFile.write('\n' + "				<href>%s%s.png</href>" % (arrowpath, arrownum) + '\n')
+    sampleFile.write('\n' + "			</Icon>")
+    sampleFile.write('\n' + "			<hotSpot x=\"1.0\" y=\"1.0\" xunits=\"fraction\" yunits=\"fraction\"/>")
+    sampleFile.write('\n' + "		</IconStyle>")            
+    sampleFile.write('\n' + "		<LabelStyle>")
+    sampleFile.write('\n' + "			<color>ff00ffff</color>")
+    sampleFile.write('\n' + "		</LabelStyle>")
+    sampleFile.write('\n' + "		<ListStyle>")
+    sampleFile.write('\n' + "		</ListStyle>")
+    sampleFile.write('\n' + "	</Style>")
+    sampleFile.write('\n' + "	<StyleMap id=\"msn_Arrow%s\">" % arrownum + '\n')
+    sampleFile.write('\n' + "		<Pair>")
+    sampleFile.write('\n' + "			<key>normal</key>")
+    sampleFile.write('\n' + "			<styleUrl>#sn_Arrow%s</styleUrl>" % arrownum + '\n')
+    sampleFile.write('\n' + "		</Pair>")
+    sampleFile.write('\n' + "		<Pair>")
+    sampleFile.write('\n' + "			<key>highlight</key>")
+    sampleFile.write('\n' + "			<styleUrl>#sh_Arrow%s</styleUrl>" % arrownum + '\n')
+    sampleFile.write('\n' + "		</Pair>")
+    sampleFile.write('\n' + "  </StyleMap>")
+    sampleFile.write('\n' + "	<Style id=\"sn_Arrow%s\">" % arrownum + '\n')
+    sampleFile.write('\n' + "		<IconStyle>")
+    sampleFile.write('\n' + "			<color>%s</color>" % arrowcolor)
+    sampleFile.write('\n' + "			<Icon>")
+    sampleFile.write('\n' + "				<href>%s%s.png</href>" % (arrowpath, arrownum) + '\n')
+    sampleFile.write('\n' + "			</Icon>")
+    sampleFile.write('\n' + "			<hotSpot x=\"1.0\" y=\"1.0\" xunits=\"fraction\" yunits=\"fraction\"/>")
+    sampleFile.write('\n' + "		</IconStyle>")
+    sampleFile.write('\n' + "		<LabelStyle>")
+    sampleFile.write('\n' + "			<color>ff00ffff</color>" )
+    sampleFile.write('\n' + "		</LabelStyle>")
+    sampleFile.write('\n' + "		<ListStyle>")
+    sampleFile.write('\n' + "		</ListStyle>")
+    sampleFile.write('\n' + "	</Style>")
+    sampleFile.write('\n' + "	<Placemark>")           
+    sampleFile.write('\n' + "		<name>%s. Dip/Dip Dir: %s" % (measnum, dip) + degree_sign.encode('utf8') +"/%s" % dipdir + degree_sign.encode('utf8') + "</name>")
+    sampleFile.write('\n' + "		<description><![CDATA[<TABLE><TR><TD><img src=\"file:///%s%s.png\"/></TD><TD><b>Dip:</b> %s" % (arrowpath, arrownum, dip) + degree_sign.encode('utf8') +
+                            "<BR><b>Dip Dir (Corrected):</b> %s" % (dipdir) + degree_sign.encode('utf8') +
+                            "<BR></TD></TR></TABLE><BR><b>Uncorrected Dip Dir:</b> %s" % (uncorrecteddipdir) + degree_sign.encode('utf8') +
+                            "<BR><BR><b>Dec Correction Applied in Calculations To Restore to True Dip Dir:</b> %s" % (deccorrection) + degree_sign.encode('utf8') + 
+                            "<BR><BR><b>Am I Absolutely 100%% Sure About Dec Correction Based Upon Field Notes?</b> %s<BR><i>...Explanation:</i> %s<BR><BR><b>Trip Notes:</b> %s<BR><BR><b>Site Notes:</b> %s]]></description>" % (measurementOK_text_decoded, dec_explanation_decoded, tripnotes_decoded, lithnotes_decoded))
+    sampleFile.write('\n' + "		<LookAt>")
+    sampleFile.write('\n' + "			<longitude>%s</longitude>" % longitude)
+    sampleFile.write('\n' + "			<latitude>%s</latitude>" % latitude + '\n')
+    sampleFile.write('\n' + "			<altitude>0</altitude>")
+    sampleFile.write('\n' + "			<heading>0.005035767148373351</heading>")
+    sampleFile.write('\n' + "			<tilt>0</tilt>")
+    sampleFile.write('\n' + "			<range>2322.042274646679</range>")
+    sampleFile.write('\n' + "			<gx:altitudeMode>relativeToSeaFloor</gx:altitudeMode>")
+    sampleFile.write('\n' + "		</LookAt>")
+    if not (measnum in weirdset) and 1==2:
+        sampleFile.write('\n' + "		<styleUrl>#msn_Arrow%s</styleUrl>" % arrownum + '\n')
+    else:
+        sampleFile.write('\n' + "  <StyleMap id=\"msn_Arrow%s\">" % arrownum + '\n')
+        sampleFile.write('\n' + "		<Pair>")
+        sampleFile.write('\n' + "			<key>normal</key>")
+        sampleFile.write('\n' + "			<styleUrl>#sn_Arrow%s</styleUrl>" % arrownum + '\n')
+        sampleFile.write('\n' + "		</Pair>")
+        sampleFile.write('\n' + "		<Pair>")
+        sampleFile.write('\n' + "			<key>highlight</key>")
+        sampleFile.write('\n' + "			<styleUrl>#sh_Arrow%s</styleUrl>" % arrownum + '\n')
+        sampleFile.write('\n' + "		</Pair>")
+        sampleFile.write('\n' + "  </StyleMap>")
+    sampleFile.write('\n' + "		<Point>")
+    sampleFile.write('\n' + "			<gx:drawOrder>1</gx:drawOrder>")
+    sampleFile.write('\n' + "			<coordinates>%s,%s,0</coordinates>"  % (longitude, latitude) + '\n')
+    sampleFile.write('\n' + "		</Point>")
+    sampleFile.write('\n' + "	</Placemark>")
+    sampleFile.write('\n' + "</Document>")
+    sampleFile.write('\n')
 sampleFile.write('\n' + "</Folder>") # Write End of Measurement Folder
 sampleFile.write('\n' + "</Folder>")
 sampleFile.write('\n' + "</kml>") # Write outro text
@@ -4,6 +4,7 @@
 #
 # This script evaluates poles for Q criteria (including finding similar younger poles) and prints basemaps with pole diagrams and equal area plots.
 # The input Excel file must be named: "Prior Work--Quickbook.xlsx".
+# Note: Run with --sweep ANGDISTS TIMES to compare the verified and key poles found for many criterion 7 thresholds. See the READ ME for details.
 # Circle code adapted from https://github.com/urschrei/Circles/blob/master/README.md
 # 
 # Script written by Casey Luskin.
@@ -14,21 +15,31 @@ import sys
 import os
 import math
 import re
+import argparse
+import hashlib
+import multiprocessing
+import cPickle as pickle
 
 from shutil import copy
-from xlrd import open_workbook
+from collections import OrderedDict
+from workbookreader import readsheetsnapshot, quickbookpoledata
+from datafiles import replacefile
 import xlwt
 
 from os.path import dirname
+import matplotlib
+matplotlib.use("Agg")   # charts are only saved to files, so no windows are needed (also in the worker processes)
 import matplotlib.pyplot as plt
 from mpl_toolkits.basemap import Basemap
 import numpy as np
+from scipy.spatial import cKDTree
+from matplotlib.collections import LineCollection
 
 #from Circles.circles import circle
 #from Circles.circles import circle_wrap
 # Note that circles is found in C:\Python27\Lib\site-packages\Circles
 # Note that I modified circle to create circle_wrap
-from shapely.geometry import Polygon, Point
+from shapely.geometry import Polygon
 from descartes import PolygonPatch
 
 verifiedqmin = 3 #Change this to make verified poles require higher vqq
@@ -36,6 +47,20 @@ verifiedqmin = 3 #Change this to make verified poles require higher vqq
 ####################### CONSTANTS #######################
 excelfilename = "Prior Work--Quickbook.xlsx"
 finalpolesexcelfilename = "Prior Work Verified.xls"
+sweepexcelfilename = "Prior Work Threshold Sweep.xls"
+maxsweeppairs = 253   # an .xls sheet has 256 columns, 3 of which describe the pole
+evaluationstatename = "Prior Work--Quickbook.state"   # results of the last run, so that the next run only re-evaluates what changed
+evaluationstate_version = 1
+chartversion = 2   # raise this whenever the way the charts are drawn changes, so that charts of earlier runs are not copied
+circlecachename = "Prior Work--Quickbook.circles"   # projected A95 circles of earlier runs, so that they are not worked out again
+circlecache_version = 1
+circlecachesize = 2048   # number of projected circles kept, in memory and in the file
+basemapcachename = "Prior Work--Quickbook.basemaps"   # drawn Robinson map backgrounds, so that they are not drawn again
+basemapcache_version = 1
+ellipseflatness = 0.01   # the most (in plot units) that the lines an a95 ellipse is drawn with may stray from it
+ellipseminpoints = 24   # the fewest points an a95 ellipse is drawn through
+dashedellipsedensity = 50   # points per degree of a95 that dashed (key pole) ellipses are drawn through, so that their dashes fall where they always have
+dashedarcpointsperdegree = 5   # points per degree of the primitive circle that dashed upper hemisphere outlines are drawn through
 geologicaltimescale = [ [1,"Quarternary",0,2.58],[2,"Neogene",2.58,23.03],
                         [3,"Paleogene",23.03,66],[4,"Cretaceous",66,145],
                         [5,"Jurassic",145,201.3],[6,"Triassic",201.3,251.9],
@@ -176,20 +201,22 @@ class CourseException(Exception):
     def __str__(self):
         return repr(self.value)
 
-def _gccalc(lon, lat, azimuth, maxdist=None):
+def _gccalc_array(lon, lat, azimuth, maxdist):
     """
     Original javascript on http://williams.best.vwh.net/gccalc.htm
-    Translated into python by Thomas Lecocq
-    This function is a black box, because trigonometry is difficult
-    
+    Translated into python by Thomas Lecocq, and made to work on arrays: lon, lat, azimuth and maxdist can be numbers
+    or arrays, and are broadcast against each other (e.g. a column of poles against a row of azimuths), so that every
+    azimuth of a circle is solved at once. Each element is iterated until it has converged on its own.
+    Returns arrays of (glon2, glat2, baz).
     """
+    lon, lat, azimuth, maxdist = np.broadcast_arrays(*[np.asarray(value, dtype=float) for value in (lon, lat, azimuth, maxdist)])
     glat1 = lat * np.pi / 180.
     glon1 = lon * np.pi / 180.
     s = maxdist / 1.852
     faz = azimuth * np.pi / 180.
- 
+
     EPS = 0.00000000005
-    if ((np.abs(np.cos(glat1)) < EPS) and not (np.abs(np.sin(faz)) < EPS)):
+    if np.any((np.abs(np.cos(glat1)) < EPS) & ~(np.abs(np.sin(faz)) < EPS)):
         raise CourseException("Only North-South courses are meaningful")
 
     a = 6378.13 / 1.852
@@ -198,10 +225,7 @@ def _gccalc(lon, lat, azimuth, maxdist=None):
     tu = r * np.tan(glat1)
     sf = np.sin(faz)
     cf = np.cos(faz)
-    if (cf == 0):
-        b = 0.
-    else:
-        b = 2. * np.arctan2 (tu, cf)
+    b = np.where(cf == 0, 0., 2. * np.arctan2(tu, cf))
 
     cu = 1. / np.sqrt(1 + tu * tu)
     su = tu * cu
@@ -213,18 +237,24 @@ def _gccalc(lon, lat, azimuth, maxdist=None):
     c = (x * x / 4. + 1.) / c
     d = (0.375 * x * x - 1.) * x
     tu = s / (r * a * c)
-    y = tu
+    y = tu.copy()
     c = y + 1
-    while (np.abs (y - c) > EPS):
-        sy = np.sin(y)
-        cy = np.cos(y)
-        cz = np.cos(b + y)
-        e = 2. * cz * cz - 1.
-        c = y
-        x = e * cy
-        y = e + e - 1.
-        y = (((sy * sy * 4. - 3.) * y * cz * d / 6. + x) *
-            d / 4. - cz) * sy * d + tu
+    sy = np.zeros(y.shape)
+    cy = np.zeros(y.shape)
+    cz = np.zeros(y.shape)
+    e = np.zeros(y.shape)
+    active = np.abs(y - c) > EPS   # elements still iterating
+    while active.any():
+        ya, ba, da = y[active], b[active], d[active]
+        sy[active] = sya = np.sin(ya)
+        cy[active] = cya = np.cos(ya)
+        cz[active] = cza = np.cos(ba + ya)
+        e[active] = ea = 2. * cza * cza - 1.
+        c[active] = ya
+        yn = ea + ea - 1.
+        y[active] = (((sya * sya * 4. - 3.) * yn * cza * da / 6. + ea * cya) *
+                     da / 4. - cza) * sya * da + tu[active]
+        active = np.abs(y - c) > EPS
 
     b = cu * cy * cf - su * sy
     c = r * np.sqrt(sa * sa + b * b)
@@ -256,12 +286,9 @@ def circle(m, centerlon, centerlat, radius, *args, **kwargs):
 
     glon1 = centerlon
     glat1 = centerlat
-    X = []
-    Y = []
-    for azimuth in range(0, 360):
-        glon2, glat2, baz = _gccalc(glon1, glat1, azimuth, radius)
-        X.append(glon2)
-        Y.append(glat2)
+    glon2s, glat2s, bazs = _gccalc_array(glon1, glat1, np.arange(0, 360), radius)   # every azimuth at once
+    X = glon2s.tolist()
+    Y = glat2s.tolist()
     X.append(X[0])
     Y.append(Y[0])
 
@@ -297,8 +324,12 @@ def circle_wrap(m, centerlon, centerlat, radius, midlon, boundary, lon_diff_angd
     else:
         pos = "west"
 
+    glon2s, glat2s, bazs = _gccalc_array(glon1, glat1, np.arange(0, 360), radius)   # every azimuth at once
+    glon2s = glon2s.tolist()
+    glat2s = glat2s.tolist()
     for azimuth in range(0, 360):
-        glon2, glat2, baz = _gccalc(glon1, glat1, azimuth, radius)
+        glon2 = glon2s[azimuth]
+        glat2 = glat2s[azimuth]
 
         p1_lon_rad = math.radians(centerlon)
         p2_lon_rad = math.radians(glon2)
@@ -478,353 +509,553 @@ def getdatachartfoldername(filepath):
     data_chartfoldername = "Database_Charts" + data_chartfoldernum_str
     return(data_chartfoldername)
 
-def loadallpoles(wb):
-    allpoles_list = []
-    for sheet in wb.sheets(): #Load all poles into allpoles_list
-        if sheet.name == "Poledata":
-            number_of_rows = sheet.nrows
-            number_of_columns = sheet.ncols
-            rows = []
-            for row in range(1, number_of_rows):
-                rowitems = []
-                values = []
-        #        print("row = %s" % row)
-                
-                for col in range(number_of_columns):
-                    value  = (sheet.cell(row,col).value)
-                    rowitems.append(value)
-        #            print("col = %s" % col)
-
-                inpaleomagia = rowitems[0]
-
-                unit = str(rowitems[1])
-                unit_decoded = unit.encode('latin1')
-                
-                component = str(rowitems[2])
-                component_decoded = component.encode('latin1')
-
-                if component_decoded != "":
-                    unittext = "%s (%s)" % (unit_decoded,component_decoded)
-                else:
-                    unittext = unit_decoded
-
-                code = rowitems[3]
-                code_decoded = code.encode('latin1')
-                
-                polelat = rowitems[4]
-                polelat_num = float(polelat)
-                polelat_str = ("%.1f" % polelat_num)
-
-                polelon = rowitems[5]
-                polelon_num = float(polelon)
-                polelon_str = ("%.1f" % polelon_num)
-                
-                antipolelat = rowitems[6]
-                antipolelat_num = float(antipolelat)
-                
-                antipolelon = rowitems[7]
-                antipolelon_num = float(antipolelon)
-                
-                polea95 = rowitems[8]
-                if polea95:
-                    polea95_num = float(polea95)
-                    polea95_str = ("%.1f" % polea95_num)
-                else:
-                    polea95_num = ""
-                    polea95_str = ""
-               
-                polek = rowitems[9]
-                if polek:
-                    polek_num = float(polek)
-                    polek_str = ("%.1f" % polek_num)
-                else:
-                    polek_num = ""
-                    polek_str = ""
-
-                poledp = rowitems[10]
-                if poledp:
-                    poledp_num = float(poledp)
-                    poledp_str = ("%.1f" % poledp_num)
-                else:
-                    poledp_num = ""
-                    poledp_str = ""
-
-                poledm = rowitems[11]
-                if poledm:
-                    poledm_num = float(poledm)
-                    poledm_str = ("%.1f" % poledm_num)
-                else:
-                    poledm_num = ""
-                    poledm_str = ""
-                
-                if polea95_num != "":
-                    pole_radius = polea95_num
-                else:
-                    pole_radius = max(poledp_num,poledm_num)
-
-                paleolat = rowitems[12]
-                paleolat_num = float(paleolat)
-
-                dec = rowitems[13]
-                dec_num = float(dec)
-                dec_str = ("%.1f" % dec_num)
-
-                inc = rowitems[14]
-                inc_num = float(inc)
-                inc_str = ("%.1f" % inc_num)
-
-                directiona95 = rowitems[15]
-                if directiona95 == "":
-                    directiona95_num = 0
-                else:
-                    if directiona95 == "90":
-                        directiona95_num = 90.0001
-                    else:
-                        directiona95_num = float(directiona95)
-                directiona95_str = ("%.1f" % directiona95_num)
-
-                directionk = rowitems[16]
-                if directionk:
-                    directionk_num = float(directionk)
-                    directionk_str = ("%.1f" % directionk_num)
-                else:
-                    directionk_num = ""
-                    directionk_str = ""
-
-                ageprefix = rowitems[17]
-                try:
-                    ageprefix_num = float(ageprefix)
-                    ageprefix_decoded = str(ageprefix_num)
-                except:
-                    ageprefix_decoded = ageprefix.encode('latin1')
-                
-                age = rowitems[18]
-                age_int = int(round(age))
-                age_str = str(age_int)
-
-                agepostfix = rowitems[19]
-                try:
-                    agepostfix_num = int(float(agepostfix))
-                    agepostfix_decoded = str(agepostfix_num)
-                except:
-                    agepostfix_decoded = agepostfix.encode('latin1')
-
-                agetext = ageprefix_decoded + age_str
-                if agepostfix_decoded != "":
-                    agetext = agetext + agepostfix_decoded
-
-                pmagref = rowitems[20]
-                pmagref_decoded = pmagref.encode('latin1')
-
-                ageref = rowitems[21]
-                ageref_decoded = ageref.encode('latin1')
-                
-                pmagref_text = "%s [%s]" % (pmagref_decoded,ageref_decoded)
-
-                vvq1 = int(rowitems[22])
-                vvq2 = int(rowitems[23])
-                vvq3 = int(rowitems[24])
-                vvq4 = int(rowitems[25])
-                vvq5 = int(rowitems[26])
-                vvq6 = int(rowitems[27])
-                vvq7 = 0
-                vvqtotal = int(rowitems[29])
-
-                vvq1_str = str(vvq1)
-                vvq2_str = str(vvq2)
-                vvq3_str = str(vvq3)
-                vvq4_str = str(vvq4)
-                vvq5_str = str(vvq5)
-                vvq6_str = str(vvq6)
-                vvqtotal_str = str(vvqtotal)
-                
-                plateid = "GPlates-0c9adcac-2142-486c-ac9f-95868320515f"
-                platerevision = "GPlates-441bb92b-b8b4-44c6-8c5f-e283f2312cc7"
-                
-         #       print("unit = %s" % unit)
-         #       print("component = %s" % component)
-         #       print("code = %s" % code)
-         #       print("polelat = %s" % polelat)
-         #       print("polelon = %s" % polelon)
-         #       print("polea95 = %s" % polea95)
-         #       print("polek = %s" % polek)
-         #       print("poledp = %s" % poledp)
-         #       print("poledm = %s" % poledm)
-         #       print("paleolat = %s" % paleolat)
-         #       print("dec = %s" % dec)
-         #       print("inc = %s" % inc)
-         #       print("directiona95 = %s" % directiona95)
-         #       print("directionk = %s" % directionk)
-         #       print("age = %s" % age)
-         #       print("agemod = %s" % agemod)
-         #       print("ref = %s" % ref)
-                 
-                writetext_list = [unittext,agetext,dec_str,inc_str,directionk_str,directiona95_str,polelat_str,polelon_str,poledp_str,poledm_str,polek_str,polea95_str,
-                                  vvq1_str,vvq2_str,vvq3_str,vvq4_str,vvq5_str,vvq6_str,"0",vvqtotal_str,pmagref_text,"","A"]
-                
-                newpole = [ageprefix_decoded,age_int,agepostfix_decoded,unit_decoded,component_decoded,code_decoded,
-                           polelat_num,polelon_num,antipolelat_num,antipolelon_num,polea95_num,polek_num,poledp_num,poledm_num,pole_radius,
-                           paleolat_num,dec_num,inc_num,directiona95_num,directionk_num,pmagref_decoded,ageref_decoded,
-                           vvq1,vvq2,vvq3,vvq4,vvq5,vvq6,vvq7,vvqtotal,plateid,platerevision,writetext_list,"A"]
-
-                allpoles_list.append(newpole)
-                allpoles_list_sorted_age = sorted(allpoles_list, key = lambda item: item[1])
-    return(allpoles_list_sorted_age)
-
-def processverifiedpoles():
-    global allpoles_list_sorted_age
+class PoleTable(object):
+    """
+    All poles of the Poledata sheet, stored as one column per field and sorted by age once when loaded. Numbers are
+    kept as numbers, with NaN for blank cells, and the text shown in the spreadsheet is only made when a row is written.
+    Rows are referred to by their position in the table.
+    """
+    floatcolumns = ["polelat","polelon","antipolelat","antipolelon","polea95","polek","poledp","poledm","poleradius",
+                    "paleolat","dec","inc","directiona95","directionk"]
+    intcolumns = ["age","vvq1","vvq2","vvq3","vvq4","vvq5","vvq6","vvq7","vvqtotal"]
+    textcolumns = ["ageprefix","agepostfix","unit","component","code","pmagref","ageref","poletype","youngerpoles","rowkey"]
+
+    def __init__(table, columns):  # columns holds a list of values for every column, in workbook order.
+        order = np.argsort(np.array(columns["age"], dtype=int), kind='mergesort')   # a stable sort keeps poles of the same age in workbook order
+        for name in table.floatcolumns:
+            setattr(table, name, np.array(columns[name], dtype=float)[order])
+        for name in table.intcolumns:
+            setattr(table, name, np.array(columns[name], dtype=int)[order])
+        for name in table.textcolumns:
+            textcolumn = np.empty(len(order), dtype=object)
+            for position, rownum in enumerate(order):   # element by element, so that tuples are stored as they are
+                textcolumn[position] = columns[name][rownum]
+            setattr(table, name, textcolumn)
+
+    def __len__(table):
+        return(len(table.age))
+
+    def rowid(table, n):  # Returns what identifies pole n between runs, even after its values have been edited.
+        return((table.unit[n], table.component[n], table.code[n]))
+
+    def iskey(table):  # Returns, for every pole, whether it meets the key pole criteria Q1, Q3 and Q4 or Q6.
+        return((table.vvq1 == 1) & (table.vvq3 == 1) & ((table.vvq4 == 1) | (table.vvq6 == 1)))
+
+    def unitcomponent(table, n, separator):  # Returns the unit of pole n with its component, if any, after separator.
+        if table.component[n] != "":
+            return(table.unit[n] + separator + table.component[n])
+        return(table.unit[n])
+
+    def agetext(table, n):
+        return("%s%s%s" % (table.ageprefix[n], table.age[n], table.agepostfix[n]))
+
+    def youngerpolestext(table, n):  # Returns the younger poles that pole n is similar to, as listed in the spreadsheet.
+        return("".join(["%s, Age: %s Ma (%s); " % (table.unitcomponent(ynum, " "), table.age[ynum], table.pmagref[ynum]) for ynum in table.youngerpoles[n]]))
+
+    def writetext(table, n):  # Returns the spreadsheet row of pole n, one text per column in cols.
+        return([table.unitcomponent(n, " (") + ("" if table.component[n] == "" else ")"), table.agetext(n),
+                numbertext(table.dec[n]), numbertext(table.inc[n]), numbertext(table.directionk[n]), numbertext(table.directiona95[n]),
+                numbertext(table.polelat[n]), numbertext(table.polelon[n]), numbertext(table.poledp[n]), numbertext(table.poledm[n]),
+                numbertext(table.polek[n]), numbertext(table.polea95[n]),
+                str(table.vvq1[n]), str(table.vvq2[n]), str(table.vvq3[n]), str(table.vvq4[n]), str(table.vvq5[n]), str(table.vvq6[n]),
+                str(table.vvq7[n]), str(table.vvqtotal[n]), "%s [%s]" % (table.pmagref[n], table.ageref[n]), table.youngerpolestext(n), table.poletype[n]])
+
+def numbertext(value):  # Returns a number as shown in the spreadsheet, or "" for a blank cell.
+    if np.isnan(value):
+        return("")
+    return("%.1f" % value)
+
+def cellvalue(value):  # Returns a number from the pole table as a plain float, or "" for a blank cell.
+    if np.isnan(value):
+        return("")
+    return(float(value))
+
+def loadallpoles(excelfilename):  # Loads the Poledata sheet, from the workbook's snapshot if it has not changed since the last run.
+    columns = readsheetsnapshot(excelfilename, "Poledata", quickbookpoledata, blank=np.nan, rowkeys=True)
+    polea95s = np.array(columns["polea95"], dtype=float)
+    poledps = np.array(columns["poledp"], dtype=float)
+    poledms = np.array(columns["poledm"], dtype=float)
+    with np.errstate(invalid='ignore'):   # a pole without an a95 uses the larger of dp and dm, if it has both
+        columns["poleradius"] = np.where(np.isnan(polea95s), np.maximum(poledps, poledms), polea95s)
+    rowcount = len(polea95s)
+    columns["vvq7"] = [0] * rowcount
+    columns["poletype"] = ["A"] * rowcount
+    columns["youngerpoles"] = [()] * rowcount
+    return(PoleTable(columns))
+
+class Q7Index:
+    """
+    Finds, for criterion 7, the accepted (verified or key) poles that a pole is too similar to. The pole table is sorted
+    by age, so the accepted poles that are old enough younger poles for the current pole form a growing window. Poles in
+    the window are stored as unit vectors in a KD-tree, so only those within a plausible angular radius are compared;
+    poles that have just entered the window wait in a small block that is searched directly until the tree is rebuilt.
+    """
+    def __init__(index, poletable, minpoleangdist, minpoletempdist):
+        index.minpoleangdist = minpoleangdist
+        index.minpoletempdist = minpoletempdist
+        index.vectors = unitvectors(poletable.polelat, poletable.polelon)
+        index.antivectors = unitvectors(poletable.antipolelat, poletable.antipolelon)
+        index.radii = poletable.poleradius   # poles without an a95, dp or dm are never similar.
+        index.ages = poletable.age
+        index.codes = poletable.code
+        index.windowends = np.searchsorted(index.ages, index.ages - minpoletempdist, side='right')   # only poles before windowends[n] can be old enough younger poles for pole n
+        index.acceptedcodes = set()
+        index.accepted = np.zeros(len(poletable), dtype=int)   # positions of the accepted poles, in age order
+        index.acceptedcount = 0
+        index.windowcount = 0       # accepted[:windowcount] are in the window,
+        index.treecount = 0         # and accepted[:treecount] are in the tree.
+        index.tree = None
+        index.maxradius = 0
+
+    def accept(index, aindex):  # Adds the pole at aindex to the accepted poles.
+        index.accepted[index.acceptedcount] = aindex
+        index.acceptedcount = index.acceptedcount + 1
+        index.acceptedcodes.add(index.codes[aindex])
+
+    def isaccepted(index, code):  # Returns whether a pole with this code has already been accepted.
+        return(code in index.acceptedcodes)
+
+    def updatewindow(index, aindex):  # Moves the accepted poles that are old enough younger poles for the pole at aindex into the window.
+        windowcount = np.searchsorted(index.accepted[:index.acceptedcount], index.windowends[aindex])
+        if windowcount > index.windowcount:
+            newradii = index.radii[index.accepted[index.windowcount:windowcount]]
+            if not(np.isnan(newradii).all()):
+                index.maxradius = max(index.maxradius, np.nanmax(newradii))
+            index.windowcount = windowcount
+        if (index.windowcount - index.treecount) > max(256, index.treecount // 4):   # rebuilding only when the block outgrows a fraction of the tree keeps the total cost near n log n
+            index.treecount = index.windowcount
+            index.tree = cKDTree(index.vectors[index.accepted[:index.treecount]])
+
+    def similaryoungerpoles(index, aindex):
+        """
+        Returns, in age order, the positions of the accepted poles with a different code that are more than minpoletempdist
+        younger than the pole at aindex, and closer to it or its antipole than minpoleangdist plus both poles' a95s.
+        """
+        index.updatewindow(aindex)
+        pole_radius = index.radii[aindex]
+        if np.isnan(pole_radius) or (index.windowcount == 0):
+            return([])
+        candidates = index.accepted[index.treecount:index.windowcount]
+        searchradius = index.minpoleangdist + pole_radius + index.maxradius
+        if index.treecount > 0:
+            if searchradius >= 180:
+                candidates = index.accepted[:index.windowcount]
+            else:
+                chord = 2 * math.sin(math.radians(searchradius) / 2)
+                nearpoles = index.tree.query_ball_point(index.vectors[aindex], chord) + index.tree.query_ball_point(index.antivectors[aindex], chord)
+                treecandidates = index.accepted[np.array(nearpoles, dtype=int)]
+                if searchradius >= 90:   # the two search caps overlap
+                    treecandidates = np.unique(treecandidates)
+                candidates = np.append(treecandidates, candidates)
+        candidates = candidates[(index.codes[candidates] != index.codes[aindex]) & ((index.ages[aindex] - index.ages[candidates]) > index.minpoletempdist) & ~np.isnan(index.radii[candidates])]
+        if len(candidates) == 0:
+            return([])
+        # The larger dot product is with whichever of the pole and its antipole is closer; for an exact antipole this is |dot|.
+        dots = np.maximum(np.dot(index.vectors[candidates], index.vectors[aindex]), np.dot(index.vectors[candidates], index.antivectors[aindex]))
+        poledists = np.degrees(np.arccos(np.clip(dots, -1, 1)))
+        a95dists = poledists - pole_radius - index.radii[candidates]
+        return(np.sort(candidates[a95dists <= index.minpoleangdist]).tolist())
+
+def unitvectors(lats, lons):  # Returns the positions given by lists of latitudes and longitudes as an array of unit vectors, one row each.
+    lats = np.radians(np.array(lats, dtype=float))
+    lons = np.radians(np.array(lons, dtype=float))
+    return(np.column_stack((np.cos(lats) * np.cos(lons), np.cos(lats) * np.sin(lons), np.sin(lats))))
+
+def processverifiedpoles(firstposition, verifiedpoles_list):  # Evaluates the poles from firstposition on; verifiedpoles_list holds the verified poles before it.
+    global poletable
     
-    verifiedpoles_list = []
-    for aindex, pole in enumerate(allpoles_list_sorted_age):
-        vvqtotal = pole[29]
-        if vvqtotal >= (verifiedqmin-1):
-            allpoles_list_sorted_age[aindex][32][22] = "V"
-            allpoles_list_sorted_age[aindex][33] = "V"
-            verifiedpoles_list.append(allpoles_list_sorted_age[aindex])
-            break
-
-    if verifiedpoles_list == []:
-        return(verifiedpoles_list)
+    q7index = Q7Index(poletable, minpoleangdist, minpoletempdist)
+    verifiedpoles_list = list(verifiedpoles_list)   # positions of the verified poles in poletable
+    if verifiedpoles_list == []:   # poles before firstposition have no verified pole, and their vvqtotal already includes Q7
+        firstverified = np.flatnonzero(poletable.vvqtotal[firstposition:] >= (verifiedqmin-1)) + firstposition
+        if len(firstverified) == 0:
+            return(verifiedpoles_list)
+        poletable.poletype[firstverified[0]] = "V"
+        verifiedpoles_list.append(firstverified[0])
+    for vindex in verifiedpoles_list:
+        q7index.accept(vindex)
     
-    for aindex, pole in enumerate(allpoles_list_sorted_age):
-        age = pole[1]
-        code = pole[5]
-        #period = getperiod(age)
-        pole_radius = pole[14]
-        vvq1 = pole[22]
-        vvq3 = pole[24]
-        vvq4 = pole[25]
-        vvq6 = pole[27]
-        vvqtotal = pole[29]
-
-        vvq7 = 1
-        inlist = False
-        youngerpoles_text = ""
-        for vpole in verifiedpoles_list:
-            v_code = vpole[5]
-            if v_code != code:
-                v_age = vpole[1]
-                #v_period = getperiod(v_age)
-                #if period[0] - v_period[0] > 1:
-                agediff = age - v_age
-                if agediff > minpoletempdist:
-                    v_pole_radius = vpole[14]
-                    poledist = getpoledist(pole,vpole)
-                    a95dist = poledist - pole_radius - v_pole_radius
-                    if a95dist <= minpoleangdist:
-                        vvq7 = 0
-                        if vpole[4] != "":
-                            spacer = " "
-                        else:
-                            spacer= ""
-                        youngerpoles_text = youngerpoles_text + ("%s%s%s, Age: %s Ma (%s); " % (vpole[3], spacer, vpole[4], v_age, vpole[20]) )
-            else:
-                inlist = True
-
-        newvvqtotal = vvqtotal + vvq7
-        allpoles_list_sorted_age[aindex][28] = vvq7
-        allpoles_list_sorted_age[aindex][29] = newvvqtotal
-        allpoles_list_sorted_age[aindex][32][18] = str(vvq7)
-        allpoles_list_sorted_age[aindex][32][19] = str(newvvqtotal)
-        allpoles_list_sorted_age[aindex][32][21] = youngerpoles_text
+    for aindex in range(firstposition, len(poletable)):
+        inlist = q7index.isaccepted(poletable.code[aindex])
+        youngerpoles = q7index.similaryoungerpoles(aindex)
+        if youngerpoles:
+            vvq7 = 0
+        else:
+            vvq7 = 1
+
+        newvvqtotal = poletable.vvqtotal[aindex] + vvq7
+        poletable.vvq7[aindex] = vvq7
+        poletable.vvqtotal[aindex] = newvvqtotal
+        poletable.youngerpoles[aindex] = tuple(youngerpoles)
         if (newvvqtotal >= verifiedqmin) and not inlist:
-            allpoles_list_sorted_age[aindex][32][22] = "V"
-            allpoles_list_sorted_age[aindex][33] = "V"
-            verifiedpoles_list.append(allpoles_list_sorted_age[aindex])
+            poletable.poletype[aindex] = "V"
+            verifiedpoles_list.append(aindex)
+            q7index.accept(aindex)
     return(verifiedpoles_list)
 
-def processkeypoles():
-    global allpoles_list_sorted_age
+def processkeypoles(firstposition, keypoles_list):  # Evaluates the poles from firstposition on; keypoles_list holds the key poles before it.
+    global poletable
     
-    keypoles_list = []
-    for aindex, pole in enumerate(allpoles_list_sorted_age):
-        vvq1 = pole[22]
-        vvq3 = pole[24]
-        vvq4 = pole[25]
-        vvq6 = pole[27]
-        if (vvq1 == 1) and (vvq3 == 1) and (vvq4 == 1 or vvq6 == 1):
-            allpoles_list_sorted_age[aindex][32][22] = "K"
-            allpoles_list_sorted_age[aindex][33] = "K"
-            keypoles_list.append(allpoles_list_sorted_age[aindex])
-            break
-
+    q7index = Q7Index(poletable, minpoleangdist, minpoletempdist)
+    keypoles_list = list(keypoles_list)   # positions of the key poles in poletable
+    iskey = poletable.iskey()
     if keypoles_list == []:
-        return(keypoles_list)
-
-    for aindex, pole in enumerate(allpoles_list_sorted_age):
-        age = pole[1]
-        code = pole[5]
-        #period = getperiod(age)
-        pole_radius = pole[14]
-        vvq1 = pole[22]
-        vvq3 = pole[24]
-        vvq4 = pole[25]
-        vvq6 = pole[27]
-        vvqtotal = pole[29]
-
-        vvq7 = 1
-        inlist = False
-        youngerpoles_text = ""
-        for index, kpole in enumerate(keypoles_list):
-            polenum = index + 1
-            k_code = kpole[5]
-            if k_code != code:
-                k_age = kpole[1]
-                #k_period = getperiod(k_age)
-                #if period[0] - k_period[0] > 1:
-                agediff = age - k_age
-                if agediff > minpoletempdist:
-                    k_pole_radius = kpole[14]
-                    poledist = getpoledist(pole,kpole)
-                    a95dist = poledist - pole_radius - k_pole_radius
-                    if a95dist <= minpoleangdist:
-                        vvq7 = 0
-                        if kpole[4] != "":
-                            spacer = " "
-                        else:
-                            spacer= ""
-                        youngerpoles_text = youngerpoles_text + ("%s%s%s, Age: %s Ma (%s); " % (kpole[3], spacer, kpole[4], k_age, kpole[20]) )
-            else:
-                inlist = True
-
-        newvvqtotal = vvqtotal + vvq7
-        if (vvq1 == 1) and (vvq3 == 1) and (vvq4 == 1 or vvq6 == 1) and not inlist:
-            allpoles_list_sorted_age[aindex][28] = vvq7
-            allpoles_list_sorted_age[aindex][29] = newvvqtotal
-            allpoles_list_sorted_age[aindex][32][18] = str(vvq7)
-            allpoles_list_sorted_age[aindex][32][19] = str(newvvqtotal)
-            allpoles_list_sorted_age[aindex][32][21] = youngerpoles_text
-            allpoles_list_sorted_age[aindex][32][22] = "K"
-            allpoles_list_sorted_age[aindex][33] = "K"
-            keypoles_list.append(allpoles_list_sorted_age[aindex])
+        firstkey = np.flatnonzero(iskey)
+        if len(firstkey) == 0:
+            return(keypoles_list)
+        poletable.poletype[firstkey[0]] = "K"
+        keypoles_list.append(firstkey[0])
+    for kindex in keypoles_list:
+        q7index.accept(kindex)
+
+    for aindex in range(firstposition, len(poletable)):
+        inlist = q7index.isaccepted(poletable.code[aindex])
+        youngerpoles = q7index.similaryoungerpoles(aindex)
+        if youngerpoles:
+            vvq7 = 0
+        else:
+            vvq7 = 1
+
+        newvvqtotal = poletable.vvqtotal[aindex] + vvq7
+        if iskey[aindex] and not inlist:
+            poletable.vvq7[aindex] = vvq7
+            poletable.vvqtotal[aindex] = newvvqtotal
+            poletable.youngerpoles[aindex] = tuple(youngerpoles)
+            poletable.poletype[aindex] = "K"
+            keypoles_list.append(aindex)
+            q7index.accept(aindex)
     return(keypoles_list)
 
-def getpoledist(pole1,pole2):
-    pole1_lat = pole1[6]
-    pole1_lon = pole1[7]
-    antipole1_lat = pole1[8]
-    antipole1_lon = pole1[9]
-
-    pole2_lat = pole2[6]
-    pole2_lon = pole2[7]
-    
-    if (abs(pole1_lon - pole2_lon) % 360) > 180:
-        deltalon = 360 - (abs(pole1_lon - pole2_lon) % 360)
-    else:
-        deltalon = abs(pole1_lon - pole2_lon) % 360
-
-    normalpoledist = math.degrees(math.acos((math.sin(math.radians(pole1_lat)) * math.sin(math.radians(pole2_lat))) +
-                                      (math.cos(math.radians(pole1_lat)) * math.cos(math.radians(pole2_lat)) * math.cos(math.radians(deltalon)))))
+class ThresholdSweep:
+    """
+    Evaluates which poles are verified and key poles for every pair of criterion 7 thresholds in a grid. The distance
+    between every pair of poles (or pole and antipole) less both a95s, and the age difference between every pair of
+    poles, are worked out once; each threshold pair then only compares these with its thresholds.
+    """
+    def __init__(sweep, poletable):
+        vectors = unitvectors(poletable.polelat, poletable.polelon)
+        antivectors = unitvectors(poletable.antipolelat, poletable.antipolelon)
+        dots = np.maximum(np.dot(vectors, vectors.T), np.dot(antivectors, vectors.T))   # row n holds every pole against pole n and its antipole, as in Q7Index
+        radii = poletable.poleradius
+        with np.errstate(invalid='ignore'):   # poles without an a95, dp or dm get NaN distances, which are never within a threshold
+            sweep.a95dists = np.degrees(np.arccos(np.clip(dots, -1, 1))) - radii[:,np.newaxis] - radii[np.newaxis,:]
+        sweep.agediffs = poletable.age[:,np.newaxis] - poletable.age[np.newaxis,:]   # how much older pole n is than each pole
+        sweep.codes = poletable.code
+        sweep.qtotals = poletable.vvqtotal.copy()   # Q1 - Q6 only, before any evaluation
+        sweep.iskey = poletable.iskey()
+
+    def verifiedpoles(sweep, minpoleangdist, minpoletempdist):  # Returns the positions of the verified poles, as processverifiedpoles would find them.
+        firstverified = np.flatnonzero(sweep.qtotals >= (verifiedqmin-1))
+        if len(firstverified) == 0:
+            return([])
+        verified = np.zeros(len(sweep.codes), dtype=int)   # positions of the verified poles, in age order
+        verified[0] = firstverified[0]
+        verifiedcount = 1
+        verifiedcodes = set([sweep.codes[firstverified[0]]])
+        for aindex in range(len(sweep.codes)):
+            if (sweep.codes[aindex] in verifiedcodes) or (sweep.qtotals[aindex] + 1 < verifiedqmin):   # no verified pole shares the code of the poles that get past here
+                continue
+            younger = verified[:verifiedcount]
+            with np.errstate(invalid='ignore'):
+                similar = ((sweep.a95dists[aindex][younger] <= minpoleangdist) & (sweep.agediffs[aindex][younger] > minpoletempdist)).any()
+            if sweep.qtotals[aindex] + (0 if similar else 1) >= verifiedqmin:
+                verified[verifiedcount] = aindex
+                verifiedcount = verifiedcount + 1
+                verifiedcodes.add(sweep.codes[aindex])
+        return(verified[:verifiedcount].tolist())
+
+    def keypoles(sweep):
+        """
+        Returns the positions of the key poles, as processkeypoles would find them. A pole is a key pole if it meets the key
+        criteria and no pole with its code is one already, so unlike verified poles, key poles do not depend on the thresholds.
+        """
+        keypoles_list = []
+        keycodes = set()
+        for aindex in np.flatnonzero(sweep.iskey):
+            if not(sweep.codes[aindex] in keycodes):
+                keypoles_list.append(aindex)
+                keycodes.add(sweep.codes[aindex])
+        return(keypoles_list)
 
-    if (abs(antipole1_lon - pole2_lon) % 360) > 180:
-        antideltalon = 360 - (abs(antipole1_lon - pole2_lon) % 360)
-    else:
-        antideltalon = abs(antipole1_lon - pole2_lon) % 360
+def thresholdgrid(text):
+    """
+    Reads a list of thresholds given on the command line, either as values separated by commas ("5,10,20") or as
+    start:stop:step ("0:30:5", which includes 30).
+    """
+    try:
+        if ":" in text:
+            start, stop, step = [float(value) for value in text.split(":")]
+            if step <= 0:
+                raise ValueError
+            count = int(math.floor((stop - start) / step + 1e-9)) + 1
+            values = [round(start + step * num, 9) for num in range(max(count, 0))]
+        else:
+            values = [float(value) for value in text.split(",") if value.strip() != ""]
+    except ValueError:
+        raise argparse.ArgumentTypeError("%s is not a list of numbers or start:stop:step" % text)
+    if values == []:
+        raise argparse.ArgumentTypeError("%s does not give any thresholds" % text)
+    return(sorted(set(values)))
 
-    antipoledist = math.degrees(math.acos((math.sin(math.radians(antipole1_lat)) * math.sin(math.radians(pole2_lat))) +
-                                      (math.cos(math.radians(antipole1_lat)) * math.cos(math.radians(pole2_lat)) * math.cos(math.radians(antideltalon)))))
-    truepoledist = min(normalpoledist,antipoledist)
-    return(truepoledist)
+def dothresholdsweep(poletable, angdists, tempdists, savepath_name):
+    """
+    Finds the verified and key poles for every pair of thresholds in angdists and tempdists, and saves them to an Excel
+    file: one tab with the number of verified and key poles for each pair, and one with which list every pole is in.
+    """
+    sweep = ThresholdSweep(poletable)
+    keypoles_list = sweep.keypoles()
+    thresholdpairs = [(angdist, tempdist) for angdist in angdists for tempdist in tempdists]
+    verifiedpoles_lists = [sweep.verifiedpoles(angdist, tempdist) for angdist, tempdist in thresholdpairs]
+
+    wb = xlwt.Workbook(encoding='latin-1')
+    boldstyle = xlwt.XFStyle()
+    boldfont = xlwt.Font()
+    boldfont.bold = True
+    boldstyle.font = boldfont
+
+    summarysheet = wb.add_sheet("Summary")
+    for index, coltext in enumerate(["Min. angular distance (degrees)", "Min. time (Ma)", "Verified poles", "Key poles"]):
+        summarysheet.col(index).width = (20 * 256)
+        summarysheet.write(0, index, coltext, style=boldstyle)
+    for pairnum, (angdist, tempdist) in enumerate(thresholdpairs):
+        for index, value in enumerate([angdist, tempdist, len(verifiedpoles_lists[pairnum]), len(keypoles_list)]):
+            summarysheet.write(pairnum + 1, index, value)
+    summarysheet.set_panes_frozen(True)
+    summarysheet.set_horz_split_pos(1)
+
+    membershipsheet = wb.add_sheet("Membership")   # V = verified, K = key, V+K = both, for each threshold pair
+    for index, (coltext, colwidth) in enumerate([["Unit (Component)",40],["Age (Ma)",15],["Code",10]] + [["%g%s / %g Ma" % (angdist, u'\N{DEGREE SIGN}', tempdist),12] for angdist, tempdist in thresholdpairs]):
+        membershipsheet.col(index).width = (colwidth * 256)
+        membershipsheet.write(0, index, coltext, style=boldstyle)
+    keypoles_set = set(keypoles_list)
+    verifiedpoles_sets = [set(verifiedpoles_list) for verifiedpoles_list in verifiedpoles_lists]
+    for n in range(len(poletable)):
+        row = membershipsheet.row(n + 1)
+        row.write(0, poletable.unitcomponent(n, " (") + ("" if poletable.component[n] == "" else ")"))
+        row.write(1, poletable.agetext(n))
+        row.write(2, poletable.code[n])
+        for pairnum, verifiedpoles_set in enumerate(verifiedpoles_sets):
+            row.write(pairnum + 3, "+".join([poletype for poletype, inlist in [("V", n in verifiedpoles_set), ("K", n in keypoles_set)] if inlist]))
+    membershipsheet.set_panes_frozen(True)
+    membershipsheet.set_horz_split_pos(1)
+    membershipsheet.set_vert_split_pos(3)
+    wb.save(savepath_name)
+    return(thresholdpairs, verifiedpoles_lists, keypoles_list)
+
+def loadevaluationstate(statename):
+    """
+    Loads the pole table, results and chart signatures saved by the previous run.
+    Returns None if there is no usable state.
+    """
+    try:
+        with open(statename,'rb') as f:
+            state = pickle.load(f)
+        if state["version"] == evaluationstate_version:
+            return(state)
+    except Exception:
+        pass
+    return(None)
+
+def saveevaluationstate(statename, state):
+    """ Saves the state dictionary for the next run """
+    state["version"] = evaluationstate_version
+    replacefile(statename, lambda f: pickle.dump(state, f, 2))
+
+def currentevaluationstate(poletable, verifiedpoles_list, keypoles_list, canverify, periodsignatures):
+    """ Returns what the next run needs to find out what has changed: the rows, their results and the chart signatures """
+    return({"settings":(minpoleangdist, minpoletempdist, verifiedqmin), "canverify":canverify,
+            "rowkeys":list(poletable.rowkey), "rowids":[poletable.rowid(n) for n in range(len(poletable))],
+            "vvq7":list(poletable.vvq7), "vvqtotal":list(poletable.vvqtotal), "youngerpoles":list(poletable.youngerpoles), "poletype":list(poletable.poletype),
+            "verified":list(verifiedpoles_list), "key":list(keypoles_list), "periods":periodsignatures, "chartfolder":data_chartfoldername})
+
+def comparepoletables(state, poletable, canverify):
+    """
+    Compares the pole table with the one of the previous run and prints which poles were added, removed or edited.
+    Returns how many poles at the young end of the table are unchanged and have unchanged results: Q7 of a pole only
+    depends on younger poles, so these keep their results and evaluation resumes after them.
+    """
+    if state == None:
+        return(0)
+    oldrows = dict(zip(state["rowids"], state["rowkeys"]))
+    newrows = dict([(poletable.rowid(n), poletable.rowkey[n]) for n in range(len(poletable))])
+    added = [rowid for rowid in newrows if not(rowid in oldrows)]
+    removed = [rowid for rowid in oldrows if not(rowid in newrows)]
+    edited = [rowid for rowid in newrows if (rowid in oldrows) and (oldrows[rowid] != newrows[rowid])]
+    print('\n' + "Compared with the previous run (%s): %s poles added, %s removed and %s edited." % (state["chartfolder"], len(added), len(removed), len(edited)))
+    for changetext, rowids in [("Added", added), ("Removed", removed), ("Edited", edited)]:
+        for rowid in sorted(rowids):
+            print("  %s: %s" % (changetext, rowid[0] if rowid[1] == "" else "%s (%s)" % rowid[:2]))
+
+    if state["settings"] != (minpoleangdist, minpoletempdist, verifiedqmin):
+        print("The criterion 7 distances differ from the previous run, so all poles are re-evaluated.")
+        return(0)
+    if state["canverify"] != canverify:   # without a first verified pole, no pole is scored for Q7 at all
+        print("Whether any pole can start the list of verified poles has changed, so all poles are re-evaluated.")
+        return(0)
+    reusecount = 0
+    for oldkey, newkey in zip(state["rowkeys"], poletable.rowkey):
+        if oldkey != newkey:
+            break
+        reusecount = reusecount + 1
+    if reusecount == len(poletable) == len(state["rowkeys"]):
+        print("No poles have changed, so no poles are re-evaluated.")
+    elif reusecount > 0:
+        print("The %s youngest poles are unchanged and keep their results; older poles are re-evaluated." % reusecount)
+    return(reusecount)
+
+def restorepoleresults(state, poletable, reusecount):
+    """
+    Copies the results of the first reusecount poles from the previous run into the pole table.
+    Returns the verified and key poles among them, which the evaluation of older poles starts from.
+    """
+    if reusecount == 0:
+        return([], [])
+    for name in ["vvq7","vvqtotal","youngerpoles","poletype"]:
+        column = getattr(poletable, name)
+        for n in range(reusecount):
+            column[n] = state[name][n]
+    return([n for n in state["verified"] if n < reusecount], [n for n in state["key"] if n < reusecount])
+
+def periodsignature(verifiedpoles_list,keypoles_list,endtime,starttime,shownumbers,doantipoles):  # Returns a hash of everything the charts of a time period are drawn from.
+    periodpoles = [[(poletable.rowkey[n], poletable.poletype[n]) for n in poles_list if starttime < poletable.age[n] <= endtime] for poles_list in [verifiedpoles_list, keypoles_list]]
+    return(hashlib.sha1(repr((chartversion, endtime, starttime, shownumbers, doantipoles, periodpoles))).hexdigest())
+
+def copyperiodcharts(periodname, signature):
+    """
+    Copies the charts of a time period from the previous run's folder if its poles have not changed.
+    Returns whether they were copied.
+    """
+    if (evaluationstate == None) or (evaluationstate["periods"].get(periodname) != signature):
+        return(False)
+    previouspath = filepath + "\\" + evaluationstate["chartfolder"] + "\\" + "combinedpoles"
+    if not(os.path.isdir(previouspath)):
+        return(False)
+    chartfilenames = [filename for filename in os.listdir(previouspath) if filename.startswith(periodname + "_")]
+    if chartfilenames == []:
+        return(False)
+    for filename in chartfilenames:
+        copy(os.path.join(previouspath, filename), os.path.join(combinedpath, filename))
+    return(True)
+
+class CircleCache:
+    """
+    Projected A95 circles, keyed by (projection, midlon, lon, lat, a95), so that the circle of a pole is only worked out
+    once per projection however many maps it is drawn on. At most maxsize circles are kept, dropping the least recently
+    used. If filename is given, the circles are loaded from it and save() writes them back, so they last across runs.
+    """
+    def __init__(cache, maxsize, filename=None):
+        cache.maxsize = maxsize
+        cache.filename = filename
+        cache.circles = OrderedDict()
+        cache.changed = False
+        cache.added = []   # circles worked out since takeadded() was last called
+        if filename:
+            try:
+                with open(filename,'rb') as f:
+                    saved = pickle.load(f)
+                if saved["version"] == circlecache_version:
+                    cache.circles = OrderedDict(saved["circles"][-maxsize:])
+            except Exception:
+                pass
+
+    def get(cache, key, makecircle):
+        """ Returns the rings of the circle with this key, calling makecircle() to work them out if they are not kept """
+        if key in cache.circles:
+            rings = cache.circles.pop(key)   # put back at the most recently used end
+            cache.circles[key] = rings
+            return(rings)
+        rings = [np.array(ring, dtype=float).reshape(-1, 2) for ring in makecircle()]
+        cache.put(key, rings)
+        cache.added.append((key, rings))
+        return(rings)
+
+    def put(cache, key, rings):  # Keeps the rings of a circle as the most recently used one.
+        cache.circles.pop(key, None)
+        cache.circles[key] = rings
+        cache.changed = True
+        if len(cache.circles) > cache.maxsize:
+            cache.circles.popitem(last=False)
+
+    def takeadded(cache):  # Returns the (key, rings) of the circles worked out since the last call.
+        added = cache.added
+        cache.added = []
+        return(added)
+
+    def save(cache):
+        """ Saves the circles for the next run if any were added """
+        if not(cache.filename) or not(cache.changed):
+            return
+        replacefile(cache.filename, lambda f: pickle.dump({"version":circlecache_version, "circles":cache.circles.items()}, f, 2))
+        cache.changed = False
+
+class RobinsonBase:
+    """
+    The background of the pole maps (the Robinson projection with its coastlines, continents, parallels, meridians and
+    map boundary), drawn once for each lon_0 and kept pickled, so that each map only has to draw its poles over a fresh
+    copy of it. If filename is given, the backgrounds are loaded from it and save() writes them back, so they last
+    across runs; they are drawn again if the file was made with another version of matplotlib.
+    """
+    def __init__(base, filename=None):
+        base.filename = filename
+        base.backgrounds = {}
+        base.changed = False
+        if filename:
+            try:
+                with open(filename,'rb') as f:
+                    saved = pickle.load(f)
+                if (saved["version"] == basemapcache_version) and (saved["matplotlib"] == matplotlib.__version__):
+                    base.backgrounds = saved["backgrounds"]
+            except Exception:
+                pass
+
+    def drawbackground(base, lon_0):  # Draws the background on a new figure, as every pole map used to. Returns (fig, ax, m).
+        plt.clf()
+        fig = plt.figure(figsize=(13,7),facecolor='white')
+        fig = plt.gcf()
+        ax = fig.gca()
+        plt.subplots_adjust(left=0.05, right=0.06, top=0.06, bottom=0.05)
+        fig.tight_layout()
+
+        m = Basemap(projection='robin',lon_0=lon_0,resolution='c')
+        m.drawcoastlines()
+        m.fillcontinents(color='silver',lake_color='silver')
+        # draw parallels and meridians.
+        m.drawparallels(np.arange(-90.,120.,30.))
+        m.drawmeridians(np.arange(0.,360.,60.))
+        m.drawmapboundary(fill_color='grey')
+        return(fig, ax, m)
+
+    def newmap(base, lon_0):
+        """ Returns (fig, ax, m) of a new pole map with its background already drawn; fig and ax are made current for plt """
+        if not(lon_0 in base.backgrounds):
+            fig, ax, m = base.drawbackground(lon_0)
+            base.keep(lon_0, fig, m)
+            return(fig, ax, m)
+        fig, m = pickle.loads(base.backgrounds[lon_0])
+        ax = fig.axes[0]
+        plt.figure(fig.number)
+        plt.sca(ax)
+        return(fig, ax, m)
+
+    def keep(base, lon_0, fig, m):
+        try:
+            base.backgrounds[lon_0] = pickle.dumps((fig, m), 2)
+            base.changed = True
+        except Exception:   # a background that cannot be pickled is simply drawn for every map
+            pass
+
+    def prepare(base, lon_0):  # Draws the background for lon_0 now if it is not kept yet, e.g. before it is handed to worker processes.
+        if not(lon_0 in base.backgrounds):
+            fig, ax, m = base.drawbackground(lon_0)
+            base.keep(lon_0, fig, m)
+            plt.close('all')
+
+    def save(base):
+        """ Saves the backgrounds for the next run if any were drawn """
+        if not(base.filename) or not(base.changed):
+            return
+        replacefile(base.filename, lambda f: pickle.dump({"version":basemapcache_version, "matplotlib":matplotlib.__version__, "backgrounds":base.backgrounds}, f, 2))
+        base.changed = False
 
 def getoppositecolor(color):
     color = color.upper()
@@ -892,58 +1123,78 @@ def makesavereferences(directionlist,plotname,folderpath,periodname,shownumbers,
         print("Saving caption file %s" % captionfilename)
     return
 
-def makensaveeqareaplot(directionlist,plotname,folderpath,periodname,shownumbers,combinevk):
-    fig = plt.figure(figsize=(12,12),facecolor='white')
-    fig = plt.gcf()
-    ax = fig.gca()
-    plt.subplots_adjust(left=0.05, right=1.15, top=1.15, bottom=0.05)
-    fig.tight_layout()
+class StereonetTemplate:
+    """
+    The empty equal-area net (primitive circle, centre cross, rim ticks every 30 degrees, inclination ticks along the
+    axes, and N, E, S and W) of the equal-area plots, drawn once and kept pickled, so that each plot starts from a
+    fresh copy of it instead of drawing the net again.
+    """
+    def __init__(template):
+        template.nets = {}   # pickled (fig, ax) for each (axeslength, eqarearadius, chart_label_fontsize)
+
+    def drawnet(template, axeslength, eqarearadius, chart_label_fontsize):  # Draws the net on a new figure. Returns (fig, ax).
+        fig = plt.figure(figsize=(12,12),facecolor='white')
+        fig = plt.gcf()
+        ax = fig.gca()
+        plt.subplots_adjust(left=0.05, right=1.15, top=1.15, bottom=0.05)
+        fig.tight_layout()
+
+        ax.clear()
+        ax.axis('off')
+        ax.axis('equal')
+        ax.axis([-axeslength, axeslength, -axeslength, axeslength])
+
+        maincircle = plt.Circle((0, 0), eqarearadius, color="Black", fill=False, lw=1)
+        ax.add_artist(maincircle)
+
+        segments = [[(0,-6),(0,6)], [(-6,0),(6,0)]] # Draw Cross
+        for tickmarker in range(0, 360, 30): # circle ticks
+            tick_length = eqcircletick_length_dict[tickmarker]
+            tickmarker_rad = math.radians(tickmarker)
+            segments.append([(math.sin(tickmarker_rad)*(eqarearadius-tick_length), math.cos(tickmarker_rad)*(eqarearadius-tick_length)),
+                             (math.sin(tickmarker_rad)*eqarearadius, math.cos(tickmarker_rad)*eqarearadius)])
+        for tickmarker in range(30, 90, 30): # axes ticks
+            tick_length = eqaxestick_length_dict[tickmarker]
+            tickdist = math.sqrt(1-(math.sin(math.radians(math.fabs(tickmarker)))))*eqarearadius
+            segments.extend([[(tickdist,-tick_length),(tickdist,tick_length)], [(-tick_length,tickdist),(tick_length,tickdist)],
+                             [(-tickdist,-tick_length),(-tickdist,tick_length)], [(-tick_length,-tickdist),(tick_length,-tickdist)]])
+        ax.add_collection(LineCollection(segments, colors="Black", linewidths=1, capstyle="projecting", zorder=0))
+        ax.autoscale_view()   # as ax.plot did for each line
+
+        ax.text(0, eqarearadius + 7, "N", color="Black", ha="center", fontsize=chart_label_fontsize,zorder=0)
+        ax.text(eqarearadius + 7, 0, "E", color="Black", va="center", fontsize=chart_label_fontsize,zorder=0)
+        ax.text(0, -(eqarearadius + 7), "S", color="Black", ha="center", va="top", fontsize=chart_label_fontsize,zorder=0)
+        ax.text(-(eqarearadius + 7), 0, "W", color="Black", va="center", ha="right", fontsize=chart_label_fontsize,zorder=0)
+        return(fig, ax)
+
+    def newplot(template, axeslength, eqarearadius, chart_label_fontsize):
+        """ Returns (fig, ax) of a new equal-area plot with the net already drawn; fig and ax are made current for plt """
+        key = (axeslength, eqarearadius, chart_label_fontsize)
+        if not(key in template.nets):
+            fig, ax = template.drawnet(axeslength, eqarearadius, chart_label_fontsize)
+            try:
+                template.nets[key] = pickle.dumps((fig, ax), 2)
+            except Exception:   # a net that cannot be pickled is simply drawn for every plot
+                pass
+            return(fig, ax)
+        fig, ax = pickle.loads(template.nets[key])
+        plt.figure(fig.number)
+        plt.sca(ax)
+        return(fig, ax)
+
+stereonettemplate = StereonetTemplate()   # also made in each worker process that draws charts
 
+def makensaveeqareaplot(directionlist,plotname,folderpath,periodname,shownumbers,combinevk):
     axeslength = 500
     eqarearadius = 498
 
-    ax.clear()
-    ax.axis('off')
-    ax.axis('equal')
-    ax.axis([-axeslength, axeslength, -axeslength, axeslength])
-
-    maincircle = plt.Circle((0, 0), eqarearadius, color="Black", fill=False, lw=1)
-    ax.add_artist(maincircle)
-    
-    ax.plot([0,0],[-6,6],"Black",lw=1,zorder=0) # Draw Cross
-    ax.plot([-6,6],[0,0],"Black",lw=1,zorder=0)
-
-    tickmarker = 0 # plot circle ticks
-    while tickmarker < 360: 
-        tick_length = eqcircletick_length_dict[tickmarker]
-        tickmarker_rad = math.radians(tickmarker)
-        x1 = math.sin(tickmarker_rad)*(eqarearadius-tick_length)
-        x2 = math.sin(tickmarker_rad)*eqarearadius
-        y1 = math.cos(tickmarker_rad)*(eqarearadius-tick_length)
-        y2 = math.cos(tickmarker_rad)*eqarearadius
-        ax.plot([x1,x2],[y1,y2],"black",lw=1,zorder=0)
-        tickmarker = tickmarker + 30
-
-    tickmarker = 30 # plot axes ticks
-    while tickmarker < 90:
-        tick_length = eqaxestick_length_dict[tickmarker]
-        tickdist = math.sqrt(1-(math.sin(math.radians(math.fabs(tickmarker)))))*eqarearadius
-        ax.plot([tickdist,tickdist],[-tick_length,tick_length],"Black",lw=1,zorder=0)
-        ax.plot([-tick_length,tick_length],[tickdist,tickdist],"Black",lw=1,zorder=0)
-        ax.plot([-tickdist,-tickdist],[-tick_length,tick_length],"Black",lw=1,zorder=0)
-        ax.plot([-tick_length,tick_length],[-tickdist,-tickdist],"Black",lw=1,zorder=0)
-        tickmarker = tickmarker + 30
-
     chart_label_fontsize = 20
     label_fontsize = 18
     symbol = "o"
     drawcolor = "black"
     symbolsize = 500
 
-    ax.text(0, eqarearadius + 7, "N", color="Black", ha="center", fontsize=chart_label_fontsize,zorder=0)
-    ax.text(eqarearadius + 7, 0, "E", color="Black", va="center", fontsize=chart_label_fontsize,zorder=0)
-    ax.text(0, -(eqarearadius + 7), "S", color="Black", ha="center", va="top", fontsize=chart_label_fontsize,zorder=0)
-    ax.text(-(eqarearadius + 7), 0, "W", color="Black", va="center", ha="right", fontsize=chart_label_fontsize,zorder=0)
+    fig, ax = stereonettemplate.newplot(axeslength, eqarearadius, chart_label_fontsize)
 
     if directionlist:
         for dirnum, direction in enumerate(directionlist):
@@ -981,71 +1232,127 @@ def makensaveeqareaplot(directionlist,plotname,folderpath,periodname,shownumbers
     plt.close()
     return
 
-def goesthroughzero(angle1,angle2):
-    # Code adapted from https://stackoverflow.com/questions/11406189/determine-if-angle-lies-between-2-other-angles
-    angulardist = ((angle2 - angle1) % 360 + 360) % 360
-    if angulardist >= 180:
-        angle1,angle2 = angle2,angle1
-    if angle1 <= angle2:
-        anglegoesthroughzero = (angle1 <= 0) and (angle2 >= 0)
+def downvectors(dec_rad, inc_rad):  # Returns directions as unit vectors, one (north, east, down) row each, turned to point down.
+    vectors = np.transpose([np.cos(dec_rad) * np.cos(inc_rad), np.sin(dec_rad) * np.cos(inc_rad), np.sin(inc_rad)])
+    vectors[vectors[:, 2] < 0] *= -1
+    return(vectors)
+
+def ellipserings(decs, incs, a95s, eqarearadius, cosmologicalconstant, dashed=None):
+    """
+    Works out the a95 ellipses of all the directions of an equal-area plot at once: the points of every cone are turned
+    by its own trans_matrix and projected in one batched matrix operation. Each ellipse is drawn through as many points
+    as its projected size needs for its lines to stray no more than ellipseflatness from it, plus the two points where
+    it crosses the primitive circle, if it does. An ellipse whose entry in dashed is True is instead drawn through
+    dashedellipsedensity points per degree of a95 and no crossing points, as the dash pattern depends on where its
+    points fall. Returns a list of (ell_x, ell_y, upsidedown_x, upsidedown_y), one for each direction, where
+    upsidedown_x and upsidedown_y outline the part of the ellipse on the upper hemisphere, or are None if there is none.
+    """
+    decs, incs, a95s = [np.asarray(value, dtype=float) for value in (decs, incs, a95s)]
+    dashed = np.zeros(len(decs), dtype=bool) if dashed is None else np.asarray(dashed, dtype=bool)
+    conenums = np.arange(len(decs))
+    dec_rad = np.radians(decs)
+    inc_rad = np.radians(incs)
+    bigellipse = a95s > 90 # Note: Much of the math in this section is borrowed from pmagpy. Thank you!
+    ell_a95 = np.where(bigellipse, 180 - a95s, a95s)
+    dec = np.where(bigellipse, decs - 180, decs)
+    inc = np.where(bigellipse, -incs, incs)
+    rad_ell_a95 = np.radians(ell_a95)
+
+    trans_matrix = np.empty((len(decs), 3, 3))
+    trans_matrix[:, :, 0] = downvectors(dec_rad, np.radians(np.where(inc < 0, inc + 90, inc - 90)))
+    trans_matrix[:, :, 1] = downvectors(np.radians(dec + 90), np.zeros(len(decs)))
+    trans_matrix[:, :, 2] = downvectors(dec_rad, inc_rad)
+
+    projectedsize = math.sqrt(2) * eqarearadius * np.sqrt(1 - np.cos(rad_ell_a95)) # the widest the ellipse can be drawn
+    totdrawpoints = np.maximum(np.ceil(math.pi * np.sqrt(projectedsize / (2 * ellipseflatness))), ellipseminpoints).astype(int)
+    lastpoint = totdrawpoints - 1. # the point number at 360 degrees
+    totdrawpoints[dashed] = (ell_a95[dashed] * dashedellipsedensity).astype(int)
+    lastpoint[dashed] = ell_a95[dashed] * dashedellipsedensity - 1
+    cones = np.repeat(conenums, totdrawpoints) # the cone of each point
+    pointnum = np.arange(totdrawpoints.sum()) - np.repeat(np.cumsum(totdrawpoints) - totdrawpoints, totdrawpoints)
+    rad_pointnum = pointnum / lastpoint[cones] * 2 * math.pi
+
+    down_cos = trans_matrix[:, 2, 0] * np.sin(rad_ell_a95) # down = down_cos * cos(rad_pointnum) + down_sin * sin(rad_pointnum) + down_0
+    down_sin = trans_matrix[:, 2, 1] * np.sin(rad_ell_a95)
+    down_0 = trans_matrix[:, 2, 2] * np.cos(rad_ell_a95)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        crossing = -down_0 / np.hypot(down_cos, down_sin)
+        crosses = np.abs(crossing) < 1 # the ellipse crosses the primitive circle, where down = 0
+    crosses &= ~dashed
+    crossingangles = np.arctan2(down_sin, down_cos)[crosses] + [[-1], [1]] * np.arccos(crossing[crosses])
+    cones = np.concatenate([cones, conenums[crosses], conenums[crosses]])
+    rad_pointnum = np.concatenate([rad_pointnum, crossingangles.ravel() % (2 * math.pi)])
+    order = np.lexsort((rad_pointnum, cones))
+    cones = cones[order]
+    rad_pointnum = rad_pointnum[order]
+    oncrossing = order >= totdrawpoints.sum()
+
+    vector_matrix = np.empty((len(cones), 3))
+    vector_matrix[:, 0] = np.sin(rad_ell_a95[cones]) * np.cos(rad_pointnum)
+    vector_matrix[:, 1] = np.sin(rad_ell_a95[cones]) * np.sin(rad_pointnum)
+    vector_matrix[:, 2] = np.sqrt(1.0 - vector_matrix[:, 0]**2 - vector_matrix[:, 1]**2)
+    ellipse = np.einsum('pjk,pk->pj', trans_matrix[cones], vector_matrix)
+
+    R = np.sqrt(1.0 - np.abs(ellipse[:, 2])) / np.sqrt(ellipse[:, 0]**2 + ellipse[:, 1]**2)
+    R_deg = np.degrees(R) / 90 * eqarearadius * cosmologicalconstant
+    flip = np.where((incs < 0) | bigellipse, -1, 1)
+    ell_x = ellipse[:, 1] * R_deg * flip[cones]
+    ell_y = ellipse[:, 0] * R_deg * flip[cones]
+    upsidedown = (ellipse[:, 2] < 0) | oncrossing
+
+    rings = []
+    splits = np.cumsum(np.bincount(cones, minlength=len(decs)))[:-1]
+    for conenum, ell_x, ell_y, upsidedown in zip(conenums, np.split(ell_x, splits), np.split(ell_y, splits), np.split(upsidedown, splits)):
+        if crosses[conenum] or (dashed[conenum] and upsidedown.any()):
+            upsidedown_x, upsidedown_y = upsidedownring(ell_x[upsidedown], ell_y[upsidedown], eqarearadius, dashed[conenum])
+        else:
+            upsidedown_x, upsidedown_y = None, None
+        rings.append((ell_x, ell_y, upsidedown_x, upsidedown_y))
+    return(rings)
+
+def upsidedownring(upsidedown_x, upsidedown_y, eqarearadius, dashed=False):
+    """
+    Returns the (x, y) outline of the part of an a95 ellipse on the upper hemisphere, given by its points from one
+    crossing of the primitive circle to the other: they are followed by the arc of the primitive circle from the last
+    of them back to the first, drawn through as many points as it needs to stray no more than ellipseflatness from
+    the circle. The arc goes the shorter way round between the last and first points inside the circle.
+    A dashed outline has no crossing points, and its arc is drawn through the points of the primitive circle
+    that lie on a grid of dashedarcpointsperdegree points per degree.
+    """
+    start_phi = math.atan2(upsidedown_y[-1], upsidedown_x[-1])
+    end_phi = math.atan2(upsidedown_y[0], upsidedown_x[0])
+    inside = [1, -2] if (len(upsidedown_x) > 2) and not(dashed) else [0, -1]
+    inside_phi = np.arctan2(upsidedown_y[inside], upsidedown_x[inside])
+    arc = (end_phi - start_phi) % (2 * math.pi) # anticlockwise
+    if (inside_phi[0] - inside_phi[1]) % (2 * math.pi) > math.pi:
+        arc = arc - 2 * math.pi # clockwise
+    if dashed:
+        startpoint = int(round(math.degrees(start_phi) * dashedarcpointsperdegree))
+        endpoint = int(round(math.degrees(start_phi + arc) * dashedarcpointsperdegree))
+        if arc >= 0:
+            pointnums = np.arange(startpoint, endpoint)
+        else:
+            pointnums = np.arange(startpoint - 1, endpoint - 1, -1)
+        rad_phi = np.radians(pointnums / float(dashedarcpointsperdegree))
     else:
-        anglegoesthroughzero = (angle1 <=0) or (angle2 >= 0)
-    return(anglegoesthroughzero)
+        arcstep = 2 * math.acos(1 - ellipseflatness / eqarearadius)
+        rad_phi = start_phi + np.linspace(0, arc, int(math.ceil(abs(arc) / arcstep)) + 1)
+    return(np.concatenate([upsidedown_x, np.cos(rad_phi) * eqarearadius]), np.concatenate([upsidedown_y, np.sin(rad_phi) * eqarearadius]))
 
 def makensaveeqareaa95plot(directionlist,plotname,folderpath,periodname,shownumbers,combinevk,doantipoles):
-    fig = plt.figure(figsize=(12,12),facecolor='white')
-    fig = plt.gcf()
-    ax = fig.gca()
-    plt.subplots_adjust(left=0.05, right=1.15, top=1.15, bottom=0.05)
-    fig.tight_layout()
-
     axeslength = 500
     eqarearadius = 498
     cosmologicalconstant = 1.57 # Don't touch this setting or bad things will happen and the program won't work (and the universe may implode).
 
-    ax.clear()
-    ax.axis('off')
-    ax.axis('equal')
-    ax.axis([-axeslength, axeslength, -axeslength, axeslength])
-
-    maincircle = plt.Circle((0, 0), eqarearadius, color="Black", fill=False, lw=1)
-    ax.add_artist(maincircle)
-    
-    ax.plot([0,0],[-6,6],"Black",lw=1,zorder=0) # Draw Cross
-    ax.plot([-6,6],[0,0],"Black",lw=1,zorder=0)
-
-    tickmarker = 0 # plot circle ticks
-    while tickmarker < 360: 
-        tick_length = eqcircletick_length_dict[tickmarker]
-        tickmarker_rad = math.radians(tickmarker)
-        x1 = math.sin(tickmarker_rad)*(eqarearadius-tick_length)
-        x2 = math.sin(tickmarker_rad)*eqarearadius
-        y1 = math.cos(tickmarker_rad)*(eqarearadius-tick_length)
-        y2 = math.cos(tickmarker_rad)*eqarearadius
-        ax.plot([x1,x2],[y1,y2],"black",lw=1,zorder=0)
-        tickmarker = tickmarker + 30
-
-    tickmarker = 30 # plot axes ticks
-    while tickmarker < 90:
-        tick_length = eqaxestick_length_dict[tickmarker]
-        tickdist = math.sqrt(1-(math.sin(math.radians(math.fabs(tickmarker)))))*eqarearadius
-        ax.plot([tickdist,tickdist],[-tick_length,tick_length],"Black",lw=1,zorder=0)
-        ax.plot([-tick_length,tick_length],[tickdist,tickdist],"Black",lw=1,zorder=0)
-        ax.plot([-tickdist,-tickdist],[-tick_length,tick_length],"Black",lw=1,zorder=0)
-        ax.plot([-tick_length,tick_length],[-tickdist,-tickdist],"Black",lw=1,zorder=0)
-        tickmarker = tickmarker + 30
-
     chart_label_fontsize = 20
     label_fontsize = 24
     symbol = "o"
     symbolsize = 500
     ellipse_symbol = "o"
 
-    ax.text(0, eqarearadius + 7, "N", color="Black", ha="center", fontsize=chart_label_fontsize,zorder=0)
-    ax.text(eqarearadius + 7, 0, "E", color="Black", va="center", fontsize=chart_label_fontsize,zorder=0)
-    ax.text(0, -(eqarearadius + 7), "S", color="Black", ha="center", va="top", fontsize=chart_label_fontsize,zorder=0)
-    ax.text(-(eqarearadius + 7), 0, "W", color="Black", va="center", ha="right", fontsize=chart_label_fontsize,zorder=0)
+    fig, ax = stereonettemplate.newplot(axeslength, eqarearadius, chart_label_fontsize)
 
+    cones = []
     if directionlist:
         for dirnum, direction in enumerate(directionlist):
             age = direction[0]
@@ -1092,179 +1399,23 @@ def makensaveeqareaa95plot(directionlist,plotname,folderpath,periodname,shownumb
 
             if ell_a95 == 0:
                 continue
-            
-            ell_x_list = []
-            ell_y_list = []
-            
-            if ell_a95 > 90: # Note: Much of the math in this section is borrowed from pmagpy. Thank you!
-                bigellipse = True
-                ell_a95 = 180 - ell_a95
-                dec = dec - 180
-                inc = -inc
-            else:
-                bigellipse = False
-            
-            rad_ell_a95 = math.radians(ell_a95)
-           
-            trans_matrix = [[0,0,0],[0,0,0],[0,0,0]]
-            
-            north = math.cos(dec_rad) * math.cos(inc_rad)
-            east = math.sin(dec_rad) * math.cos(inc_rad)
-            down = math.sin(inc_rad)
-
-            if down < 0:
-                north = -north
-                east = -east
-                down = -down
-
-            trans_matrix[0][2] = north
-            trans_matrix[1][2] = east
-            trans_matrix[2][2] = down
+            cones.append((dec, inc, ell_a95, drawcolor, lw, ls, hatch, zplotorder))
 
-            binc = inc - ( (abs(inc)/inc) * 90 )
-            rad_binc = math.radians(binc)
-            
-            north = math.cos(dec_rad) * math.cos(rad_binc)
-            east = math.sin(dec_rad) * math.cos(rad_binc)
-            down = math.sin(rad_binc)
-
-            if down < 0:
-                north = -north
-                east = -east
-                down = -down
-
-            trans_matrix[0][0] = north
-            trans_matrix[1][0] = east
-            trans_matrix[2][0] = down
-
-            gdec = dec + 90
-            rad_gdec = math.radians(gdec)
-            ginc = 0
-            
-            north = math.cos(rad_gdec) * math.cos(ginc)
-            east = math.sin(rad_gdec) * math.cos(ginc)
-            down = math.sin(ginc)
-
-            if down < 0:
-                north = -north
-                east = -east
-                down = -down
-
-            trans_matrix[0][1] = north
-            trans_matrix[1][1] = east
-            trans_matrix[2][1] = down
-
-            #ellipse_densityfactor = 1
-            ellipse_densityfactor = 50
-            totdrawpoints = ell_a95 * ellipse_densityfactor
-            totdrawpoints_int = int(totdrawpoints)
-
-##            pointsperdegree = float(float(totdrawpoints) / 360)
-##            startdegrees = 0
-##            enddegrees = int(round(360*pointsperdegree,0))
-
-            #print("%s. Reference %s; drawcolor = %s; a95 = %s" % (refnum, reference, drawcolor, ell_a95) )
-
-            upsidedown = False
-            upsidedown_x_list = []
-            upsidedown_y_list = []
-            usdnum = 0
-            for pointnum in range(0,totdrawpoints_int):
-                degrees = pointnum / (totdrawpoints-1) * 360
-                rad_pointnum = math.radians(degrees)
-                vector_matrix = [0,0,0]
-                vector_matrix[0] = math.sin(rad_ell_a95) * math.cos(rad_pointnum)
-                vector_matrix[1] = math.sin(rad_ell_a95) * math.sin(rad_pointnum)
-                vector_matrix[2] = math.sqrt(1.0 - vector_matrix[0]**2 - vector_matrix[1]**2)
-                ellipse = [0,0,0]       
-                for j in range(0,3):
-                    for k in range(0,3):
-                        ellipse[j] = ellipse[j] + (trans_matrix[j][k]*vector_matrix[k])                    
-                R = math.sqrt(1.0 - abs(ellipse[2])) / math.sqrt (ellipse[0]**2 + ellipse[1]**2)
-                R_deg = math.degrees(R) / 90 * eqarearadius * cosmologicalconstant
-                ell_x = (ellipse[1] * R_deg)
-                ell_y = (ellipse[0] * R_deg)
-                if up or bigellipse:
-                    ell_x = -ell_x
-                    ell_y = -ell_y
-                #newpoint = ax.scatter(ell_x, ell_y, color=drawcolor, s=5, marker=ellipse_symbol,zorder=zplotorder)
-                #ax.text(ell_x, ell_y, str(pointnum),color="black",va='center',ha='center',zorder=zplotorder+1,fontsize=label_fontsize,fontweight='normal')
-                ell_x_list.append(ell_x)
-                ell_y_list.append(ell_y)
-                #print("%s: R=%.3f; R_deg=%.3f; ell[2]=%.3f; ell[1]=%.3f; ell[0]=%.3f; ell_x=%.3f; ell_y=%.3f" % (pointnum,R,R_deg,ellipse[2],ellipse[1],ellipse[0],ell_x,ell_y) )
-
-                if ellipse[2] < 0:
-                    upsidedown = True
-                    upsidedown_x_list.append(ell_x)
-                    upsidedown_y_list.append(ell_y)
-                    #print("%s (%s): ell_x: %.3f, ell_y: %.3f" % (usdnum, pointnum,ell_x,ell_y) )
-                    usdnum = usdnum + 1
-
-            zippy = zip(ell_x_list, ell_y_list)
+    if cones:
+        decs, incs, a95s = zip(*cones)[:3]
+        rings = ellipserings(decs, incs, a95s, eqarearadius, cosmologicalconstant, [cone[5] == "--" for cone in cones])
+        for (dec, inc, ell_a95, drawcolor, lw, ls, hatch, zplotorder), (ell_x, ell_y, upsidedown_x, upsidedown_y) in zip(cones, rings):
+            zippy = zip(ell_x, ell_y)
             pol = Polygon(zippy)
             fullellipse = PolygonPatch(pol, fc=drawcolor, ec='#000000', alpha=.5, lw=lw, ls=ls, hatch=hatch, zorder=zplotorder)
             ax.add_patch(fullellipse)
 
-            if upsidedown:
-                start_x = upsidedown_x_list[-1]
-                start_y = upsidedown_y_list[-1]
-                start_phi = math.degrees(math.atan2(start_y,start_x)) % 360
-                #print("start values: start_x = %s; start_y = %s, start_phi = %s" % (start_x,start_y, start_phi))
-                
-                end_x = upsidedown_x_list[0]
-                end_y = upsidedown_y_list[0]
-                end_phi = math.degrees(math.atan2(end_y,end_x)) % 360
-                #print("end values: end_x = %s; end_y = %s, end_phi = %s" % (end_x,end_y, end_phi))
-
-                doreverse = False
-                if not(goesthroughzero(start_phi,end_phi)):
-                    #print("doesn'tgothroughzero")
-                    if start_phi > end_phi:
-                        start_phi,end_phi = end_phi,start_phi
-                        doreverse = True
-                else:
-                    #print("goesthrouthzero")
-                    bigger = max(start_phi,end_phi)
-                    if bigger == end_phi:
-                        doreverse = True
-                    smaller = min(start_phi,end_phi)
-                    start_phi = bigger - 360
-                    end_phi = smaller
-    
-                #print(start_phi, end_phi)
-                
-                pointsperdegree = 5
-                startpoint = int(round(pointsperdegree * start_phi,0))
-                endpoint = int(round(pointsperdegree * end_phi,0))
-
-                #print(startpoint,endpoint,doreverse)
-
-                if not doreverse:
-                    for pointnum in range(startpoint,endpoint):
-                        degrees_pointnum = (float(pointnum)/pointsperdegree)
-                        rad_pointnum = math.radians(degrees_pointnum)
-                        upsidedown_x = math.cos(rad_pointnum) * eqarearadius
-                        upsidedown_y = math.sin(rad_pointnum) * eqarearadius
-                        upsidedown_x_list.append(upsidedown_x)
-                        upsidedown_y_list.append(upsidedown_y)
-                        #print("%s (%s) (degrees: %.5f): usd_x: %.3f, usd_y: %.3f" % (usdnum, pointnum, degrees_pointnum, upsidedown_x,upsidedown_y) )
-                        usdnum = usdnum + 1
-                else:
-                    for pointnum in reversed(range(startpoint,endpoint)):
-                        degrees_pointnum = (float(pointnum)/pointsperdegree)
-                        rad_pointnum = math.radians(degrees_pointnum)
-                        upsidedown_x = math.cos(rad_pointnum) * eqarearadius
-                        upsidedown_y = math.sin(rad_pointnum) * eqarearadius
-                        upsidedown_x_list.append(upsidedown_x)
-                        upsidedown_y_list.append(upsidedown_y)
-                        #print("%s (%s) (degrees: %.5f): usd_x: %.3f, usd_y: %.3f" % (usdnum, pointnum, degrees_pointnum, upsidedown_x,upsidedown_y) )
-                        usdnum = usdnum + 1                    
-                 
-                zippy_usd = zip(upsidedown_x_list, upsidedown_y_list)
+            if upsidedown_x is not None:
+                zippy_usd = zip(upsidedown_x, upsidedown_y)
                 pol_usd = Polygon(zippy_usd)
                 usd_ellipse = PolygonPatch(pol_usd, fc='#800080', ec='#000000', alpha=.5, lw=lw, ls=ls, hatch=hatch, zorder=zplotorder)
                 ax.add_patch(usd_ellipse)
-                
+
     saveimagename = periodname + "_" + plotname + "_directionsa95.png"
     saveimagepath = folderpath + "\\" + saveimagename
     print("Saving image %s" % saveimagename)
@@ -1273,20 +1424,7 @@ def makensaveeqareaa95plot(directionlist,plotname,folderpath,periodname,shownumb
     return
 
 def makensavepoleplot(directionlist,plotname,folderpath,periodname,shownumbers,combinevk):
-    plt.clf()
-    fig = plt.figure(figsize=(13,7),facecolor='white')
-    fig = plt.gcf()
-    ax = fig.gca()
-    plt.subplots_adjust(left=0.05, right=0.06, top=0.06, bottom=0.05)
-    fig.tight_layout()
-
-    m = Basemap(projection='robin',lon_0=0,resolution='c')
-    m.drawcoastlines()
-    m.fillcontinents(color='silver',lake_color='silver')
-    # draw parallels and meridians.
-    m.drawparallels(np.arange(-90.,120.,30.))
-    m.drawmeridians(np.arange(0.,360.,60.))
-    m.drawmapboundary(fill_color='grey')
+    fig, ax, m = robinsonbase.newmap(0)
     #plt.title(periodname)
 
     if directionlist:
@@ -1318,23 +1456,10 @@ def makensavepoleplot(directionlist,plotname,folderpath,periodname,shownumbers,c
     return
 
 def makensavepolea95plot(directionlist,plotname,folderpath,periodname,shownumbers,combinevk,doantipoles):
-    plt.clf()
-    fig = plt.figure(figsize=(13,7),facecolor='white')
-    fig = plt.gcf()
-    ax = fig.gca()
-    plt.subplots_adjust(left=0.05, right=0.06, top=0.06, bottom=0.05)
-    fig.tight_layout()
-
     midlon = 0
     label_fontsize = 16
     boundary = (midlon - 180) % 360
-    m = Basemap(projection='robin',lon_0=midlon,resolution='c')
-    m.drawcoastlines()
-    m.fillcontinents(color='silver',lake_color='silver')
-    # draw parallels and meridians.
-    m.drawparallels(np.arange(-90.,120.,30.))
-    m.drawmeridians(np.arange(0.,360.,60.))
-    m.drawmapboundary(fill_color='grey')
+    fig, ax, m = robinsonbase.newmap(midlon)
     plt.title(periodname)
     
     if directionlist:
@@ -1388,11 +1513,8 @@ def makensavepolea95plot(directionlist,plotname,folderpath,periodname,shownumber
 
             if radius > lon_diff_realdist:
                 #print("%s. IIIIIIIIIIINNNNNNNNNNNNNNN WRAP" % refnum)
-                p = Point(m(lon, lat))
-                buffered = p.buffer(radius * 1000)
-
                 toohighlat = (math.fabs(lat) + a95) > 90
-                circleset = circle_wrap(m, lon, lat, radius, midlon, boundary, lon_diff_angdist, toohighlat)
+                circleset = circlecache.get(("robin", midlon, lon, lat, a95), lambda: circle_wrap(m, lon, lat, radius, midlon, boundary, lon_diff_angdist, toohighlat))
                 
                 circle_main = circleset[0]
                 poly_main = Polygon(circle_main)
@@ -1416,9 +1538,7 @@ def makensavepolea95plot(directionlist,plotname,folderpath,periodname,shownumber
                     
                 continue
             
-            p = Point(m(lon, lat))
-            buffered = p.buffer(radius * 1000)
-            circle_main = circle(m, lon, lat, radius)
+            circle_main = circlecache.get(("robin", midlon, lon, lat, a95), lambda: [circle(m, lon, lat, radius)])[0]
             poly_main = Polygon(circle_main)
             polypatch_main = PolygonPatch(poly_main, fc=drawcolor, ec='#000000', alpha=.5, lw=lw, ls=ls, hatch=hatch, zorder=zplotorder)
             ax.add_patch(polypatch_main)
@@ -1437,32 +1557,29 @@ def makensavepolea95plot(directionlist,plotname,folderpath,periodname,shownumber
 def dotimeperiod(verifiedpoles_list,keypoles_list,periodname,endtime,starttime,shownumbers,doantipoles):
     print("\n----------------------------\nDoing Time Period: %s. Start time = %s Ma, End time = %s Ma." % (periodname, starttime, endtime) )
 
+    signature = periodsignature(verifiedpoles_list,keypoles_list,endtime,starttime,shownumbers,doantipoles)
+    periodsignatures[periodname] = signature
+    if copyperiodcharts(periodname, signature):
+        print("The poles of this time period have not changed, so its charts were copied from %s." % evaluationstate["chartfolder"])
+        return
+
     verifieddirectionlist = []
-    for pole in verifiedpoles_list:
-        age_int = pole[1]
+    for n in verifiedpoles_list:
+        age_int = int(poletable.age[n])
         if starttime < age_int <= endtime:
-            dec_num = pole[16]
-            inc_num = pole[17]
-            dira95 = pole[18]
-            polelat = pole[6]
-            polelon = pole[7]
-            polea95 = pole[10]
-
-            unit_decoded = pole[3]
-            component_decoded = pole[4]
-            pmagref_decoded = pole[20]
-            agetext = pole[32][1]
-            poletype = pole[33]
-            if component_decoded != "":
-                spacer = " "
-            else:
-                spacer= ""                
-            refinfo = ("%s: %s%s%s, Age: %s Ma" % (pmagref_decoded, unit_decoded, spacer, component_decoded, agetext) )
+            dec_num = float(poletable.dec[n])
+            inc_num = float(poletable.inc[n])
+            dira95 = float(poletable.directiona95[n])
+            polelat = float(poletable.polelat[n])
+            polelon = float(poletable.polelon[n])
+            polea95 = cellvalue(poletable.polea95[n])
+            poletype = poletable.poletype[n]
+            refinfo = ("%s: %s, Age: %s Ma" % (poletable.pmagref[n], poletable.unitcomponent(n, " "), poletable.agetext(n)) )
 
             verifieddirectionlist.append([age_int,dec_num,inc_num,dira95,polelat,polelon,polea95,refinfo,True,poletype])
             if doantipoles:
-                antipolelat = pole[8]
-                antipolelon = pole[9]
+                antipolelat = float(poletable.antipolelat[n])
+                antipolelon = float(poletable.antipolelon[n])
                 antiinc = -inc_num
                 antidec = (dec_num + 180) % 360
                 if antidec < 0:
@@ -1470,31 +1587,22 @@ def dotimeperiod(verifiedpoles_list,keypoles_list,periodname,endtime,starttime,s
                 verifieddirectionlist.append([age_int,antidec,antiinc,dira95,antipolelat,antipolelon,polea95,refinfo,False,poletype])
 
     keydirectionlist = []
-    for pole in keypoles_list:
-        age_int = pole[1]
+    for n in keypoles_list:
+        age_int = int(poletable.age[n])
         if starttime < age_int <= endtime:
-            dec_num = pole[16]
-            inc_num = pole[17]
-            dira95 = pole[18]
-            polelat = pole[6]
-            polelon = pole[7]
-            polea95 = pole[10]
-
-            unit_decoded = pole[3]
-            component_decoded = pole[4]
-            pmagref_decoded = pole[20]
-            agetext = pole[32][1]
-            poletype = pole[33]
-            if component_decoded != "":
-                spacer = " "
-            else:
-                spacer= ""                
-            refinfo = ("%s: %s%s%s, Age: %s Ma" % (pmagref_decoded, unit_decoded, spacer, component_decoded, agetext) )
+            dec_num = float(poletable.dec[n])
+            inc_num = float(poletable.inc[n])
+            dira95 = float(poletable.directiona95[n])
+            polelat = float(poletable.polelat[n])
+            polelon = float(poletable.polelon[n])
+            polea95 = cellvalue(poletable.polea95[n])
+            poletype = poletable.poletype[n]
+            refinfo = ("%s: %s, Age: %s Ma" % (poletable.pmagref[n], poletable.unitcomponent(n, " "), poletable.agetext(n)) )
 
             keydirectionlist.append([age_int,dec_num,inc_num,dira95,polelat,polelon,polea95,refinfo,True,poletype])
             if doantipoles:
-                antipolelat = pole[8]
-                antipolelon = pole[9]
+                antipolelat = float(poletable.antipolelat[n])
+                antipolelon = float(poletable.antipolelon[n])
                 antiinc = -inc_num
                 antidec = (dec_num + 180) % 360
                 if antidec < 0:
@@ -1545,155 +1653,233 @@ def dotimeperiod(verifiedpoles_list,keypoles_list,periodname,endtime,starttime,s
 ##    makensavepoleplot(keydirectionlist_pole_sorted_age,"keypoles",keypath,periodname,shownumbers,False)
 ##    makensavepolea95plot(keydirectionlist_pole_sorted_age,"keypoles",keypath,periodname,shownumbers,False,doantipoles)
 
-    makesavereferences(verifieddirectionlist_dir_sorted_age,"combinedpoles",combinedpath,periodname,shownumbers,True)
-    makensaveeqareaplot(verifieddirectionlist_dir_sorted_age,"combinedpoles",combinedpath,periodname,shownumbers,True)
-    makensaveeqareaa95plot(verifieddirectionlist_dir_sorted_age,"combinedpoles",combinedpath,periodname,shownumbers,True,doantipoles)
-    makensavepoleplot(verifieddirectionlist_pole_sorted_age,"combinedpoles",combinedpath,periodname,shownumbers,True)
-    makensavepolea95plot(verifieddirectionlist_pole_sorted_age,"combinedpoles",combinedpath,periodname,shownumbers,True,doantipoles)
+    # The charts are drawn later by renderchartjobs(), possibly in parallel with those of other time periods.
+    chartjobs.append(("makesavereferences", (verifieddirectionlist_dir_sorted_age,"combinedpoles",combinedpath,periodname,shownumbers,True)))
+    chartjobs.append(("makensaveeqareaplot", (verifieddirectionlist_dir_sorted_age,"combinedpoles",combinedpath,periodname,shownumbers,True)))
+    chartjobs.append(("makensaveeqareaa95plot", (verifieddirectionlist_dir_sorted_age,"combinedpoles",combinedpath,periodname,shownumbers,True,doantipoles)))
+    chartjobs.append(("makensavepoleplot", (verifieddirectionlist_pole_sorted_age,"combinedpoles",combinedpath,periodname,shownumbers,True)))
+    chartjobs.append(("makensavepolea95plot", (verifieddirectionlist_pole_sorted_age,"combinedpoles",combinedpath,periodname,shownumbers,True,doantipoles)))
     return
 
-####################### MAIN PROGRAM #######################
+def initchartworker(backgrounds, circles):  # Runs once in each worker process: gives it the map backgrounds and circles of the main process.
+    global robinsonbase, circlecache
+    robinsonbase = RobinsonBase()
+    robinsonbase.backgrounds = backgrounds
+    circlecache = CircleCache(circlecachesize)
+    circlecache.circles = OrderedDict(circles)
 
-os.system('mode con: cols=150 lines=60')
-print('\n' + "Hello. This script is ready to evaluate for poles near the pole you specify,\nwithin an angular distance you specify, and within temporal distance you specify.")
+def renderchart(chartjob):  # Draws and saves one chart. Returns the circles that had to be worked out for it, for the main process to keep.
+    functionname, chartargs = chartjob
+    globals()[functionname](*chartargs)
+    return(circlecache.takeadded())
 
-if not(os.path.isfile(excelfilename)): # check if the excelfilename exists in this folder.
-    print('\n' + "This folder does NOT contain the file %s, which is necessary for this program to run." % excelfilename)
-    endchoice = raw_input('\n' + "----- This program will now end. Press enter to exit. -----")
-    sys.exit()
+def renderchartjobs(chartjobs, processes):
+    """
+    Draws the charts of every time period, one chart per task, in a pool of worker processes (one per CPU if processes
+    is None), or one after another in this process if processes is 1. Each chart is saved under its own name, so the
+    order in which they are drawn does not matter; the charts with the most poles are started first.
+    """
+    chartjobs = sorted(chartjobs, reverse = True, key = lambda chartjob: len(chartjob[1][0]))
+    if (processes == 1) or (len(chartjobs) < 2):   # no need for worker processes
+        for chartjob in chartjobs:
+            renderchart(chartjob)
+        circlecache.takeadded()
+        return
+    robinsonbase.prepare(0)   # all pole maps are centred on lon_0 = 0
+    pool = multiprocessing.Pool(processes, initchartworker, (robinsonbase.backgrounds, circlecache.circles.items()))
+    for added in pool.imap_unordered(renderchart, chartjobs):
+        for key, rings in added:
+            circlecache.put(key, rings)
+    pool.close()
+    pool.join()
+
+####################### MAIN PROGRAM #######################
 
-print('\n' + "The Excel source file %s has been found!" % excelfilename)
-print('\n' + "----------------------------")
-
-filepath = os.path.dirname(os.path.realpath(__file__))
-data_chartfoldername = getdatachartfoldername(filepath)
-data_chartfolderpath = filepath + "\\" + data_chartfoldername
-os.makedirs(data_chartfolderpath)
-newexcelfilename = data_chartfolderpath + "\\" + excelfilename
-copy(filepath + "\\" + excelfilename, newexcelfilename) # Copy Excel File Into Chart + Data Folder
-backupexcelfilename = excelfilename + ".bak"
-copy(filepath + "\\" + excelfilename, data_chartfolderpath + "\\" + backupexcelfilename) # Backup Excel File in New Chart + Data Folder
-
-verifiedpath = data_chartfolderpath + "\\" + "verifiedpoles"
-os.makedirs(verifiedpath)
-keypath = data_chartfolderpath + "\\" + "keypoles"
-os.makedirs(keypath)
-combinedpath = data_chartfolderpath + "\\" + "combinedpoles"
-os.makedirs(combinedpath)
-
-print('\n' + "Created new file directory %s and Excel file %s and backup Excel file %s into it." % (data_chartfoldername,newexcelfilename,backupexcelfilename))
-print('\n' + "----------------------------")
-
-minpoleangdist = enterpoleangdist()
-minpoletempdist = enterpoletempdist()
-
-wb = open_workbook(excelfilename)
-allpoles_list_sorted_age = loadallpoles(wb)
-
-verifiedpoles_list = processverifiedpoles()
-keypoles_list = processkeypoles()
-
-wb = xlwt.Workbook(encoding='latin-1')
-
-borders4 = xlwt.Borders()
-borders4.left = 1
-borders4.right = 1
-borders4.top = 1
-borders4.bottom = 1
-
-boldstyle = xlwt.XFStyle()
-boldfont = xlwt.Font()
-boldfont.name = "Times New Roman"
-boldfont.height = 8 * 20
-boldfont.bold = True
-boldstyle.font = boldfont
-boldstyle.borders = borders4
-
-normalstyle = xlwt.XFStyle()
-normalfont = xlwt.Font()
-normalfont.name = "Times New Roman"
-normalfont.height = 8 * 20
-normalstyle.font = normalfont
-normalstyle.borders = borders4
-
-vpolesheet = wb.add_sheet("Verified Poles")
-row = vpolesheet.row(0)
-for index, coltext in enumerate(cols):
-    vpolesheet.col(index).width = (coltext[1] * 256)
-    row.write(index,coltext[0],style=boldstyle)
-polenum = 1
-
-for pole in verifiedpoles_list:
-    row = vpolesheet.row(polenum)
-    writetext_list = pole[32]
-    for index, textitem in enumerate(writetext_list):
-        row.write(index, textitem,style=normalstyle)
-    polenum = polenum + 1
-
-vpolesheet.set_panes_frozen(True)
-vpolesheet.set_horz_split_pos(1) 
-
-kpolesheet = wb.add_sheet("Key Poles")
-row = kpolesheet.row(0)
-for index, coltext in enumerate(cols):
-    kpolesheet.col(index).width = (coltext[1] * 256)
-    row.write(index,coltext[0],style=boldstyle)
-polenum = 1
-for pole in keypoles_list:
-    row = kpolesheet.row(polenum)
-    writetext_list = pole[32]
-    for index, textitem in enumerate(writetext_list):
-        row.write(index, textitem,style=normalstyle)     
-    polenum = polenum + 1
-
-kpolesheet.set_panes_frozen(True)
-kpolesheet.set_horz_split_pos(1)
-
-apolesheet = wb.add_sheet("All Poles")
-row = apolesheet.row(0)
-for index, coltext in enumerate(cols):
-    apolesheet.col(index).width = (coltext[1] * 256)
-    row.write(index,coltext[0],style=boldstyle)
-
-polenum = 1
-for pole in allpoles_list_sorted_age:
-    row = apolesheet.row(polenum)
-    writetext_list = pole[32]
-    cellcolor = cellcolordict[pole[33]]
-    colorstyle = xlwt.XFStyle()
-    colorpattern = xlwt.Pattern()
-    colorpattern.pattern = xlwt.Pattern.SOLID_PATTERN
-    colorpattern.pattern_fore_colour = xlwt.Style.colour_map[cellcolor]
-    colorstyle.pattern = colorpattern
-    colorstyle.borders = borders4
-    #colorstyle.font = normalfont
-    for index, textitem in enumerate(writetext_list):
-        row.write(index, textitem,style=colorstyle)     
-    polenum = polenum + 1
-
-apolesheet.set_panes_frozen(True)
-apolesheet.set_horz_split_pos(1)
-
-saveexcelpath_name = data_chartfolderpath + "\\" + finalpolesexcelfilename
-wb.save(saveexcelpath_name)
-print("Saving Excel File with Verified/Key Poles %s." % finalpolesexcelfilename)
-
-dotimeperiod(verifiedpoles_list,keypoles_list,"Eoarchean",4000,3600,True,False)
-dotimeperiod(verifiedpoles_list,keypoles_list,"Paleoarchean",3600,3200,True,False)
-dotimeperiod(verifiedpoles_list,keypoles_list,"Mesoarchean",3200,2800,True,False)
-dotimeperiod(verifiedpoles_list,keypoles_list,"Neoarchean",2800,2500,True,False)
-
-dotimeperiod(verifiedpoles_list,keypoles_list,"Early Paleoproterozoic",2500,2050,True,False)
-dotimeperiod(verifiedpoles_list,keypoles_list,"Late Paleoproterozoic",2050,1600,True,False)
-dotimeperiod(verifiedpoles_list,keypoles_list,"Mesoproterozoic",1600,1000,True,False)
-dotimeperiod(verifiedpoles_list,keypoles_list,"Neoproterozoic",1000,541,True,False)
-
-##dotimeperiod(verifiedpoles_list,keypoles_list,"Paleozoic",541,252,True,False)
-##dotimeperiod(verifiedpoles_list,keypoles_list,"Mesozoic",252,66,True,False)
-##dotimeperiod(verifiedpoles_list,keypoles_list,"Cenozoic",66,0,True,False)
-dotimeperiod(verifiedpoles_list,keypoles_list,"Phanerozoic",541,0,True,False)
-
-dotimeperiod(verifiedpoles_list,keypoles_list,"All",4000,0,False,True)
-
-endchoice = raw_input('\n' + "----- Program complete. Goodbye! Please press enter to exit. -----")
-sys.exit()
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Evaluates paleopoles for the Q criteria of Van der Voo (1990) and prints pole maps and equal area plots.")
+    parser.add_argument("--sweep", nargs=2, metavar=("ANGDISTS","TIMES"), type=thresholdgrid,
+                        help="instead of making charts, find the verified and key poles for every pair of criterion 7 thresholds; "
+                             "each list is either values separated by commas (5,10,20) or start:stop:step (0:30:5)")
+    parser.add_argument("--processes", metavar="N", type=int, default=None, help="number of worker processes drawing the charts (default: one per CPU; 1 draws them one after another)")
+    args = parser.parse_args()
+    if (args.processes != None) and (args.processes < 1):
+        parser.error("--processes must be at least 1")
+    if args.sweep != None:
+        sweepangdists, sweeptempdists = args.sweep
+        if not(0 <= min(sweepangdists) and max(sweepangdists) <= 360):
+            parser.error("minimum angular distances must be >= 0 and <= 360")
+        if not(0 <= min(sweeptempdists)):
+            parser.error("minimum times must be >= 0")
+        if len(sweepangdists) * len(sweeptempdists) > maxsweeppairs:
+            parser.error("a sweep can have at most %s pairs of thresholds" % maxsweeppairs)
+
+    os.system('mode con: cols=150 lines=60')
+    print('\n' + "Hello. This script is ready to evaluate for poles near the pole you specify,\nwithin an angular distance you specify, and within temporal distance you specify.")
+
+    if not(os.path.isfile(excelfilename)): # check if the excelfilename exists in this folder.
+        print('\n' + "This folder does NOT contain the file %s, which is necessary for this program to run." % excelfilename)
+        endchoice = raw_input('\n' + "----- This program will now end. Press enter to exit. -----")
+        sys.exit()
+
+    print('\n' + "The Excel source file %s has been found!" % excelfilename)
+    print('\n' + "----------------------------")
+
+    filepath = os.path.dirname(os.path.realpath(__file__))
+
+    if args.sweep != None:
+        poletable = loadallpoles(excelfilename)
+        print('\n' + "Evaluating %s poles for %s pairs of criterion 7 thresholds..." % (len(poletable), len(sweepangdists) * len(sweeptempdists)))
+        thresholdpairs, verifiedpoles_lists, keypoles_list = dothresholdsweep(poletable, sweepangdists, sweeptempdists, filepath + "\\" + sweepexcelfilename)
+        print('\n' + "%-12s %-12s %-10s %-10s" % ("Min. angle", "Min. time", "Verified", "Key"))
+        for (angdist, tempdist), verifiedpoles_list in zip(thresholdpairs, verifiedpoles_lists):
+            print("%-12g %-12g %-10s %-10s" % (angdist, tempdist, len(verifiedpoles_list), len(keypoles_list)))
+        print('\n' + "Saved which poles are verified and key poles for each pair of thresholds to %s." % sweepexcelfilename)
+        endchoice = raw_input('\n' + "----- Program complete. Goodbye! Please press enter to exit. -----")
+        sys.exit()
+
+    data_chartfoldername = getdatachartfoldername(filepath)
+    data_chartfolderpath = filepath + "\\" + data_chartfoldername
+    os.makedirs(data_chartfolderpath)
+    newexcelfilename = data_chartfolderpath + "\\" + excelfilename
+    copy(filepath + "\\" + excelfilename, newexcelfilename) # Copy Excel File Into Chart + Data Folder
+    backupexcelfilename = excelfilename + ".bak"
+    copy(filepath + "\\" + excelfilename, data_chartfolderpath + "\\" + backupexcelfilename) # Backup Excel File in New Chart + Data Folder
+
+    verifiedpath = data_chartfolderpath + "\\" + "verifiedpoles"
+    os.makedirs(verifiedpath)
+    keypath = data_chartfolderpath + "\\" + "keypoles"
+    os.makedirs(keypath)
+    combinedpath = data_chartfolderpath + "\\" + "combinedpoles"
+    os.makedirs(combinedpath)
+
+    print('\n' + "Created new file directory %s and Excel file %s and backup Excel file %s into it." % (data_chartfoldername,newexcelfilename,backupexcelfilename))
+    print('\n' + "----------------------------")
+
+    minpoleangdist = enterpoleangdist()
+    minpoletempdist = enterpoletempdist()
+
+    poletable = loadallpoles(excelfilename)
+
+    evaluationstate = loadevaluationstate(filepath + "\\" + evaluationstatename)
+    canverify = bool((poletable.vvqtotal >= (verifiedqmin-1)).any())
+    reusecount = comparepoletables(evaluationstate, poletable, canverify)
+    verifiedprefix_list, keyprefix_list = restorepoleresults(evaluationstate, poletable, reusecount)
+
+    verifiedpoles_list = processverifiedpoles(reusecount, verifiedprefix_list)
+    keypoles_list = processkeypoles(reusecount, keyprefix_list)
+
+    wb = xlwt.Workbook(encoding='latin-1')
+
+    borders4 = xlwt.Borders()
+    borders4.left = 1
+    borders4.right = 1
+    borders4.top = 1
+    borders4.bottom = 1
+
+    boldstyle = xlwt.XFStyle()
+    boldfont = xlwt.Font()
+    boldfont.name = "Times New Roman"
+    boldfont.height = 8 * 20
+    boldfont.bold = True
+    boldstyle.font = boldfont
+    boldstyle.borders = borders4
+
+    normalstyle = xlwt.XFStyle()
+    normalfont = xlwt.Font()
+    normalfont.name = "Times New Roman"
+    normalfont.height = 8 * 20
+    normalstyle.font = normalfont
+    normalstyle.borders = borders4
+
+    vpolesheet = wb.add_sheet("Verified Poles")
+    row = vpolesheet.row(0)
+    for index, coltext in enumerate(cols):
+        vpolesheet.col(index).width = (coltext[1] * 256)
+        row.write(index,coltext[0],style=boldstyle)
+    polenum = 1
+
+    for n in verifiedpoles_list:
+        row = vpolesheet.row(polenum)
+        writetext_list = poletable.writetext(n)
+        for index, textitem in enumerate(writetext_list):
+            row.write(index, textitem,style=normalstyle)
+        polenum = polenum + 1
+
+    vpolesheet.set_panes_frozen(True)
+    vpolesheet.set_horz_split_pos(1) 
+
+    kpolesheet = wb.add_sheet("Key Poles")
+    row = kpolesheet.row(0)
+    for index, coltext in enumerate(cols):
+        kpolesheet.col(index).width = (coltext[1] * 256)
+        row.write(index,coltext[0],style=boldstyle)
+    polenum = 1
+    for n in keypoles_list:
+        row = kpolesheet.row(polenum)
+        writetext_list = poletable.writetext(n)
+        for index, textitem in enumerate(writetext_list):
+            row.write(index, textitem,style=normalstyle)     
+        polenum = polenum + 1
+
+    kpolesheet.set_panes_frozen(True)
+    kpolesheet.set_horz_split_pos(1)
+
+    apolesheet = wb.add_sheet("All Poles")
+    row = apolesheet.row(0)
+    for index, coltext in enumerate(cols):
+        apolesheet.col(index).width = (coltext[1] * 256)
+        row.write(index,coltext[0],style=boldstyle)
+
+    polenum = 1
+    for n in range(len(poletable)):
+        row = apolesheet.row(polenum)
+        writetext_list = poletable.writetext(n)
+        cellcolor = cellcolordict[poletable.poletype[n]]
+        colorstyle = xlwt.XFStyle()
+        colorpattern = xlwt.Pattern()
+        colorpattern.pattern = xlwt.Pattern.SOLID_PATTERN
+        colorpattern.pattern_fore_colour = xlwt.Style.colour_map[cellcolor]
+        colorstyle.pattern = colorpattern
+        colorstyle.borders = borders4
+        #colorstyle.font = normalfont
+        for index, textitem in enumerate(writetext_list):
+            row.write(index, textitem,style=colorstyle)     
+        polenum = polenum + 1
+
+    apolesheet.set_panes_frozen(True)
+    apolesheet.set_horz_split_pos(1)
+
+    saveexcelpath_name = data_chartfolderpath + "\\" + finalpolesexcelfilename
+    wb.save(saveexcelpath_name)
+    print("Saving Excel File with Verified/Key Poles %s." % finalpolesexcelfilename)
+
+    periodsignatures = {}
+    chartjobs = []
+    circlecache = CircleCache(circlecachesize, filepath + "\\" + circlecachename)
+    robinsonbase = RobinsonBase(filepath + "\\" + basemapcachename)
+    dotimeperiod(verifiedpoles_list,keypoles_list,"Eoarchean",4000,3600,True,False)
+    dotimeperiod(verifiedpoles_list,keypoles_list,"Paleoarchean",3600,3200,True,False)
+    dotimeperiod(verifiedpoles_list,keypoles_list,"Mesoarchean",3200,2800,True,False)
+    dotimeperiod(verifiedpoles_list,keypoles_list,"Neoarchean",2800,2500,True,False)
+
+    dotimeperiod(verifiedpoles_list,keypoles_list,"Early Paleoproterozoic",2500,2050,True,False)
+    dotimeperiod(verifiedpoles_list,keypoles_list,"Late Paleoproterozoic",2050,1600,True,False)
+    dotimeperiod(verifiedpoles_list,keypoles_list,"Mesoproterozoic",1600,1000,True,False)
+    dotimeperiod(verifiedpoles_list,keypoles_list,"Neoproterozoic",1000,541,True,False)
+
+    ##dotimeperiod(verifiedpoles_list,keypoles_list,"Paleozoic",541,252,True,False)
+    ##dotimeperiod(verifiedpoles_list,keypoles_list,"Mesozoic",252,66,True,False)
+    ##dotimeperiod(verifiedpoles_list,keypoles_list,"Cenozoic",66,0,True,False)
+    dotimeperiod(verifiedpoles_list,keypoles_list,"Phanerozoic",541,0,True,False)
+
+    dotimeperiod(verifiedpoles_list,keypoles_list,"All",4000,0,False,True)
+
+    print("\n----------------------------\nDrawing %s charts." % len(chartjobs))
+    renderchartjobs(chartjobs, args.processes)
+    circlecache.save()
+    robinsonbase.save()
+
+    saveevaluationstate(filepath + "\\" + evaluationstatename, currentevaluationstate(poletable, verifiedpoles_list, keypoles_list, canverify, periodsignatures))
+
+    endchoice = raw_input('\n' + "----- Program complete. Goodbye! Please press enter to exit. -----")
+    sys.exit()
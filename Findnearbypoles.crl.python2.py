@@ -19,13 +19,362 @@
 import sys
 import os
 import math
+import csv
+import argparse
+import gzip
+import json
+import time
+import urlparse
+import BaseHTTPServer
 from shutil import copy
+from xml.sax.saxutils import escape
+import numpy as np
+from workbookreader import readsheetsnapshot, rowcount, nearbypoledata
+
+excelfilename = "Prior Work--Quickbook.xlsx"
+defaultport = 8642   # port of the pole lookup service (see --serve)
+
+####################### GPML FILES #######################
+
+gpmlheader = ("<?xml version=\"1.0\" encoding=\"UTF-8\"?>"
+              '\n' + "<gpml:FeatureCollection xmlns:gpml=\"http://www.gplates.org/gplates\" xmlns:gml=\"http://www.opengis.net/gml\" xmlns:xsi=\"http://www.w3.org/XMLSchema-instance\" gpml:version=\"1.6.0336\" xsi:schemaLocation=\"http://www.gplates.org/gplates ../xsd/gpml.xsd http://www.opengis.net/gml ../../../gml/current/base\">")
+
+gpmlfeature = ('\n' + "    <gml:featureMember>"
+               '\n' + "        <gpml:VirtualGeomagneticPole>"
+               '\n' + "            <gpml:identity>%(plateid)s</gpml:identity>"
+               '\n' + "            <gpml:revision>%(platerevision)s</gpml:revision>"
+               '\n' + "                        <gml:name>%(layername)s</gml:name>"
+               '\n' + "            <gpml:polePosition>"
+               '\n' + "                <gpml:ConstantValue>"
+               '\n' + "                    <gpml:value>"
+               '\n' + "                        <gml:Point>"
+               '\n' + "                            <gml:pos>%(polelat)s %(polelon)s</gml:pos>"
+               '\n' + "                        </gml:Point>"
+               '\n' + "                    </gpml:value>"
+               '\n' + "                    <gml:description></gml:description>"
+               '\n' + "                    <gpml:valueType xmlns:gml=\"http://www.opengis.net/gml\">gml:Point</gpml:valueType>"
+               '\n' + "                </gpml:ConstantValue>"
+               '\n' + "            </gpml:polePosition>"
+               '\n' + "            <gpml:reconstructionPlateId>"
+               '\n' + "                <gpml:ConstantValue>"
+               '\n' + "                    <gpml:value>0</gpml:value>"
+               '\n' + "                    <gml:description></gml:description>"
+               '\n' + "                    <gpml:valueType xmlns:gpml=\"http://www.gplates.org/gplates\">gpml:plateId</gpml:valueType>"
+               '\n' + "                </gpml:ConstantValue>"
+               '\n' + "            </gpml:reconstructionPlateId>"
+               '\n' + "            <gpml:averageAge>0</gpml:averageAge>"
+               '\n' + "            <gpml:poleA95>%(polea95)s</gpml:poleA95>"
+               '\n' + "        </gpml:VirtualGeomagneticPole>"
+               '\n' + "    </gml:featureMember>")
+
+gpmlfooter = '\n' + "</gpml:FeatureCollection>"
+
+class GpmlWriter:
+    """
+    Writes a GPML FeatureCollection of virtual geomagnetic poles to filename, gzip-compressed if compress is True
+    (as GPlates reads .gpmlz files). The text of the features is collected in memory and written to the file in
+    pieces of about buffersize characters, rather than line by line.
+    """
+    def __init__(self, filename, compress=False, buffersize=2**16):
+        if compress:
+            self.file = gzip.open(filename, 'wb')
+        else:
+            self.file = open(filename, 'wb')
+        self.buffersize = buffersize
+        self.buffer = [gpmlheader]
+        self.bufferlength = len(gpmlheader)
+        self.featurecount = 0
+
+    def addpole(self, plateid, platerevision, layername, polelat, polelon, polea95):
+        text = gpmlfeature % {"plateid":escape(unicode(plateid)), "platerevision":escape(unicode(platerevision)), "layername":escape(unicode(layername)),
+                              "polelat":polelat, "polelon":polelon, "polea95":polea95}
+        self.buffer.append(text)
+        self.bufferlength += len(text)
+        self.featurecount += 1
+        if self.bufferlength >= self.buffersize:
+            self.flush()
+
+    def flush(self):
+        self.file.write(u"".join(self.buffer).encode('utf8'))
+        self.buffer = []
+        self.bufferlength = 0
+
+    def close(self):
+        self.buffer.append(gpmlfooter)
+        self.flush()
+        self.file.close()
+
+####################### BATCH QUERIES #######################
+
+class QueryException(Exception):  # Raised in batch mode when the query pole file cannot be used.
+    def __init__(self, value):
+        self.value = value
+    def __str__(self):
+        return repr(self.value)
+
+def readquerypoles(queryfilename):
+    """
+    Reads the query poles of a batch from a CSV file with the columns name, latitude and longitude (e.g. the VGPs
+    of a new study). Returns a list of (name, latitude, longitude).
+    """
+    querypoles = []
+    with open(queryfilename,'rb') as f:
+        for rownum, row in enumerate(csv.DictReader(f)):
+            row = dict([((key or "").strip().lower(), (value or "").strip()) for key, value in row.items()])
+            try:
+                querylat = float(row.get("latitude", ""))
+                querylon = float(row.get("longitude", ""))
+            except ValueError:
+                raise QueryException("Query error: row %s of %s needs a latitude and longitude that are numbers." % (rownum + 2, queryfilename))
+            if not(abs(querylat) <= 90) or not(abs(querylon) <= 360):
+                raise QueryException("Query error: the pole in row %s of %s must have a latitude between -90 and 90 and a longitude between -360 and 360." % (rownum + 2, queryfilename))
+            querypoles.append((row.get("name") or "Pole %s" % (rownum + 1), querylat, querylon))
+    if querypoles == []:
+        raise QueryException("Query error: %s has no query poles." % queryfilename)
+    return(querypoles)
+
+def unitvectors(lats, lons):  # Returns the positions given by lists of latitudes and longitudes as an array of unit vectors, one row each.
+    lats = np.radians(np.array(lats, dtype=float))
+    lons = np.radians(np.array(lons, dtype=float))
+    return(np.column_stack((np.cos(lats) * np.cos(lons), np.cos(lats) * np.sin(lons), np.sin(lats))))
+
+def findnearbypolesbatch(querypoles, poledata, radius, nearest, polevectors=None, antipolevectors=None):
+    """
+    Finds, for every query pole, the poles within radius degrees (if radius is not None) and the nearest poles (if
+    nearest is not None), comparing each query pole with both the pole and the antipole of every pole in poledata.
+    The unit vectors of the poles and antipoles can be given if they are already known (see PoleIndex).
+    Returns one list per query pole of (rank, distance, polenum, isantipole, withinradius), nearest first.
+    """
+    queryvectors = unitvectors([querypole[1] for querypole in querypoles], [querypole[2] for querypole in querypoles])
+    if polevectors is None:
+        polevectors = unitvectors(poledata["polelat"], poledata["polelon"])
+    if antipolevectors is None:
+        antipolevectors = unitvectors(poledata["antipolelat"], poledata["antipolelon"])
+    polecount = rowcount(poledata)
+    blocksize = max(1, 2**20 // max(polecount, 1))   # query poles compared at once, to keep the distance arrays small
+    matches_list = []
+    for blockstart in range(0, len(querypoles), blocksize):
+        blockend = blockstart + blocksize
+        poledots = np.dot(queryvectors[blockstart:blockend], polevectors.T)
+        antipoledots = np.dot(queryvectors[blockstart:blockend], antipolevectors.T)
+        isantipoles = (antipoledots > poledots)
+        axialdists = np.degrees(np.arccos(np.clip(np.maximum(poledots, antipoledots), -1, 1)))   # distance to whichever of the pole and antipole is closer
+        for querydists, queryisantipoles in zip(axialdists, isantipoles):
+            matchcount = 0   # the poles within the radius and the nearest poles are both the first poles in order of distance
+            if radius != None:
+                matchcount = np.count_nonzero(querydists <= radius)
+            if nearest != None:
+                matchcount = max(matchcount, min(nearest, polecount))
+            if matchcount == 0:
+                matches_list.append([])
+                continue
+            lastdist = np.partition(querydists, matchcount - 1)[matchcount - 1]
+            candidates = np.flatnonzero(querydists <= lastdist)
+            order = candidates[np.lexsort((candidates, querydists[candidates]))][:matchcount]   # poles at the same distance stay in workbook order
+            matches_list.append([(rank + 1, querydists[polenum], polenum, queryisantipoles[polenum], (radius != None) and (querydists[polenum] <= radius))
+                                 for rank, polenum in enumerate(order.tolist())])
+    return(matches_list)
+
+def polename(poledata, polenum, isantipole):  # Returns the name of a pole as used for its .gpml file.
+    antipoletext = "[ANTI-POLE]" if isantipole else ""
+    if poledata["component"][polenum]:
+        return("%s.%s %s[%s][%s]" % (poledata["age"][polenum], poledata["unit"][polenum], antipoletext, poledata["component"][polenum], poledata["ref"][polenum]))
+    return("%s.%s %s[%s]" % (poledata["age"][polenum], poledata["unit"][polenum], antipoletext, poledata["ref"][polenum]))
+
+def matchedpole(poledata, polenum, isantipole):
+    """
+    Returns the latitude, longitude and A95 of a matched pole (or of its antipole), using dm or dp as the A95 of
+    poles that only have those, as in the interactive search.
+    """
+    if isantipole:
+        polelat, polelon = poledata["antipolelat"][polenum], poledata["antipolelon"][polenum]
+    else:
+        polelat, polelon = poledata["polelat"][polenum], poledata["polelon"][polenum]
+    polea95 = poledata["polea95"][polenum]
+    if polea95 == '':
+        if poledata["poledm"][polenum] != '':
+            polea95 = poledata["poledm"][polenum]
+        elif poledata["poledp"][polenum] != '':
+            polea95 = poledata["poledp"][polenum]
+        else:
+            polea95 = 0
+    return(polelat, polelon, polea95)
+
+def runbatch(queryfilename, radius, nearest, outputfilename):
+    """
+    Finds the nearby poles of every query pole in queryfilename, prints them, and saves them to outputfilename
+    (a CSV file with one row per match) if it is given.
+    """
+    querypoles = readquerypoles(queryfilename)
+    poledata = readsheetsnapshot(excelfilename, "Poledata", nearbypoledata)
+    print('\n' + "Comparing %s query poles with %s poles in %s." % (len(querypoles), rowcount(poledata), excelfilename))
+    matches_list = findnearbypolesbatch(querypoles, poledata, radius, nearest)
+
+    rows = []
+    for (queryname, querylat, querylon), matches in zip(querypoles, matches_list):
+        print('\n' + "%s (Lat %s, Lon %s): %s poles found" % (queryname, querylat, querylon, len(matches)))
+        for rank, dist, polenum, isantipole, withinradius in matches:
+            polelat, polelon, polea95 = matchedpole(poledata, polenum, isantipole)
+            name = polename(poledata, polenum, isantipole)
+            print("   %s. %s" % (rank, name))
+            print("      Pole Dist = %.2f degrees (Pole Lat = %s, Pole Lon = %s, A95 = %s)" % (dist, polelat, polelon, polea95))
+            rows.append([queryname, querylat, querylon, rank, "%.2f" % dist, "yes" if withinradius else "no", name, polelat, polelon, polea95])
+
+    if outputfilename:
+        with open(outputfilename,'wb') as f:
+            writer = csv.writer(f)
+            writer.writerow(["query","querylatitude","querylongitude","rank","distance","withinradius","pole","latitude","longitude","a95"])
+            for row in rows:
+                writer.writerow([value.encode('utf8') if isinstance(value, unicode) else value for value in row])
+        print('\n' + "Saved %s nearby poles to %s." % (len(rows), outputfilename))
+
+####################### LOOKUP SERVICE #######################
+
+class PoleIndex:
+    """
+    The poles of a workbook kept in memory with the unit vectors of every pole and antipole, so that a lookup only
+    has to compare the query pole with them. refresh() reads the poles again when the workbook has changed.
+    """
+    def __init__(self, excelfilename):
+        self.excelfilename = excelfilename
+        self.stamp = None
+        self.poledata = None
+        self.refresh()
+
+    def refresh(self):
+        """ Reads the poles again if the size or modification time of the workbook has changed. Returns True if they were read. """
+        filestat = os.stat(self.excelfilename)
+        stamp = (filestat.st_size, filestat.st_mtime)
+        if stamp == self.stamp:
+            return(False)
+        poledata = readsheetsnapshot(self.excelfilename, "Poledata", nearbypoledata)
+        self.polevectors = unitvectors(poledata["polelat"], poledata["polelon"])
+        self.antipolevectors = unitvectors(poledata["antipolelat"], poledata["antipolelon"])
+        self.poledata = poledata
+        self.stamp = stamp
+        return(True)
+
+    def find(self, querylat, querylon, radius, nearest):
+        """ Returns the matches of one query pole, as findnearbypolesbatch() does. """
+        return(findnearbypolesbatch([("", querylat, querylon)], self.poledata, radius, nearest, self.polevectors, self.antipolevectors)[0])
+
+class LookupHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Answers GET /nearby?lat=LAT&lon=LON&radius=DEGREES&nearest=K (radius, nearest or both) with the nearby poles
+    as JSON, nearest first. The pole index is shared through the server (self.server.poleindex).
+    """
+    def do_GET(self):
+        url = urlparse.urlparse(self.path)
+        if url.path != "/nearby":
+            self.sendjson(404, {"error": "Unknown path %s; use /nearby?lat=LAT&lon=LON&radius=DEGREES&nearest=K" % url.path})
+            return
+        query = dict([(key, values[-1]) for key, values in urlparse.parse_qs(url.query).items()])
+        try:
+            querylat = float(query["lat"])
+            querylon = float(query["lon"])
+            radius = float(query["radius"]) if "radius" in query else None
+            nearest = int(query["nearest"]) if "nearest" in query else None
+        except (KeyError, ValueError):
+            self.sendjson(400, {"error": "lat and lon are needed, and lat, lon, radius and nearest must be numbers."})
+            return
+        if not(abs(querylat) <= 90) or not(abs(querylon) <= 360):
+            self.sendjson(400, {"error": "lat must be between -90 and 90 and lon between -360 and 360."})
+            return
+        if (radius == None) and (nearest == None):
+            self.sendjson(400, {"error": "radius, nearest or both are needed."})
+            return
+        if ((radius != None) and not(0 <= radius <= 360)) or ((nearest != None) and (nearest < 1)):
+            self.sendjson(400, {"error": "radius must be between 0 and 360, and nearest at least 1."})
+            return
+
+        poleindex = self.server.poleindex
+        try:
+            if poleindex.refresh():
+                print("Read %s poles from %s, which has changed." % (rowcount(poleindex.poledata), poleindex.excelfilename))
+        except Exception as e:   # e.g. the workbook is being saved; keep answering from the poles already read
+            print("Could not read %s again (%s); using the poles read before." % (poleindex.excelfilename, e))
+        starttime = time.time()
+        matches = poleindex.find(querylat, querylon, radius, nearest)
+        lookuptime = time.time() - starttime
+
+        poledata = poleindex.poledata
+        results = []
+        for rank, dist, polenum, isantipole, withinradius in matches:
+            polelat, polelon, polea95 = matchedpole(poledata, polenum, isantipole)
+            results.append({"rank": rank, "distance": round(float(dist), 2), "withinradius": bool(withinradius), "pole": polename(poledata, polenum, isantipole),
+                            "latitude": polelat, "longitude": polelon, "a95": polea95, "antipole": bool(isantipole)})
+        self.sendjson(200, {"workbook": poleindex.excelfilename, "polecount": rowcount(poledata), "lookupms": round(lookuptime * 1000, 3), "matches": results})
+
+    def sendjson(self, status, content):
+        body = json.dumps(content)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):   # queries are not logged, to keep the window readable
+        pass
+
+def runservice(port):
+    """ Keeps the poles of the workbook in memory and answers lookups on http://127.0.0.1:port until stopped with Ctrl+C """
+    server = BaseHTTPServer.HTTPServer(("127.0.0.1", port), LookupHandler)
+    server.poleindex = PoleIndex(excelfilename)
+    print('\n' + "Read %s poles from %s." % (rowcount(server.poleindex.poledata), excelfilename))
+    print("Answering lookups on http://127.0.0.1:%s/nearby?lat=LAT&lon=LON&radius=DEGREES&nearest=K (press Ctrl+C to stop)." % port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print('\n' + "Lookup service stopped.")
+    server.server_close()
+
+###################################################################
+
+parser = argparse.ArgumentParser(description="Finds the poles in %s that are near a pole you enter." % excelfilename)
+parser.add_argument("--batch", metavar="FILE", help="find the nearby poles of every pole in FILE, a CSV file with the columns name, latitude and longitude, without prompting")
+parser.add_argument("--radius", metavar="DEGREES", type=float, default=None, help="with --batch, find the poles within this angular distance of each query pole")
+parser.add_argument("--nearest", metavar="K", type=int, default=None, help="with --batch, find the K nearest poles to each query pole")
+parser.add_argument("--output", metavar="FILE", help="with --batch, also save the nearby poles to this CSV file")
+parser.add_argument("--gpml", choices=["separate","single","gpmlz"], default="separate", help="how nearby poles are saved when you choose to write .gpml files: one file per pole (default), one .gpml file with all of them, or one compressed .gpmlz file with all of them")
+parser.add_argument("--serve", action="store_true", help="keep the poles in memory and answer lookups over HTTP on this computer only, reading the workbook again whenever it changes")
+parser.add_argument("--port", type=int, default=defaultport, help="with --serve, the port to answer lookups on (default %s)" % defaultport)
+args = parser.parse_args()
+
+if args.serve:
+    if args.batch:
+        parser.error("--serve and --batch cannot be used together")
+    if not(os.path.isfile(excelfilename)):
+        print('\n' + "This folder does NOT contain the file named %s, which is necessary for this program to run." % excelfilename)
+        sys.exit(1)
+    runservice(args.port)
+    sys.exit()
+
+if args.batch:
+    if (args.radius == None) and (args.nearest == None):
+        parser.error("--batch needs --radius, --nearest or both")
+    if (args.radius != None) and not(0 <= args.radius <= 360):
+        parser.error("--radius must be between (or equal to) 0 and 360")
+    if (args.nearest != None) and (args.nearest < 1):
+        parser.error("--nearest must be at least 1")
+    if not(os.path.isfile(excelfilename)):
+        print('\n' + "This folder does NOT contain the file named %s, which is necessary for this program to run." % excelfilename)
+        sys.exit(1)
+    try:
+        runbatch(args.batch, args.radius, args.nearest, args.output)
+    except QueryException as e:
+        print('\n' + e.value)
+        sys.exit(1)
+    except IOError as e:
+        print('\n' + "Query error: %s" % e)
+        sys.exit(1)
+    sys.exit()
+elif (args.radius != None) or (args.nearest != None) or args.output:
+    parser.error("--radius, --nearest and --output need --batch")
 
 os.system('mode con: cols=150 lines=60')
 
 print('\n' + "Hello. This script is ready to search your Excel spreadsheet for poles near the pole you specify, within an angular distance you specify.")
 
-excelfilename = "Prior Work--Quickbook.xlsx"
 yes = set(['yes','y','ye'])
 no = set(['no','n'])
 badchars = "\/:*?\"<>|"
@@ -170,216 +519,97 @@ if writefiles:
     copy(nicecontinentsorigpath,nicecontinentsdestpath)
     print('\n' + "Copied file %s into directory %s." % (nicecontinentsfile,nearbypolepoledirpath))
 
-from xlrd import open_workbook
-wb = open_workbook(excelfilename)
 nearbypolefound = False
 
-print ('\n' + "----------------------------")
+collectionwriter = None
+if writefiles and (args.gpml != "separate"):   # all nearby poles go into one FeatureCollection
+    collectionfilename = os.path.join(nearbypolepoledirpath, nearbypoledir + (".gpmlz" if args.gpml == "gpmlz" else ".gpml"))
+    collectionwriter = GpmlWriter(collectionfilename, compress=(args.gpml == "gpmlz"))
+
+def savenearbypole(gpmlfilename, plateid, platerevision, layername, polelat, polelon, polea95):
+    """ Adds a nearby pole to the FeatureCollection of all nearby poles, or writes it to its own .gpml file """
+    if collectionwriter:
+        collectionwriter.addpole(plateid, platerevision, layername, polelat, polelon, polea95)
+        return
+    print ("   Writing file: %s" % gpmlfilename)
+    gpmlwriter = GpmlWriter(os.path.join(nearbypolepoledirpath, gpmlfilename))
+    gpmlwriter.addpole(plateid, platerevision, layername, polelat, polelon, polea95)
+    gpmlwriter.close()
 
-for sheet in wb.sheets():   
+print ('\n' + "----------------------------")
 
-    if sheet.name == "Poledata":
-        number_of_rows = sheet.nrows
-        number_of_columns = sheet.ncols
-        rows = []
-        if poleangdist == 1:
-            print ('\n' + "The following poles are within %s degree of your entered pole (Lat %s, Lon %s):" % (poleangdist, primary_poleLat, primary_poleLon))
+poledata = readsheetsnapshot(excelfilename, "Poledata", nearbypoledata)   # from the workbook's snapshot if it has not changed since the last run
+if poleangdist == 1:
+    print ('\n' + "The following poles are within %s degree of your entered pole (Lat %s, Lon %s):" % (poleangdist, primary_poleLat, primary_poleLon))
+else:
+    print ('\n' + "The following poles are within %s degrees of your entered pole (Lat %s, Lon %s):" % (poleangdist, primary_poleLat, primary_poleLon))
+
+for row in range(rowcount(poledata)):
+    polelat = poledata["polelat"][row]
+    polelon = poledata["polelon"][row]
+    antipolelat = poledata["antipolelat"][row]
+    antipolelon = poledata["antipolelon"][row]
+    polea95 = poledata["polea95"][row]
+    poledp = poledata["poledp"][row]
+    poledm = poledata["poledm"][row]
+    plateid = poledata["plateid"][row]
+    platerevision = poledata["platerevision"][row]
+
+    if polea95 == '':
+        if poledm != '':
+            polea95 = poledm
+        elif poledp != '':
+            polea95 = poledp
         else:
-            print ('\n' + "The following poles are within %s degrees of your entered pole (Lat %s, Lon %s):" % (poleangdist, primary_poleLat, primary_poleLon))
-    #    print number_of_rows
-    #    print number_of_columns
-
-        for row in range(1, number_of_rows):
-            rowitems = []
-            values = []
-    #        print ("row = %s" % row)
-            
-            for col in range(number_of_columns):
-                value  = (sheet.cell(row,col).value)
-                rowitems.append(value)
-    #            print ("col = %s" % col)
-
-            unit = rowitems[0]
-            component = rowitems[1]
-            code = rowitems[2]
-            polelat = rowitems[3]
-            polelon = rowitems[4]
-            antipolelat = rowitems[5]
-            antipolelon = rowitems[6]
-            polea95 = rowitems[7]
-            polek = rowitems[8]
-            poledp = rowitems[9]
-            poledm = rowitems[10]
-            paleolat = rowitems[11]
-            dec = rowitems[12]
-            inc = rowitems[13]
-            directiona95 = rowitems[14]
-            directionk = rowitems[15]
-            age = rowitems[16]
-            agemod = rowitems[17]
-            vandervooQ = rowitems[18]
-            ref = rowitems[19]
-            plateid = rowitems[27]
-            platerevision = rowitems[28]
-
-            if polea95 == '':
-                if poledm != '':
-                    polea95 = poledm
-                elif poledp != '':
-                    polea95 = poledp
-                else:
-                    polea95 = 0
+            polea95 = 0
+
+    if polelon < 0:
+        polelon = polelon + 360
+
+    if (abs(primary_poleLon - polelon) % 360) > 180:
+        deltalon = 360 - (abs(primary_poleLon - polelon) % 360)
+    else:
+        deltalon = abs(primary_poleLon - polelon) % 360
                 
-     #       print ("unit = %s" % unit)
-     #       print ("component = %s" % component)
-     #       print ("code = %s" % code)
-     #       print ("polelat = %s" % polelat)
-     #       print ("polelon = %s" % polelon)
-     #       print ("polea95 = %s" % polea95)
-     #       print ("polek = %s" % polek)
-     #       print ("poledp = %s" % poledp)
-     #       print ("poledm = %s" % poledm)
-     #       print ("paleolat = %s" % paleolat)
-     #       print ("dec = %s" % dec)
-     #       print ("inc = %s" % inc)
-     #       print ("directiona95 = %s" % directiona95)
-     #       print ("directionk = %s" % directionk)
-     #       print ("age = %s" % age)
-     #       print ("agemod = %s" % agemod)
-     #       print ("ref = %s" % ref)
-
-            age_int = int(round(age))
-            age_str = str(age_int)
-
-            polelon = float(polelon)
-            polelat = float(polelat)
-            
-            if polelon < 0:
-                polelon = polelon + 360
-
-            if (abs(primary_poleLon - polelon) % 360) > 180:
-                deltalon = 360 - (abs(primary_poleLon - polelon) % 360)
-            else:
-                deltalon = abs(primary_poleLon - polelon) % 360
-                        
-            poledist = math.degrees(math.acos((math.sin(rad_primary_poleLat) * math.sin(math.radians(polelat))) + (math.cos(rad_primary_poleLat) * math.cos(math.radians(polelat)) * math.cos(math.radians(deltalon)))))
-
-            if poledist <= poleangdist:
-                nearbypolefound = True
-                if component:
-                    outputgpmlfilename = ("%s.%s [%s][%s].gpml" % (age_str, unit, component, ref))
-                    layername = ("%s.%s [%s][%s]" % (age_str, unit, component, ref))
-                else:
-                    outputgpmlfilename = ("%s.%s [%s].gpml" % (age_str, unit, ref))
-                    layername = ("%s.%s [%s]" % (age_str, unit, ref))
-                outputgpmlfilename = outputgpmlfilename.replace("\\", "-")
-                outputgpmlfilename = outputgpmlfilename.replace("/", "-")               
-                print '\n' + outputgpmlfilename
-                print ("   Pole Dist = %.2f degrees (Pole Lat = %s, Pole Lon = %s, A95 = %s)" % (poledist, polelat, polelon, polea95))
-
-                if writefiles:
-                    print ("   Writing file: %s" % outputgpmlfilename)
-                    if os.path.isfile(os.path.join(nearbypolepoledirpath, outputgpmlfilename)):
-                        os.remove(os.path.join(nearbypolepoledirpath, outputgpmlfilename))
-
-                    sampleFile = open(os.path.join(nearbypolepoledirpath, outputgpmlfilename), 'a')
-
-                    sampleFile.write("<?xml version=\"1.0\" encoding=\"UTF-8\"?>")
-                    sampleFile.write('\n' + "<gpml:FeatureCollection xmlns:gpml=\"http://www.gplates.org/gplates\" xmlns:gml=\"http://www.opengis.net/gml\" xmlns:xsi=\"http://www.w3.org/XMLSchema-instance\" gpml:version=\"1.6.0336\" xsi:schemaLocation=\"http://www.gplates.org/gplates ../xsd/gpml.xsd http://www.opengis.net/gml ../../../gml/current/base\">")
-                    sampleFile.write('\n' + "    <gml:featureMember>")
-                    sampleFile.write('\n' + "        <gpml:VirtualGeomagneticPole>")
-                    sampleFile.write('\n' + "            <gpml:identity>%s</gpml:identity>" % plateid)
-                    sampleFile.write('\n' + "            <gpml:revision>%s</gpml:revision>" % platerevision)
-                    sampleFile.write('\n' + "                        <gml:name>%s</gml:name>" % layername) 
-                    sampleFile.write('\n' + "            <gpml:polePosition>")
-                    sampleFile.write('\n' + "                <gpml:ConstantValue>")
-                    sampleFile.write('\n' + "                    <gpml:value>")
-                    sampleFile.write('\n' + "                        <gml:Point>")
-                    sampleFile.write('\n' + "                            <gml:pos>%s %s</gml:pos>" % (polelat, polelon))
-                    sampleFile.write('\n' + "                        </gml:Point>")
-                    sampleFile.write('\n' + "                    </gpml:value>")
-                    sampleFile.write('\n' + "                    <gml:description></gml:description>")
-                    sampleFile.write('\n' + "                    <gpml:valueType xmlns:gml=\"http://www.opengis.net/gml\">gml:Point</gpml:valueType>")
-                    sampleFile.write('\n' + "                </gpml:ConstantValue>")
-                    sampleFile.write('\n' + "            </gpml:polePosition>")
-                    sampleFile.write('\n' + "            <gpml:reconstructionPlateId>")
-                    sampleFile.write('\n' + "                <gpml:ConstantValue>")
-                    sampleFile.write('\n' + "                    <gpml:value>0</gpml:value>")
-                    sampleFile.write('\n' + "                    <gml:description></gml:description>")
-                    sampleFile.write('\n' + "                    <gpml:valueType xmlns:gpml=\"http://www.gplates.org/gplates\">gpml:plateId</gpml:valueType>")
-                    sampleFile.write('\n' + "                </gpml:ConstantValue>")
-                    sampleFile.write('\n' + "            </gpml:reconstructionPlateId>")
-                    sampleFile.write('\n' + "            <gpml:averageAge>0</gpml:averageAge>")
-                    sampleFile.write('\n' + "            <gpml:poleA95>%s</gpml:poleA95>" % polea95)
-                    sampleFile.write('\n' + "        </gpml:VirtualGeomagneticPole>")
-                    sampleFile.write('\n' + "    </gml:featureMember>")
-                    sampleFile.write('\n' + "</gpml:FeatureCollection>")
-
-                    sampleFile.close()
-
-            if antipolelon < 0:
-                antipolelon  = antipolelon + 360
-
-            if (abs(primary_poleLon - antipolelon) % 360) > 180:
-                antideltalon = 360 - (abs(primary_poleLon - antipolelon) % 360)
-            else:
-                antideltalon = abs(primary_poleLon - antipolelon) % 360
-
-            antipoledist = math.degrees(math.acos((math.sin(rad_primary_poleLat) * math.sin(math.radians(antipolelat))) + (math.cos(rad_primary_poleLat) * math.cos(math.radians(antipolelat)) * math.cos(math.radians(antideltalon)))))
-
-            if antipoledist <= poleangdist:
-                nearbypolefound = True
-                if component:
-                    antipolegpmlfilename = ("%s.%s [ANTI-POLE][%s][%s].gpml" % (age_str, unit, component, ref))
-                    antipolelayername = ("%s.%s [ANTI-POLE][%s][%s]" % (age_str, unit, component, ref))
-                else:
-                    antipolegpmlfilename = ("%s.%s [ANTI-POLE][%s].gpml" % (age_str, unit, ref))
-                    antipolelayername = ("%s.%s [ANTI-POLE][%s]" % (age_str, unit, ref))
-
-                antipolegpmlfilename = antipolegpmlfilename.replace("\\", "-")
-                antipolegpmlfilename = antipolegpmlfilename.replace("/", "-")
-                print '\n' + antipolegpmlfilename
-                print ("   Pole Dist = %.2f degrees (Pole Lat = %s, Pole Lon = %s, A95 = %s)" % (antipoledist, antipolelat, antipolelon, polea95))
-
-                if writefiles:
-                    print ("   Writing file: %s" % antipolegpmlfilename)
-                    if os.path.isfile(os.path.join(nearbypolepoledirpath, antipolegpmlfilename)):
-                        os.remove(os.path.join(nearbypolepoledirpath, antipolegpmlfilename))
-
-                    sampleFile = open(os.path.join(nearbypolepoledirpath, antipolegpmlfilename), 'a')
-
-                    sampleFile.write("<?xml version=\"1.0\" encoding=\"UTF-8\"?>")
-                    sampleFile.write('\n' + "<gpml:FeatureCollection xmlns:gpml=\"http://www.gplates.org/gplates\" xmlns:gml=\"http://www.opengis.net/gml\" xmlns:xsi=\"http://www.w3.org/XMLSchema-instance\" gpml:version=\"1.6.0336\" xsi:schemaLocation=\"http://www.gplates.org/gplates ../xsd/gpml.xsd http://www.opengis.net/gml ../../../gml/current/base\">")
-                    sampleFile.write('\n' + "    <gml:featureMember>")
-                    sampleFile.write('\n' + "        <gpml:VirtualGeomagneticPole>")
-                    sampleFile.write('\n' + "            <gpml:identity>%s</gpml:identity>" % plateid)
-                    sampleFile.write('\n' + "            <gpml:revision>%s</gpml:revision>" % platerevision)
-                    sampleFile.write('\n' + "                        <gml:name>%s</gml:name>" % antipolelayername) 
-                    sampleFile.write('\n' + "            <gpml:polePosition>")
-                    sampleFile.write('\n' + "                <gpml:ConstantValue>")
-                    sampleFile.write('\n' + "                    <gpml:value>")
-                    sampleFile.write('\n' + "                        <gml:Point>")
-                    sampleFile.write('\n' + "                            <gml:pos>%s %s</gml:pos>" % (antipolelat, antipolelon))
-                    sampleFile.write('\n' + "                        </gml:Point>")
-                    sampleFile.write('\n' + "                    </gpml:value>")
-                    sampleFile.write('\n' + "                    <gml:description></gml:description>")
-                    sampleFile.write('\n' + "                    <gpml:valueType xmlns:gml=\"http://www.opengis.net/gml\">gml:Point</gpml:valueType>")
-                    sampleFile.write('\n' + "                </gpml:ConstantValue>")
-                    sampleFile.write('\n' + "            </gpml:polePosition>")
-                    sampleFile.write('\n' + "            <gpml:reconstructionPlateId>")
-                    sampleFile.write('\n' + "                <gpml:ConstantValue>")
-                    sampleFile.write('\n' + "                    <gpml:value>0</gpml:value>")
-                    sampleFile.write('\n' + "                    <gml:description></gml:description>")
-                    sampleFile.write('\n' + "                    <gpml:valueType xmlns:gpml=\"http://www.gplates.org/gplates\">gpml:plateId</gpml:valueType>")
-                    sampleFile.write('\n' + "                </gpml:ConstantValue>")
-                    sampleFile.write('\n' + "            </gpml:reconstructionPlateId>")
-                    sampleFile.write('\n' + "            <gpml:averageAge>0</gpml:averageAge>")
-                    sampleFile.write('\n' + "            <gpml:poleA95>%s</gpml:poleA95>" % polea95)
-                    sampleFile.write('\n' + "        </gpml:VirtualGeomagneticPole>")
-                    sampleFile.write('\n' + "    </gml:featureMember>")
-                    sampleFile.write('\n' + "</gpml:FeatureCollection>")
-
-                    sampleFile.close()
+    poledist = math.degrees(math.acos((math.sin(rad_primary_poleLat) * math.sin(math.radians(polelat))) + (math.cos(rad_primary_poleLat) * math.cos(math.radians(polelat)) * math.cos(math.radians(deltalon)))))
+
+    if poledist <= poleangdist:
+        nearbypolefound = True
+        layername = polename(poledata, row, False)
+        outputgpmlfilename = layername + ".gpml"
+        outputgpmlfilename = outputgpmlfilename.replace("\\", "-")
+        outputgpmlfilename = outputgpmlfilename.replace("/", "-")               
+        print '\n' + outputgpmlfilename
+        print ("   Pole Dist = %.2f degrees (Pole Lat = %s, Pole Lon = %s, A95 = %s)" % (poledist, polelat, polelon, polea95))
+
+        if writefiles:
+            savenearbypole(outputgpmlfilename, plateid, platerevision, layername, polelat, polelon, polea95)
+
+    if antipolelon < 0:
+        antipolelon  = antipolelon + 360
+
+    if (abs(primary_poleLon - antipolelon) % 360) > 180:
+        antideltalon = 360 - (abs(primary_poleLon - antipolelon) % 360)
+    else:
+        antideltalon = abs(primary_poleLon - antipolelon) % 360
+
+    antipoledist = math.degrees(math.acos((math.sin(rad_primary_poleLat) * math.sin(math.radians(antipolelat))) + (math.cos(rad_primary_poleLat) * math.cos(math.radians(antipolelat)) * math.cos(math.radians(antideltalon)))))
+
+    if antipoledist <= poleangdist:
+        nearbypolefound = True
+        antipolelayername = polename(poledata, row, True)
+        antipolegpmlfilename = antipolelayername + ".gpml"
+        antipolegpmlfilename = antipolegpmlfilename.replace("\\", "-")
+        antipolegpmlfilename = antipolegpmlfilename.replace("/", "-")
+        print '\n' + antipolegpmlfilename
+        print ("   Pole Dist = %.2f degrees (Pole Lat = %s, Pole Lon = %s, A95 = %s)" % (antipoledist, antipolelat, antipolelon, polea95))
+
+        if writefiles:
+            savenearbypole(antipolegpmlfilename, plateid, platerevision, antipolelayername, antipolelat, antipolelon, polea95)
+
+if collectionwriter:
+    collectionwriter.close()
+    print ('\n' + "Saved %s nearby poles to %s." % (collectionwriter.featurecount, collectionfilename))
 
 if not nearbypolefound:
     if poleangdist == 1:
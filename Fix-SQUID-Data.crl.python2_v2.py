@@ -12,90 +12,99 @@
 ##########################################################
 
 import os
-import math
+import numpy as np
 import sys
-import re
-from shutil import copy
+from datafiles import loadbackupindex, savebackupindex, nextbackupdirname, backupfiles
+from datafiles import Measurement, splitsteptokens, measurementtuple
+from datafiles import loadsitecache, savesitecache, cachedparse, storecachedparse, readsamplefile
+from datafiles import samsitelineformat, sampleheaderformat, squidstepformat
 
 # Constants:
 fileextention = ".sam"
 yes = set(['yes','y','ye'])
 no = set(['no','n'])
-nospacesteplist = ["NRM","AF1000"]
 
 # Procedures:
 
-def rotatecoords(rotation_angle,rotation_pole_axis_lon,rotation_pole_axis_lat,dec,inc):    
-    dec_rad = math.radians(dec)
-    inc_rad = math.radians(inc)
+def rotationmatrices(rotation_angle,rotation_pole_axis_lon,rotation_pole_axis_lat):  # Builds a stack of Euler pole rotation matrices, one for each element of the (broadcast) input arrays.
+    rotation_angle_rad, rotation_pole_axis_lon_rad, rotation_pole_axis_lat_rad = np.broadcast_arrays(np.radians(rotation_angle), np.radians(rotation_pole_axis_lon), np.radians(rotation_pole_axis_lat))
 
-    north = math.cos(dec_rad)*math.cos(inc_rad)
-    east = math.sin(dec_rad)*math.cos(inc_rad)
-    down = -math.sin(inc_rad)
+    EP_x = np.cos(rotation_pole_axis_lon_rad) * np.cos(rotation_pole_axis_lat_rad) # "ep" stands for Euler Pole -- the point around which the coordinate are being rotated.
+    EP_y = np.sin(rotation_pole_axis_lon_rad) * np.cos(rotation_pole_axis_lat_rad)
+    EP_z = -np.sin(rotation_pole_axis_lat_rad)
 
-    rotation_pole_axis_lon_rad = math.radians(rotation_pole_axis_lon) # This is the Euler Pole longitude in radians -- the point around which the coordinate are being rotated.
-    rotation_pole_axis_lat_rad = math.radians(rotation_pole_axis_lat) # This is the Euler Pole latitude in radians -- the point around which the coordinate are being rotated.
+    cos_angle = np.cos(rotation_angle_rad)
+    sin_angle = np.sin(rotation_angle_rad)
+    versine = 1 - cos_angle
 
-    EP_x = math.cos(rotation_pole_axis_lon_rad) * math.cos(rotation_pole_axis_lat_rad) # "ep" stands for Euler Pole
-    EP_y = math.sin(rotation_pole_axis_lon_rad) * math.cos(rotation_pole_axis_lat_rad)
-    EP_z = -math.sin(rotation_pole_axis_lat_rad)
+    R = np.empty(rotation_angle_rad.shape + (3,3))
+    R[...,0,0] = (EP_x * EP_x * versine) + cos_angle
+    R[...,0,1] = (EP_x * EP_y * versine) - (EP_z * sin_angle)
+    R[...,0,2] = (EP_x * EP_z * versine) + (EP_y * sin_angle)
 
-    rotation_angle_rad = math.radians(rotation_angle)
+    R[...,1,0] = (EP_y * EP_x * versine) + (EP_z * sin_angle)
+    R[...,1,1] = (EP_y * EP_y * versine) + cos_angle
+    R[...,1,2] = (EP_y * EP_z * versine) - (EP_x * sin_angle)
 
-    R11 = (EP_x * EP_x * (1 - math.cos(rotation_angle_rad))) + (math.cos(rotation_angle_rad))
-    R12 = (EP_x * EP_y * (1 - math.cos(rotation_angle_rad))) - (EP_z * math.sin(rotation_angle_rad))
-    R13 = (EP_x * EP_z * (1 - math.cos(rotation_angle_rad))) + (EP_y * math.sin(rotation_angle_rad))
-    
-    R21 = (EP_y * EP_x * (1 - math.cos(rotation_angle_rad))) + (EP_z * math.sin(rotation_angle_rad))
-    R22 = (EP_y * EP_y * (1 - math.cos(rotation_angle_rad))) + (math.cos(rotation_angle_rad))
-    R23 = (EP_y * EP_z * (1 - math.cos(rotation_angle_rad))) - (EP_x * math.sin(rotation_angle_rad))
+    R[...,2,0] = (EP_z * EP_x * versine) - (EP_y * sin_angle)
+    R[...,2,1] = (EP_z * EP_y * versine) + (EP_x * sin_angle)
+    R[...,2,2] = (EP_z * EP_z * versine) + cos_angle
 
-    R31 = (EP_z * EP_x * (1 - math.cos(rotation_angle_rad))) - (EP_y * math.sin(rotation_angle_rad))
-    R32 = (EP_z * EP_y * (1 - math.cos(rotation_angle_rad))) + (EP_x * math.sin(rotation_angle_rad))
-    R33 = (EP_z * EP_z * (1 - math.cos(rotation_angle_rad))) + (math.cos(rotation_angle_rad))
+    return(R)
 
-    north_rot = (R11 * north) + (R12 * east) + (R13 * down)
-    east_rot  = (R21 * north) + (R22 * east) + (R23 * down)
-    down_rot  = (R31 * north) + (R32 * east) + (R33 * down)
+def dirstovectors(dec,inc):  # Converts directions to north, east, down unit vectors stacked along the last axis.
+    dec_rad = np.radians(dec)
+    inc_rad = np.radians(inc)
 
-    if north_rot > 0:
-        lon_rad_rot = math.atan(east_rot/north_rot)
-    else:
-        lon_rad_rot = math.pi + math.atan(east_rot/north_rot)
+    north = np.cos(dec_rad)*np.cos(inc_rad)
+    east = np.sin(dec_rad)*np.cos(inc_rad)
+    down = -np.sin(inc_rad)
 
-    lat_rad_rot = -math.atan(down_rot/(math.sqrt(north_rot**2+east_rot**2)))
+    return(np.stack([north,east,down],axis=-1))
 
-    lon_rot = math.degrees(lon_rad_rot) % 360
-    lat_rot = math.degrees(lat_rad_rot)
-    
-    newdirs = [lon_rot,lat_rot]
-    
+def vectorstodirs(vectors):  # Converts north, east, down vectors back to declinations (0-360) and inclinations.
+    north_rot = vectors[...,0]
+    east_rot = vectors[...,1]
+    down_rot = vectors[...,2]
+
+    lon_rot = np.degrees(np.arctan2(east_rot,north_rot)) % 360
+    lat_rot = -np.degrees(np.arctan2(down_rot,np.hypot(north_rot,east_rot)))
+
+    return(lon_rot,lat_rot)
+
+def rotatecoords(rotation_angle,rotation_pole_axis_lon,rotation_pole_axis_lat,dec,inc):  # Rotates any number of directions at once; every argument may be a number or an array.
+    R = rotationmatrices(rotation_angle,rotation_pole_axis_lon,rotation_pole_axis_lat)
+    vectors_rot = np.einsum('...ij,...j->...i', R, dirstovectors(dec,inc))
+    newdirs = list(vectorstodirs(vectors_rot))
     return(newdirs)
 
+def rotatesite(coreplatestrike,coreplatedip,sitestrike,sitedip,coredec,coreinc):  # Rotates core directions to geographic and tilt corrected coordinates for every step of a site in one call. All arguments are arrays with one entry per step.
+    strike_matrices = rotationmatrices((90 - coreplatestrike) % 360, 0, 90)
+    dip_matrices = rotationmatrices(-coreplatedip, coreplatestrike, 0)
+    tilt_matrices = rotationmatrices(sitedip, sitestrike, 0) # This should NOT be the negative of the sitedip...Michiel's excel file was wrong to make it negative.
+
+    geog_matrices = np.matmul(dip_matrices, strike_matrices)
+    geog_vectors = np.einsum('...ij,...j->...i', geog_matrices, dirstovectors(coredec,coreinc))
+    tilt_vectors = np.einsum('...ij,...j->...i', tilt_matrices, geog_vectors)
+
+    geogdec, geoginc = vectorstodirs(geog_vectors)
+    tiltdec, tiltinc = vectorstodirs(tilt_vectors)
+    return(geogdec,geoginc,tiltdec,tiltinc)
+
 # Program:
 
 os.system('mode con: cols=175 lines=60')
 
 scriptdir = os.path.dirname(os.path.realpath(__file__))
-backupdirnum = 0
-for root, dirs, files in os.walk(scriptdir, topdown=False):
-    for name in dirs:
-        if "Backup" in name:
-            newbackupnum_str = re.sub('[^0-9]', "", name)
-            if (newbackupnum_str != ''):
-                newbackupnum = int(newbackupnum_str)
-                if newbackupnum > backupdirnum:
-                    backupdirnum = newbackupnum
-backupdirnum = backupdirnum + 1
-backupdirnum_str = str(backupdirnum)
-backupdirname = "Backup" + backupdirnum_str
+backupindex = loadbackupindex(scriptdir, "Backup")
+backupdirname = nextbackupdirname(scriptdir, backupindex)
 
 print('\n' + "Hello. This script is ready to fix your SQUID data that was measured with a \"Z\" parameter with the wrong sign.")
 print("- It will correct the sign on your core inclination measurements and recalculate geographic and tilt-corrected directions.")
 print ('\n' + "PLEASE NOTE--This script assumes/requires that:")
 print ("  1. You have a full set of .sam and sample files from the SQUID for the entire site in one folder.")
 print ("  2. Any SQUID-derived data in sample files has a core inclination measurement with the WRONG sign.")
-print ("  3. Any NON-SQUID-derived data has \"JR6\" at the every end of the line, indicating it was measured on the spinner.")
+print ("  3. Any NON-SQUID-derived data has \"JR6\" at the every end of the line, indicating it was measured on the spinner (or \"2G\", for steps from a 2G .dat file).")
 print ("  4. Tilt correction is optional--it may or may not be present in your datafiles.")
 print ("\nWARNING: This script will OVERWRITE any datafiles in this folder. It is recommended that you back up your original datafiles before proceeding...")
 print (" - HOWEVER: This script will automatically back up your original datafiles into a backup folder, \"%s\"." % backupdirname)
@@ -173,12 +182,11 @@ else:
     import sys
     sys.exit()
 
-os.makedirs(backupdirname)
+unchangedcount = backupfiles(scriptdir, backupdirname, sampleListSorted + [samname], backupindex) # Save samples in backup folder
+savebackupindex(scriptdir, backupindex)
 print("Backup folder \"%s\" created." % backupdirname)
-backupdirpath = scriptdir + "\\" + backupdirname
-for filename in sampleListSorted:
-    copy(filename, backupdirpath) # Save samples in backup folder
-copy(samname, backupdirpath) # Save samples in backup folder
+if unchangedcount:
+    print("  (%s data files are unchanged since an earlier backup, so they were not copied again.)" % unchangedcount)
 print ("*** IMPORTANT NOTE: Original sample data files have been automatically backed up to folder \"%s\"." % backupdirname)
 print ("\n----------------------------\n")
 
@@ -206,13 +214,7 @@ if zerodec:
     for line in f:
         if counter == startlist - 1:
             lineList = line.split()
-            decline = ""
-            for lineindex, item in enumerate(lineList):
-                if lineindex != 2:
-                    decline = decline + item + " "
-                else:
-                    decline = decline + "0.0" + " "
-            decline = decline + '\n'
+            decline = samsitelineformat.format((lineList[0], lineList[1], "0.0")) + "".join([" " + item for item in lineList[3:]]) + '\n'
             newsamfile.write("%s" % decline)
         else:
             newsamfile.write("%s" % line)
@@ -223,19 +225,22 @@ if zerodec:
 
 print("\nProcessing datafiles...\n")
 
+# First pass: read every sample file and collect the core directions of all Squid steps in the site.
+sitesamples = []
+rot_coreplatestrike = []
+rot_coreplatedip = []
+rot_sitestrike = []
+rot_sitedip = []
+rot_steps = []
+cachefiles = loadsitecache(sitename) # Sample files that have not changed since they were last read or written are not parsed again.
+
 for filename in sampleListSorted:
+    firstline, secondline, cachedsteplist = cachedparse(cachefiles, filename, readsamplefile)
     tempsamplefilename = ("%s.temp" % filename)
     os.rename(filename,tempsamplefilename) # convert sample files to to tempfiles.
-    with open(tempsamplefilename) as f:
-        tempcontent = f.readlines()
+    tempcontent = [firstline, secondline] + [dataline for dataline, steptuple in cachedsteplist]
 
     lencontent = len(tempcontent)
-    newsamplefile = open (filename,'a') #Creates new sample file
-
-    if printdata:
-        print ("------------------------------\nNew Sample: " + tempcontent[0])
-
-    newsamplefile.write("%s" % tempcontent[0])
 
     paramlinetext = tempcontent[1].split()
     coreplatestrike = float(paramlinetext[1]) # core plate strike
@@ -245,24 +250,74 @@ for filename in sampleListSorted:
     coreplatestrike_corrected = (coreplatestrike + sitedec) % 360
     sitestrike_corrected = (sitestrike + sitedec) % 360
 
-    if zerodec:
-        paramlinenew = "  "
-        for lineindex, item in enumerate(paramlinetext):
-            if lineindex == 1:
-                newcoreplatestrike = ("%.1f" % coreplatestrike_corrected)
-                spacer = (6 - len(newcoreplatestrike)) * " "
-                paramlinenew = paramlinenew + spacer + newcoreplatestrike
-            elif lineindex == 3:
-                newsitestrike = ("%.1f" % sitestrike_corrected)
-                spacer = (6 - len(newsitestrike)) * " "
-                paramlinenew = paramlinenew + spacer + newsitestrike                
+    steplist = []
+    if lencontent > 1:
+        for linenum in range(2,lencontent):
+            newline = tempcontent[linenum]
+            newlineitems = newline.split()
+
+            if len(newline.strip()) != 0:
+                if not(newlineitems[-1] in ["JR6", "2G"]): # Spinner and 2G lines were measured with the right sign.
+                    step = Measurement(*cachedsteplist[linenum - 2][1])
+                    if step.coreinc != 0:
+                        step.coreinc = -step.coreinc # The minus sign here is what corrects the parameter error on SQUID measurements.
+                    else:
+                        step.coreinc = 0.0
+
+                    rot_coreplatestrike.append(coreplatestrike_corrected)
+                    rot_coreplatedip.append(coreplatedip)
+                    rot_sitestrike.append(sitestrike_corrected)
+                    rot_sitedip.append(sitedip)
+                    rot_steps.append(step)
+
+                    steplist.append(("Squid", linenum, newline, step))
+                else:
+                    steplist.append(("JR6", linenum, newline, cachedsteplist[linenum - 2][1]))
             else:
-                spacer = (6 - len(item)) * " "
-                paramlinenew = paramlinenew + spacer + item
-        paramlinenew = paramlinenew + '\n'
-        newsamplefile.write("%s" % paramlinenew)
+                steplist.append(("Empty", linenum, newline))
+
+    sitesamples.append((filename, tempsamplefilename, tempcontent, paramlinetext, coreplatestrike, coreplatedip, sitestrike, sitedip, coreplatestrike_corrected, sitestrike_corrected, steplist))
+
+# Rotate every Squid step of the site to geographic and tilt corrected coordinates in one call.
+rot_coredec = np.array([step.coredec for step in rot_steps])
+rot_coreinc = np.array([step.coreinc for step in rot_steps])
+site_geogdec, site_geoginc, site_tiltdec, site_tiltinc = rotatesite(np.array(rot_coreplatestrike), np.array(rot_coreplatedip), np.array(rot_sitestrike), np.array(rot_sitedip), rot_coredec, rot_coreinc)
+squidrows = []
+for rotindex, step in enumerate(rot_steps):
+    step.geogdec = float(site_geogdec[rotindex])
+    step.geoginc = float(site_geoginc[rotindex])
+    step.tiltdec = float(site_tiltdec[rotindex])
+    step.tiltinc = float(site_tiltinc[rotindex])
+
+    oldlineitems = step.dataline.split()
+    stepname, valueindex = splitsteptokens(oldlineitems)
+    if valueindex == 2:
+        stepname = "%s%4s" % (oldlineitems[0], oldlineitems[1])
+    intensity_str = oldlineitems[valueindex + 4]
+    error_str = oldlineitems[valueindex + 5]
+    coredec_str = oldlineitems[valueindex + 6]
+    post_string = step.dataline.split(None, valueindex + 8)[-1] # the rest of the line as it was
+    squidrows.append((stepname, step.geogdec, step.geoginc, step.tiltdec, step.tiltinc, intensity_str, error_str, coredec_str, str(step.coreinc), post_string))
+
+# Format the new Squid step lines of the site in one batch.
+for step, newline_update in zip(rot_steps, squidstepformat.formatlines(squidrows)):
+    step.dataline = newline_update
+
+# Second pass: write the new sample files.
+for filename, tempsamplefilename, tempcontent, paramlinetext, coreplatestrike, coreplatedip, sitestrike, sitedip, coreplatestrike_corrected, sitestrike_corrected, steplist in sitesamples:
+    lencontent = len(tempcontent)
+    newsamplelines = [] # written to the new sample file in one go
+
+    if printdata:
+        print ("------------------------------\nNew Sample: " + tempcontent[0])
+
+    newsamplelines.append(tempcontent[0])
+
+    if zerodec:
+        paramlinenew = sampleheaderformat.format((paramlinetext[0], coreplatestrike_corrected, coreplatedip, sitestrike_corrected, sitedip, paramlinetext[5]))
     else:
-        newsamplefile.write("%s" % tempcontent[1])
+        paramlinenew = tempcontent[1]
+    newsamplelines.append(paramlinenew)
 
     if printdata:
         print ("- Core Plate Strike = %s; site declination = %s; corrected Core Plate Strike = %s" % (coreplatestrike, sitedec, coreplatestrike_corrected))
@@ -270,101 +325,41 @@ for filename in sampleListSorted:
         print ("- Site Strike = %s; site declination = %s; corrected Site Strike = %s" % (sitestrike, sitedec, sitestrike_corrected))
         print ("- Site Dip = %s\n" % sitedip)
 
+    writtensteplist = []
     if lencontent > 1:
-        for linenum in range(2,lencontent):
-            newline = tempcontent[linenum]
-            newlineitems = newline.split()
-
-            if len(newline.strip()) != 0:
-                if newlineitems[-1] != "JR6":
-                    if newlineitems[0] in nospacesteplist:
-                        indexadd = 0
-                        stepname = newlineitems[0]
-                        stepspace = ""
-                    else:
-                        indexadd = 1
-                        if len(newlineitems[1]) == 1:
-                            stepspace = "   "
-                        elif len(newlineitems[1]) == 2:
-                            stepspace = "  "
-                        elif len(newlineitems[1]) == 3:
-                            stepspace = " "
-                        stepname = newlineitems[0] + stepspace + newlineitems[1]
-
-                    coredec_str = newlineitems[7 + indexadd]
-                    coredec = float(coredec_str)
-                    coredec_spacer = " " * (6 - len(coredec_str))
-
-                    coreinc_str = newlineitems[8 + indexadd]
-                    coreinc = float(coreinc_str)
-                    if coreinc != 0:
-                        coreinc_fixed = -coreinc # The minus sign here is what corrects the parameter error on SQUID measurements.
-                    else:
-                        coreinc_fixed = 0.0
-                        
-                    coreinc_fixed_str = str(coreinc_fixed)
-                    coreinc_fixed_spacer = " " * (6 - len(coreinc_fixed_str))
-
-                    if printdata:
-                        print ("Linenum = %s, Core Dec = %s, Core Inc (FIXED) = %s" % (linenum, coredec, coreinc_fixed))
-                    
-                    strike_rotation_angle = (90 - coreplatestrike_corrected) % 360
-                    newgeogset_strike = rotatecoords(strike_rotation_angle,0,90,coredec,coreinc_fixed)
-
-                    dip_rotation_angle = -coreplatedip
-                    newgeogset = rotatecoords(dip_rotation_angle,coreplatestrike_corrected,0,newgeogset_strike[0],newgeogset_strike[1])
-                    
-                    geogdec = newgeogset[0]
-                    geoginc = newgeogset[1]
-
-                    dip_rotation_angle = sitedip # This should NOT be the negative of the sitedip...Michiel's excel file was wrong to make it negative.
-                    newtiltset = rotatecoords(dip_rotation_angle, sitestrike_corrected, 0, geogdec, geoginc)
-                    
-                    tiltdec = newtiltset[0]
-                    tiltinc = newtiltset[1]
-
-                    geogdec_str = "%.1f" % geogdec
-                    geogdec_spacer = " " * (6 - len(geogdec_str))
-
-                    if stepname == "NRM":
-                        geogdec_spacer = geogdec_spacer + "   "
-
-                    geoginc_str = "%.1f" % geoginc
-                    geoginc_spacer = " " * (6 - len(geoginc_str))
-
-                    tiltdec_str = "%.1f" % tiltdec
-                    tiltdec_spacer = " " * (6 - len(tiltdec_str))
-
-                    tiltinc_str = "%.1f" % tiltinc
-                    tiltinc_spacer = " " * (6 - len(tiltinc_str))
-
-                    intensity_str = " " + newlineitems[5 + indexadd]
-                    
-                    error_str = newlineitems[6 + indexadd]
-                    error_spacer = " " * (6 - len(error_str))
-
-                    breaker_str = newlineitems[9 + indexadd]
-                    post_breaker_str = newline.split(breaker_str,1)[1]
-                    post_string = " " + breaker_str + post_breaker_str
-
-                    newline_update = stepname + geogdec_spacer + geogdec_str + geoginc_spacer + geoginc_str + tiltdec_spacer + tiltdec_str + tiltinc_spacer + tiltinc_str + intensity_str + error_spacer + error_str + coredec_spacer+ coredec_str + coreinc_fixed_spacer + coreinc_fixed_str + post_string
-                    
-                    newsamplefile.write("%s" % newline_update)
-                    if printdata:
-                        print ("New Line %s, Text: %s" % (linenum, newline_update))                    
-                else:
-                    newsamplefile.write("%s" % newline) # If it was JR6 data then just write the original line without doing anything.
-                    if printdata:
-                        print ("JR6 Data in Line %s (No modifications made), Text: %s" % (linenum, newline))
+        for step in steplist:
+            linenum = step[1]
+            newline = step[2]
+            if step[0] == "Squid":
+                measurement = step[3]
+                newline_update = measurement.dataline # formatted above with the rest of the site
+
+                if printdata:
+                    print ("Linenum = %s, Core Dec = %s, Core Inc (FIXED) = %s" % (linenum, measurement.coredec, measurement.coreinc))
+
+                newsamplelines.append(newline_update)
+                writtensteplist.append((newline_update, measurementtuple(measurement)))
+                if printdata:
+                    print ("New Line %s, Text: %s" % (linenum, newline_update))                    
+            elif step[0] == "JR6":
+                newsamplelines.append(newline) # If it was JR6 or 2G data then just write the original line without doing anything.
+                writtensteplist.append((newline, step[3]))
+                if printdata:
+                    print ("%s Data in Line %s (No modifications made), Text: %s" % (newline.split()[-1], linenum, newline))
             else:
                 print("Line %s: Empty Line" % linenum)
     else:
         print("No measurement data in file %s" % filename)
 
+    newsamplefile = open (filename,'a') #Creates new sample file
+    newsamplefile.write("".join(newsamplelines))
     newsamplefile.close()
+    storecachedparse(cachefiles, filename, (tempcontent[0], paramlinenew, writtensteplist))
     
     os.remove(tempsamplefilename) # remove tempfile
 
+savesitecache(sitename, cachefiles)
+
 print("-----------------------------------------------\n")
 print("All data files processed.")
 print("All tempfiles removed.")
@@ -19,7 +19,7 @@ import math
 import re
 
 from shutil import copy
-from xlrd import open_workbook
+from workbookreader import readsheetsnapshot, rowcount, paleomagpoledata
 import xlwt
 
 from os.path import dirname
@@ -41,20 +41,22 @@ class CourseException(Exception):
     def __str__(self):
         return repr(self.value)
 
-def _gccalc(lon, lat, azimuth, maxdist=None):
+def _gccalc_array(lon, lat, azimuth, maxdist):
     """
     Original javascript on http://williams.best.vwh.net/gccalc.htm
-    Translated into python by Thomas Lecocq
-    This function is a black box, because trigonometry is difficult
-    
+    Translated into python by Thomas Lecocq, and made to work on arrays: lon, lat, azimuth and maxdist can be numbers
+    or arrays, and are broadcast against each other (e.g. a column of poles against a row of azimuths), so that every
+    azimuth of a circle is solved at once. Each element is iterated until it has converged on its own.
+    Returns arrays of (glon2, glat2, baz).
     """
+    lon, lat, azimuth, maxdist = np.broadcast_arrays(*[np.asarray(value, dtype=float) for value in (lon, lat, azimuth, maxdist)])
     glat1 = lat * np.pi / 180.
     glon1 = lon * np.pi / 180.
     s = maxdist / 1.852
     faz = azimuth * np.pi / 180.
- 
+
     EPS = 0.00000000005
-    if ((np.abs(np.cos(glat1)) < EPS) and not (np.abs(np.sin(faz)) < EPS)):
+    if np.any((np.abs(np.cos(glat1)) < EPS) & ~(np.abs(np.sin(faz)) < EPS)):
         raise CourseException("Only North-South courses are meaningful")
 
     a = 6378.13 / 1.852
@@ -63,10 +65,7 @@ def _gccalc(lon, lat, azimuth, maxdist=None):
     tu = r * np.tan(glat1)
     sf = np.sin(faz)
     cf = np.cos(faz)
-    if (cf == 0):
-        b = 0.
-    else:
-        b = 2. * np.arctan2 (tu, cf)
+    b = np.where(cf == 0, 0., 2. * np.arctan2(tu, cf))
 
     cu = 1. / np.sqrt(1 + tu * tu)
     su = tu * cu
@@ -78,18 +77,24 @@ def _gccalc(lon, lat, azimuth, maxdist=None):
     c = (x * x / 4. + 1.) / c
     d = (0.375 * x * x - 1.) * x
     tu = s / (r * a * c)
-    y = tu
+    y = tu.copy()
     c = y + 1
-    while (np.abs (y - c) > EPS):
-        sy = np.sin(y)
-        cy = np.cos(y)
-        cz = np.cos(b + y)
-        e = 2. * cz * cz - 1.
-        c = y
-        x = e * cy
-        y = e + e - 1.
-        y = (((sy * sy * 4. - 3.) * y * cz * d / 6. + x) *
-            d / 4. - cz) * sy * d + tu
+    sy = np.zeros(y.shape)
+    cy = np.zeros(y.shape)
+    cz = np.zeros(y.shape)
+    e = np.zeros(y.shape)
+    active = np.abs(y - c) > EPS   # elements still iterating
+    while active.any():
+        ya, ba, da = y[active], b[active], d[active]
+        sy[active] = sya = np.sin(ya)
+        cy[active] = cya = np.cos(ya)
+        cz[active] = cza = np.cos(ba + ya)
+        e[active] = ea = 2. * cza * cza - 1.
+        c[active] = ya
+        yn = ea + ea - 1.
+        y[active] = (((sya * sya * 4. - 3.) * yn * cza * da / 6. + ea * cya) *
+                     da / 4. - cza) * sya * da + tu[active]
+        active = np.abs(y - c) > EPS
 
     b = cu * cy * cf - su * sy
     c = r * np.sqrt(sa * sa + b * b)
@@ -121,12 +126,9 @@ def circle(m, centerlon, centerlat, radius, *args, **kwargs):
 
     glon1 = centerlon
     glat1 = centerlat
-    X = []
-    Y = []
-    for azimuth in range(0, 360):
-        glon2, glat2, baz = _gccalc(glon1, glat1, azimuth, radius)
-        X.append(glon2)
-        Y.append(glat2)
+    glon2s, glat2s, bazs = _gccalc_array(glon1, glat1, np.arange(0, 360), radius)   # every azimuth at once
+    X = glon2s.tolist()
+    Y = glat2s.tolist()
     X.append(X[0])
     Y.append(Y[0])
 
@@ -162,8 +164,12 @@ def circle_wrap(m, centerlon, centerlat, radius, midlon, boundary, lon_diff_angd
     else:
         pos = "west"
 
+    glon2s, glat2s, bazs = _gccalc_array(glon1, glat1, np.arange(0, 360), radius)   # every azimuth at once
+    glon2s = glon2s.tolist()
+    glat2s = glat2s.tolist()
     for azimuth in range(0, 360):
-        glon2, glat2, baz = _gccalc(glon1, glat1, azimuth, radius)
+        glon2 = glon2s[azimuth]
+        glat2 = glat2s[azimuth]
 
         p1_lon_rad = math.radians(centerlon)
         p2_lon_rad = math.radians(glon2)
@@ -265,6 +271,8 @@ verifiedqmin = 3 #Change this to make verified poles require higher vqq
 excelfilename = "paleomagdata.xlsx"
 lw = 1
 ls = "-"
+ellipseflatness = 0.01   # the most (in plot units) that the lines an a95 ellipse is drawn with may stray from it
+ellipseminpoints = 24   # the fewest points an a95 ellipse is drawn through
 
 alpha_symbol = u'\N{GREEK SMALL LETTER ALPHA}'
 subscript9 = u'\N{SUBSCRIPT NINE}'
@@ -399,180 +407,35 @@ def getdatachartfoldername(filepath):
     data_chartfoldername = "Charts" + data_chartfoldernum_str
     return(data_chartfoldername)
 
-def loadallpoles(wb):
+def loadallpoles(excelfilename):
     allpoles_list = []
-    for sheet in wb.sheets(): #Load all poles into allpoles_list
-        if sheet.name == "Poledata":
-            number_of_rows = sheet.nrows
-            number_of_columns = sheet.ncols
-            rows = []
-            for row in range(1, number_of_rows):
-                rowitems = []
-                values = []
-        #        print("row = %s" % row)
-                
-                for col in range(number_of_columns):
-                    value  = (sheet.cell(row,col).value)
-                    rowitems.append(value)
-        #            print("col = %s" % col)
-
-                use = rowitems[0]
-                if use == 0:
-                    continue
-
-                unit = str(rowitems[1])
-                unit_decoded = unit.encode('latin1')
-                
-                component = str(rowitems[2])
-                component_decoded = component.encode('latin1')
-
-                if component_decoded != "":
-                    unittext = "%s (%s)" % (unit_decoded,component_decoded)
-                else:
-                    unittext = unit_decoded
-
-                color = rowitems[3]
-                color_decoded = color.encode('latin1')
-                
-                polelat = rowitems[4]
-                polelat_num = float(polelat)
-                polelat_str = ("%.1f" % polelat_num)
-
-                polelon = rowitems[5]
-                polelon_num = float(polelon)
-                polelon_str = ("%.1f" % polelon_num)
-                
-                antipolelat = rowitems[6]
-                antipolelat_num = float(antipolelat)
-                
-                antipolelon = rowitems[7]
-                antipolelon_num = float(antipolelon)
-                
-                polea95 = rowitems[8]
-                if polea95:
-                    polea95_num = float(polea95)
-                    polea95_str = ("%.1f" % polea95_num)
-                else:
-                    polea95_num = ""
-                    polea95_str = ""
-               
-                polek = rowitems[9]
-                if polek:
-                    polek_num = float(polek)
-                    polek_str = ("%.1f" % polek_num)
-                else:
-                    polek_num = ""
-                    polek_str = ""
-
-                poledp = rowitems[10]
-                if poledp:
-                    poledp_num = float(poledp)
-                    poledp_str = ("%.1f" % poledp_num)
-                else:
-                    poledp_num = ""
-                    poledp_str = ""
-
-                poledm = rowitems[11]
-                if poledm:
-                    poledm_num = float(poledm)
-                    poledm_str = ("%.1f" % poledm_num)
-                else:
-                    poledm_num = ""
-                    poledm_str = ""
-                
-                if polea95_num != "":
-                    pole_radius = polea95_num
-                else:
-                    pole_radius = max(poledp_num,poledm_num)
-
-                paleolat = rowitems[12]
-                paleolat_num = float(paleolat)
-
-                dec = rowitems[13]
-                dec_num = float(dec)
-                dec_str = ("%.1f" % dec_num)
-
-                inc = rowitems[14]
-                inc_num = float(inc)
-                inc_str = ("%.1f" % inc_num)
+    poledata = readsheetsnapshot(excelfilename, "Poledata", paleomagpoledata) #Load all poles into allpoles_list, from the workbook's snapshot if it has not changed
+    for row in range(rowcount(poledata)):
+        unit_decoded = poledata["unit"][row]
+        component_decoded = poledata["component"][row]
+        color_decoded = poledata["color"][row]
+
+        polea95_num = poledata["polea95"][row]
+        poledp_num = poledata["poledp"][row]
+        poledm_num = poledata["poledm"][row]
+        if polea95_num != "":
+            pole_radius = polea95_num
+        else:
+            pole_radius = max(poledp_num,poledm_num)
 
-                directiona95 = rowitems[15]
-                if directiona95 == "":
-                    directiona95_num = 0
-                else:
-                    if directiona95 == "90":
-                        directiona95_num = 90.0001
-                    else:
-                        directiona95_num = float(directiona95)
-                directiona95_str = ("%.1f" % directiona95_num)
+        ageprefix_decoded = poledata["ageprefix"][row]
+        age_int = poledata["age"][row]
+        agetext = ageprefix_decoded + str(age_int) + poledata["agepostfix"][row]
 
-                directionk = rowitems[16]
-                if directionk:
-                    directionk_num = float(directionk)
-                    directionk_str = ("%.1f" % directionk_num)
-                else:
-                    directionk_num = ""
-                    directionk_str = ""
-
-                ageprefix = rowitems[17]
-                try:
-                    ageprefix_num = float(ageprefix)
-                    ageprefix_decoded = str(ageprefix_num)
-                except:
-                    ageprefix_decoded = ageprefix.encode('latin1')
-                
-                age = rowitems[18]
-                age_int = int(round(age))
-                age_str = str(age_int)
-
-                agepostfix = rowitems[19]
-                try:
-                    agepostfix_num = int(float(agepostfix))
-                    agepostfix_decoded = str(agepostfix_num)
-                except:
-                    agepostfix_decoded = agepostfix.encode('latin1')
-
-                agetext = ageprefix_decoded + age_str
-                if agepostfix_decoded != "":
-                    agetext = agetext + agepostfix_decoded
-
-                pmagref = rowitems[20]
-                pmagref_decoded = pmagref.encode('latin1')
-
-                ageref = rowitems[21]
-                ageref_decoded = ageref.encode('latin1')
-                
-                pmagref_text = "%s [%s]" % (pmagref_decoded,ageref_decoded)
-              
-                plateid = "GPlates-0c9adcac-2142-486c-ac9f-95868320515f"
-                platerevision = "GPlates-441bb92b-b8b4-44c6-8c5f-e283f2312cc7"
-                
-         #       print("unit = %s" % unit)
-         #       print("component = %s" % component)
-         #       print("code = %s" % code)
-         #       print("polelat = %s" % polelat)
-         #       print("polelon = %s" % polelon)
-         #       print("polea95 = %s" % polea95)
-         #       print("polek = %s" % polek)
-         #       print("poledp = %s" % poledp)
-         #       print("poledm = %s" % poledm)
-         #       print("paleolat = %s" % paleolat)
-         #       print("dec = %s" % dec)
-         #       print("inc = %s" % inc)
-         #       print("directiona95 = %s" % directiona95)
-         #       print("directionk = %s" % directionk)
-         #       print("age = %s" % age)
-         #       print("agemod = %s" % agemod)
-         #       print("ref = %s" % ref)
-
-                refinfo = ("%s, %s Ma, %s" % (unit_decoded, agetext, pmagref_decoded) )
-                
-                newpole = [ageprefix_decoded,age_int,refinfo,polelat_num,polelon_num,antipolelat_num,antipolelon_num,polea95_num,polek_num,poledp_num,poledm_num,pole_radius,
-                           paleolat_num,dec_num,inc_num,directiona95_num,directionk_num,pmagref_decoded,ageref_decoded,component_decoded,color_decoded]
+        pmagref_decoded = poledata["pmagref"][row]
+        refinfo = ("%s, %s Ma, %s" % (unit_decoded, agetext, pmagref_decoded) )
+        
+        newpole = [ageprefix_decoded,age_int,refinfo,poledata["polelat"][row],poledata["polelon"][row],poledata["antipolelat"][row],poledata["antipolelon"][row],
+                   polea95_num,poledata["polek"][row],poledp_num,poledm_num,pole_radius,
+                   poledata["paleolat"][row],poledata["dec"][row],poledata["inc"][row],poledata["directiona95"][row],poledata["directionk"][row],
+                   pmagref_decoded,poledata["ageref"][row],component_decoded,color_decoded]
 
-                allpoles_list.append(newpole)
-                #allpoles_list_sorted_age = sorted(allpoles_list, key = lambda item: item[1])
-    #return(allpoles_list_sorted_age)
+        allpoles_list.append(newpole)
     return(allpoles_list)
 
 def isitacolor(color):
@@ -650,16 +513,95 @@ def makesavereferences(polelist,plotname,folderpath,periodname,shownumbers,combi
         print("Saving caption file %s" % captionfilename)
     return
 
-def goesthroughzero(angle1,angle2):
-    # Code adapted from https://stackoverflow.com/questions/11406189/determine-if-angle-lies-between-2-other-angles
-    angulardist = ((angle2 - angle1) % 360 + 360) % 360
-    if angulardist >= 180:
-        angle1,angle2 = angle2,angle1
-    if angle1 <= angle2:
-        anglegoesthroughzero = (angle1 <= 0) and (angle2 >= 0)
-    else:
-        anglegoesthroughzero = (angle1 <=0) or (angle2 >= 0)
-    return(anglegoesthroughzero)
+def downvectors(dec_rad, inc_rad):  # Returns directions as unit vectors, one (north, east, down) row each, turned to point down.
+    vectors = np.transpose([np.cos(dec_rad) * np.cos(inc_rad), np.sin(dec_rad) * np.cos(inc_rad), np.sin(inc_rad)])
+    vectors[vectors[:, 2] < 0] *= -1
+    return(vectors)
+
+def ellipserings(decs, incs, a95s, eqarearadius, cosmologicalconstant):
+    """
+    Works out the a95 ellipses of all the directions of an equal-area plot at once: the points of every cone are turned
+    by its own trans_matrix and projected in one batched matrix operation. Each ellipse is drawn through as many points
+    as its projected size needs for its lines to stray no more than ellipseflatness from it, plus the two points where
+    it crosses the primitive circle, if it does. Returns a list of (ell_x, ell_y, upsidedown_x, upsidedown_y), one for
+    each direction, where upsidedown_x and upsidedown_y outline the part of the ellipse on the upper hemisphere, or are
+    None if there is none.
+    """
+    decs, incs, a95s = [np.asarray(value, dtype=float) for value in (decs, incs, a95s)]
+    conenums = np.arange(len(decs))
+    dec_rad = np.radians(decs)
+    inc_rad = np.radians(incs)
+    bigellipse = a95s > 90 # Note: Much of the math in this section is borrowed from pmagpy. Thank you!
+    ell_a95 = np.where(bigellipse, 180 - a95s, a95s)
+    dec = np.where(bigellipse, decs - 180, decs)
+    inc = np.where(bigellipse, -incs, incs)
+    rad_ell_a95 = np.radians(ell_a95)
+
+    trans_matrix = np.empty((len(decs), 3, 3))
+    trans_matrix[:, :, 0] = downvectors(dec_rad, np.radians(np.where(inc < 0, inc + 90, inc - 90)))
+    trans_matrix[:, :, 1] = downvectors(np.radians(dec + 90), np.zeros(len(decs)))
+    trans_matrix[:, :, 2] = downvectors(dec_rad, inc_rad)
+
+    projectedsize = math.sqrt(2) * eqarearadius * np.sqrt(1 - np.cos(rad_ell_a95)) # the widest the ellipse can be drawn
+    totdrawpoints = np.maximum(np.ceil(math.pi * np.sqrt(projectedsize / (2 * ellipseflatness))), ellipseminpoints).astype(int)
+    cones = np.repeat(conenums, totdrawpoints) # the cone of each point
+    pointnum = np.arange(totdrawpoints.sum()) - np.repeat(np.cumsum(totdrawpoints) - totdrawpoints, totdrawpoints)
+    rad_pointnum = pointnum / (totdrawpoints[cones] - 1.) * 2 * math.pi
+
+    down_cos = trans_matrix[:, 2, 0] * np.sin(rad_ell_a95) # down = down_cos * cos(rad_pointnum) + down_sin * sin(rad_pointnum) + down_0
+    down_sin = trans_matrix[:, 2, 1] * np.sin(rad_ell_a95)
+    down_0 = trans_matrix[:, 2, 2] * np.cos(rad_ell_a95)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        crossing = -down_0 / np.hypot(down_cos, down_sin)
+        crosses = np.abs(crossing) < 1 # the ellipse crosses the primitive circle, where down = 0
+    crossingangles = np.arctan2(down_sin, down_cos)[crosses] + [[-1], [1]] * np.arccos(crossing[crosses])
+    cones = np.concatenate([cones, conenums[crosses], conenums[crosses]])
+    rad_pointnum = np.concatenate([rad_pointnum, crossingangles.ravel() % (2 * math.pi)])
+    order = np.lexsort((rad_pointnum, cones))
+    cones = cones[order]
+    rad_pointnum = rad_pointnum[order]
+    oncrossing = order >= totdrawpoints.sum()
+
+    vector_matrix = np.empty((len(cones), 3))
+    vector_matrix[:, 0] = np.sin(rad_ell_a95[cones]) * np.cos(rad_pointnum)
+    vector_matrix[:, 1] = np.sin(rad_ell_a95[cones]) * np.sin(rad_pointnum)
+    vector_matrix[:, 2] = np.sqrt(1.0 - vector_matrix[:, 0]**2 - vector_matrix[:, 1]**2)
+    ellipse = np.einsum('pjk,pk->pj', trans_matrix[cones], vector_matrix)
+
+    R = np.sqrt(1.0 - np.abs(ellipse[:, 2])) / np.sqrt(ellipse[:, 0]**2 + ellipse[:, 1]**2)
+    R_deg = np.degrees(R) / 90 * eqarearadius * cosmologicalconstant
+    flip = np.where((incs < 0) | bigellipse, -1, 1)
+    ell_x = ellipse[:, 1] * R_deg * flip[cones]
+    ell_y = ellipse[:, 0] * R_deg * flip[cones]
+    upsidedown = (ellipse[:, 2] < 0) | oncrossing
+
+    rings = []
+    splits = np.cumsum(np.bincount(cones, minlength=len(decs)))[:-1]
+    for conenum, ell_x, ell_y, upsidedown in zip(conenums, np.split(ell_x, splits), np.split(ell_y, splits), np.split(upsidedown, splits)):
+        if crosses[conenum]:
+            upsidedown_x, upsidedown_y = upsidedownring(ell_x[upsidedown], ell_y[upsidedown], eqarearadius)
+        else:
+            upsidedown_x, upsidedown_y = None, None
+        rings.append((ell_x, ell_y, upsidedown_x, upsidedown_y))
+    return(rings)
+
+def upsidedownring(upsidedown_x, upsidedown_y, eqarearadius):
+    """
+    Returns the (x, y) outline of the part of an a95 ellipse on the upper hemisphere, given by its points from one
+    crossing of the primitive circle to the other: they are followed by the arc of the primitive circle from the last
+    of them back to the first, drawn through as many points as it needs to stray no more than ellipseflatness from
+    the circle. The arc goes the shorter way round between the last and first points inside the circle.
+    """
+    start_phi = math.atan2(upsidedown_y[-1], upsidedown_x[-1])
+    end_phi = math.atan2(upsidedown_y[0], upsidedown_x[0])
+    inside = [1, -2] if len(upsidedown_x) > 2 else [0, -1]
+    inside_phi = np.arctan2(upsidedown_y[inside], upsidedown_x[inside])
+    arc = (end_phi - start_phi) % (2 * math.pi) # anticlockwise
+    if (inside_phi[0] - inside_phi[1]) % (2 * math.pi) > math.pi:
+        arc = arc - 2 * math.pi # clockwise
+    arcstep = 2 * math.acos(1 - ellipseflatness / eqarearadius)
+    rad_phi = start_phi + np.linspace(0, arc, int(math.ceil(abs(arc) / arcstep)) + 1)
+    return(np.concatenate([upsidedown_x, np.cos(rad_phi) * eqarearadius]), np.concatenate([upsidedown_y, np.sin(rad_phi) * eqarearadius]))
 
 def makensaveeqareaa95plot(polelist,plotname,folderpath,periodname,shownumbers,combinevk,doantipoles):
     fig0 = plt.figure(figsize=(12,12),facecolor='white')
@@ -716,6 +658,7 @@ def makensaveeqareaa95plot(polelist,plotname,folderpath,periodname,shownumbers,c
     ax0.text(-(eqarearadius + 7), 0, "W", color="Black", va="center", ha="right", fontsize=chart_label_fontsize,zorder=0)
 
     zorderrank = 0
+    cones = []
     if polelist:
         for polenum, pole in enumerate(polelist):
             age = pole[0]
@@ -761,179 +704,23 @@ def makensaveeqareaa95plot(polelist,plotname,folderpath,periodname,shownumbers,c
 
             if ell_a95 == 0:
                 continue
-            
-            ell_x_list = []
-            ell_y_list = []
-            
-            if ell_a95 > 90: # Note: Much of the math in this section is borrowed from pmagpy. Thank you!
-                bigellipse = True
-                ell_a95 = 180 - ell_a95
-                dec = dec - 180
-                inc = -inc
-            else:
-                bigellipse = False
-            
-            rad_ell_a95 = math.radians(ell_a95)
-           
-            trans_matrix = [[0,0,0],[0,0,0],[0,0,0]]
-            
-            north = math.cos(dec_rad) * math.cos(inc_rad)
-            east = math.sin(dec_rad) * math.cos(inc_rad)
-            down = math.sin(inc_rad)
-
-            if down < 0:
-                north = -north
-                east = -east
-                down = -down
+            cones.append((dec, inc, ell_a95, drawcolor, hatch, zplotorder))
 
-            trans_matrix[0][2] = north
-            trans_matrix[1][2] = east
-            trans_matrix[2][2] = down
-
-            binc = inc - ( (abs(inc)/inc) * 90 )
-            rad_binc = math.radians(binc)
-            
-            north = math.cos(dec_rad) * math.cos(rad_binc)
-            east = math.sin(dec_rad) * math.cos(rad_binc)
-            down = math.sin(rad_binc)
-
-            if down < 0:
-                north = -north
-                east = -east
-                down = -down
-
-            trans_matrix[0][0] = north
-            trans_matrix[1][0] = east
-            trans_matrix[2][0] = down
-
-            gdec = dec + 90
-            rad_gdec = math.radians(gdec)
-            ginc = 0
-            
-            north = math.cos(rad_gdec) * math.cos(ginc)
-            east = math.sin(rad_gdec) * math.cos(ginc)
-            down = math.sin(ginc)
-
-            if down < 0:
-                north = -north
-                east = -east
-                down = -down
-
-            trans_matrix[0][1] = north
-            trans_matrix[1][1] = east
-            trans_matrix[2][1] = down
-
-            #ellipse_densityfactor = 1
-            ellipse_densityfactor = 50
-            totdrawpoints = ell_a95 * ellipse_densityfactor
-            totdrawpoints_int = int(totdrawpoints)
-
-##            pointsperdegree = float(float(totdrawpoints) / 360)
-##            startdegrees = 0
-##            enddegrees = int(round(360*pointsperdegree,0))
-
-            #print("%s. Reference %s; drawcolor = %s; a95 = %s" % (refnum, reference, drawcolor, ell_a95) )
-
-            upsidedown = False
-            upsidedown_x_list = []
-            upsidedown_y_list = []
-            usdnum = 0
-            for pointnum in range(0,totdrawpoints_int):
-                degrees = pointnum / (totdrawpoints-1) * 360
-                rad_pointnum = math.radians(degrees)
-                vector_matrix = [0,0,0]
-                vector_matrix[0] = math.sin(rad_ell_a95) * math.cos(rad_pointnum)
-                vector_matrix[1] = math.sin(rad_ell_a95) * math.sin(rad_pointnum)
-                vector_matrix[2] = math.sqrt(1.0 - vector_matrix[0]**2 - vector_matrix[1]**2)
-                ellipse = [0,0,0]       
-                for j in range(0,3):
-                    for k in range(0,3):
-                        ellipse[j] = ellipse[j] + (trans_matrix[j][k]*vector_matrix[k])                    
-                R = math.sqrt(1.0 - abs(ellipse[2])) / math.sqrt (ellipse[0]**2 + ellipse[1]**2)
-                R_deg = math.degrees(R) / 90 * eqarearadius * cosmologicalconstant
-                ell_x = (ellipse[1] * R_deg)
-                ell_y = (ellipse[0] * R_deg)
-                if up or bigellipse:
-                    ell_x = -ell_x
-                    ell_y = -ell_y
-                #newpoint = ax.scatter(ell_x, ell_y, color=drawcolor, s=5, marker=ellipse_symbol,zorder=zplotorder)
-                #ax.text(ell_x, ell_y, str(pointnum),color="black",va='center',ha='center',zorder=zplotorder+1,fontsize=label_fontsize,fontweight='normal')
-                ell_x_list.append(ell_x)
-                ell_y_list.append(ell_y)
-                #print("%s: R=%.3f; R_deg=%.3f; ell[2]=%.3f; ell[1]=%.3f; ell[0]=%.3f; ell_x=%.3f; ell_y=%.3f" % (pointnum,R,R_deg,ellipse[2],ellipse[1],ellipse[0],ell_x,ell_y) )
-
-                if ellipse[2] < 0:
-                    upsidedown = True
-                    upsidedown_x_list.append(ell_x)
-                    upsidedown_y_list.append(ell_y)
-                    #print("%s (%s): ell_x: %.3f, ell_y: %.3f" % (usdnum, pointnum,ell_x,ell_y) )
-                    usdnum = usdnum + 1
-
-            zippy = zip(ell_x_list, ell_y_list)
+    if cones:
+        decs, incs, a95s = zip(*cones)[:3]
+        rings = ellipserings(decs, incs, a95s, eqarearadius, cosmologicalconstant)
+        for (dec, inc, ell_a95, drawcolor, hatch, zplotorder), (ell_x, ell_y, upsidedown_x, upsidedown_y) in zip(cones, rings):
+            zippy = zip(ell_x, ell_y)
             pol = Polygon(zippy)
             fullellipse = PolygonPatch(pol, fc=drawcolor, ec='#000000', alpha=.5, lw=lw, ls=ls, hatch=hatch, zorder=zplotorder)
             ax0.add_patch(fullellipse)
 
-            if upsidedown:
-                start_x = upsidedown_x_list[-1]
-                start_y = upsidedown_y_list[-1]
-                start_phi = math.degrees(math.atan2(start_y,start_x)) % 360
-                #print("start values: start_x = %s; start_y = %s, start_phi = %s" % (start_x,start_y, start_phi))
-                
-                end_x = upsidedown_x_list[0]
-                end_y = upsidedown_y_list[0]
-                end_phi = math.degrees(math.atan2(end_y,end_x)) % 360
-                #print("end values: end_x = %s; end_y = %s, end_phi = %s" % (end_x,end_y, end_phi))
-
-                doreverse = False
-                if not(goesthroughzero(start_phi,end_phi)):
-                    #print("doesn'tgothroughzero")
-                    if start_phi > end_phi:
-                        start_phi,end_phi = end_phi,start_phi
-                        doreverse = True
-                else:
-                    #print("goesthrouthzero")
-                    bigger = max(start_phi,end_phi)
-                    if bigger == end_phi:
-                        doreverse = True
-                    smaller = min(start_phi,end_phi)
-                    start_phi = bigger - 360
-                    end_phi = smaller
-    
-                #print(start_phi, end_phi)
-                
-                pointsperdegree = 5
-                startpoint = int(round(pointsperdegree * start_phi,0))
-                endpoint = int(round(pointsperdegree * end_phi,0))
-
-                #print(startpoint,endpoint,doreverse)
-
-                if not doreverse:
-                    for pointnum in range(startpoint,endpoint):
-                        degrees_pointnum = (float(pointnum)/pointsperdegree)
-                        rad_pointnum = math.radians(degrees_pointnum)
-                        upsidedown_x = math.cos(rad_pointnum) * eqarearadius
-                        upsidedown_y = math.sin(rad_pointnum) * eqarearadius
-                        upsidedown_x_list.append(upsidedown_x)
-                        upsidedown_y_list.append(upsidedown_y)
-                        #print("%s (%s) (degrees: %.5f): usd_x: %.3f, usd_y: %.3f" % (usdnum, pointnum, degrees_pointnum, upsidedown_x,upsidedown_y) )
-                        usdnum = usdnum + 1
-                else:
-                    for pointnum in reversed(range(startpoint,endpoint)):
-                        degrees_pointnum = (float(pointnum)/pointsperdegree)
-                        rad_pointnum = math.radians(degrees_pointnum)
-                        upsidedown_x = math.cos(rad_pointnum) * eqarearadius
-                        upsidedown_y = math.sin(rad_pointnum) * eqarearadius
-                        upsidedown_x_list.append(upsidedown_x)
-                        upsidedown_y_list.append(upsidedown_y)
-                        #print("%s (%s) (degrees: %.5f): usd_x: %.3f, usd_y: %.3f" % (usdnum, pointnum, degrees_pointnum, upsidedown_x,upsidedown_y) )
-                        usdnum = usdnum + 1                    
-                 
-                zippy_usd = zip(upsidedown_x_list, upsidedown_y_list)
+            if upsidedown_x is not None:
+                zippy_usd = zip(upsidedown_x, upsidedown_y)
                 pol_usd = Polygon(zippy_usd)
                 usd_ellipse = PolygonPatch(pol_usd, fc='#800080', ec='#000000', alpha=.5, lw=lw, ls=ls, hatch=hatch, zorder=zplotorder)
                 ax0.add_patch(usd_ellipse)
-                
+
     saveimagename = periodname + "_" + plotname + "_directionsa95.png"
     saveimagepath = folderpath + "\\" + saveimagename
     print("Saving image %s" % saveimagename)
@@ -1088,8 +875,7 @@ os.makedirs(data_chartfolderpath)
 print('\n' + "Created new file directory %s and putting all your schnitzel there." % (data_chartfoldername))
 print('\n' + "----------------------------")
 
-wb = open_workbook(excelfilename)
-allpoles_list_sorted_age = loadallpoles(wb)
+allpoles_list_sorted_age = loadallpoles(excelfilename)
 
 makesavereferences(allpoles_list_sorted_age,"combinedpoles",data_chartfolderpath,"My Pole Numbers",True,True)
 ax0 = makensaveeqareaa95plot(allpoles_list_sorted_age,"combinedpoles",data_chartfolderpath,"My Equal Area Plot",True,True,False)
@@ -15,29 +15,22 @@
 import os
 import math
 import sys
-import re
-from shutil import copy
+from datafiles import loadbackupindex, savebackupindex, nextbackupdirname, backupfiles
+from datafiles import FixedWidthFormat
 
 # Constants:
 fileextention = ".txt"
 
+# Line layout of the smoothed IRM files (see FIXED WIDTH):
+irmlineformat = FixedWidthFormat([("column1",0,"<","s"), "  ", ("column2",0,"<","s"), "  ", ("column3",10,"<","s"), ("irm",11,"<","s"), ("column5",10,"<","s"), ("column6",10,"<","s"), ("column7",0,"<","s"), "\n"])
+
 # Program:
 
 os.system('mode con: cols=175 lines=60')
 
 scriptdir = os.path.dirname(os.path.realpath(__file__))
-backupdirnum = 0
-for root, dirs, files in os.walk(scriptdir, topdown=False):
-    for name in dirs:
-        if "IRMBackup" in name:
-            newbackupnum_str = re.sub('[^0-9]', "", name)
-            if (newbackupnum_str != ''):
-                newbackupnum = int(newbackupnum_str)
-                if newbackupnum > backupdirnum:
-                    backupdirnum = newbackupnum
-backupdirnum = backupdirnum + 1
-backupdirnum_str = str(backupdirnum)
-backupdirname = "IRMBackup" + backupdirnum_str
+backupindex = loadbackupindex(scriptdir, "IRMBackup")
+backupdirname = nextbackupdirname(scriptdir, backupindex)
 
 print('\n' + "Hello. This script is ready to SMOOTH your IRM Acquisition (.txt) data.")
 print ("\nWARNING: This script will OVERWRITE any datafiles in this folder. It is recommended that you back up your original datafiles before proceeding...")
@@ -85,45 +78,25 @@ for linenum, line in enumerate(irmdata): # smooths the data
         smoothedirm = (irm1 + irm2 + irm_present + irm4 + irm5) / 5
         irmdata[linenum][2] = smoothedirm
 
-os.makedirs(backupdirname)
+unchangedcount = backupfiles(scriptdir, backupdirname, [irmfilename], backupindex) # Save irmfile in backup folder
+savebackupindex(scriptdir, backupindex)
 print("Backup folder \"%s\" created." % backupdirname)
-backupdirpath = scriptdir + "\\" + backupdirname
-copy(irmfilename, backupdirpath) # Save irmfile in backup folder
+if unchangedcount:
+    print("  (The data file is unchanged since an earlier backup, so it was not copied again.)")
 
 print ("*** IMPORTANT NOTE: Original .cur data file was automatically backed up to folder \"%s\"." % backupdirname)
 print ("\n----------------------------\n")
 
 os.remove(irmfilename)
 smoothfilename = irmfileshort + "_IRMsmooth" + fileextention
-smoothfile = open(smoothfilename,'w') #Opens a new irmfile for writing
-
+smoothrows = []
 for line in irmdata:
     linelist = line[0]
     smoothedirmval = line[2]
+    smoothrows.append((linelist[0], linelist[1], linelist[2], "%.3f," % smoothedirmval, linelist[4], linelist[5], linelist[6]))
 
-    col1 = linelist[0]
-    col1_sp = "  "
-
-    col2 = linelist[1]
-    col2_sp = "  "
-
-    col3 = linelist[2]
-    col3_sp = (10 - len(col3)) * " "
-
-    col4 = str("%.3f" % smoothedirmval) + ","
-    col4_sp = (11 - len(col4)) * " "
-
-    col5 = linelist[4]
-    col5_sp = (10 - len(col5)) * " "
-
-    col6 = linelist[5]
-    col6_sp = (10 - len(col6)) * " "
-
-    col7 = linelist[6]
-      
-    smoothline = col1 + col1_sp + col2 + col2_sp + col3 + col3_sp + col4 + col4_sp + col5 + col5_sp + col6 + col6_sp + col7 + '\n'
-    smoothfile.write(smoothline)
-
+smoothfile = open(smoothfilename,'w') #Opens a new irmfile for writing
+smoothfile.write("".join(irmlineformat.formatlines(smoothrows)))
 smoothfile.close()
 
 print("-----------------------------------------------\n")
@@ -15,29 +15,23 @@
 import os
 import math
 import sys
-import re
-from shutil import copy
+from datafiles import loadbackupindex, savebackupindex, nextbackupdirname, backupfiles
+from datafiles import FixedWidthFormat
 
 # Constants:
 fileextention = ".cur"
 
+# Line layouts of the .cur files (see FIXED WIDTH):
+curlineformat = FixedWidthFormat([("temperature",6,">","s"), "   ", ("susceptibility",6,">",".1f"), ("rest",0,"<","s")])
+derivlineformat = FixedWidthFormat([("temperature",6,">","s"), "   ", ("susceptibility",6,">",".1f"), ("firstderiv",14,">",".5f"), ("secondderiv",14,">",".5f"), "\n"])
+
 # Program:
 
 os.system('mode con: cols=175 lines=60')
 
 scriptdir = os.path.dirname(os.path.realpath(__file__))
-backupdirnum = 0
-for root, dirs, files in os.walk(scriptdir, topdown=False):
-    for name in dirs:
-        if "Backup" in name:
-            newbackupnum_str = re.sub('[^0-9]', "", name)
-            if (newbackupnum_str != ''):
-                newbackupnum = int(newbackupnum_str)
-                if newbackupnum > backupdirnum:
-                    backupdirnum = newbackupnum
-backupdirnum = backupdirnum + 1
-backupdirnum_str = str(backupdirnum)
-backupdirname = "Backup" + backupdirnum_str
+backupindex = loadbackupindex(scriptdir, "Backup")
+backupdirname = nextbackupdirname(scriptdir, backupindex)
 
 print('\n' + "Hello. This script is ready to SMOOTH your Thermomagnetic Susceptibility (.cur) data.")
 print ("\nWARNING: This script will OVERWRITE any datafiles in this folder. It is recommended that you back up your original datafiles before proceeding...")
@@ -64,11 +58,10 @@ for linenum, line in enumerate(f):
     if linenum == 0:
         curdata.append(line)
     else:
-        tempval = float(line[0:6])
-        suscval = float(line[9:15])
-        firstpart = str(line[0:9])
-        lastpart = str(line[15:])
-        curdata.append([tempval,suscval,firstpart,lastpart])
+        curline = curlineformat.parse(line)
+        tempval = float(curline["temperature"])
+        suscval = float(curline["susceptibility"])
+        curdata.append([tempval,suscval,curline["temperature"],curline["rest"]])
 f.close()
 
 totlength = len(curdata)
@@ -121,10 +114,11 @@ for linenum, line in enumerate(curdata): # calculate second derivative using fir
         curdata[linenum].append(secondderiv)
         curdata[linenum].append(hitturnaround)
 
-os.makedirs(backupdirname)
+unchangedcount = backupfiles(scriptdir, backupdirname, [curfilename], backupindex) # Save cur file in backup folder
+savebackupindex(scriptdir, backupindex)
 print("Backup folder \"%s\" created." % backupdirname)
-backupdirpath = scriptdir + "\\" + backupdirname
-copy(curfilename, backupdirpath) # Save cur file in backup folder
+if unchangedcount:
+    print("  (The data file is unchanged since an earlier backup, so it was not copied again.)")
 
 print ("*** IMPORTANT NOTE: Original .cur data file was automatically backed up to folder \"%s\"." % backupdirname)
 print ("\n----------------------------\n")
@@ -133,36 +127,20 @@ os.remove(curfilename)
 smoothfilename = curfileshort + "_smooth" + fileextention
 derivfilename =  curfileshort + "_deriv" + fileextention
 
-smoothfile = open(smoothfilename,'w') #Opens a new curfile for writing
-derivfile = open(derivfilename,'w') #Opens a new curfile for writing
+smoothrows = []
+derivrows = []
 for linenum, line in enumerate(curdata):
-    if linenum == 0:
-        smoothfile.write(line)
-
-        derivline = "  TEMP    TSUSC      1stDeriv      2ndDeriv\n"
-        derivfile.write(derivline)
-    else:
-        smoothedsusc = line[4]
-        smoothedsusc_str = str("%.1f" % smoothedsusc)
-        smoothedsusc_str_spaced = ((6 - len(smoothedsusc_str)) * " ") + smoothedsusc_str
-
-        firstderiv = line[5]
-        firstderiv_str = str("%.5f" % firstderiv)
-        firstderiv_str_spaced = ((14 - len(firstderiv_str)) * " ") + firstderiv_str
-
-        secondderiv = line[6]
-        secondderiv_str = str("%.5f" % secondderiv)
-        secondderiv_str_spaced = ((14 - len(secondderiv_str)) * " ") + secondderiv_str
-      
-        smoothline = line[2] + smoothedsusc_str_spaced + line[3]
-        smoothfile.write(smoothline)
-
-        derivline = line[2] + smoothedsusc_str_spaced+ firstderiv_str_spaced + secondderiv_str_spaced + '\n'
-
+    if linenum != 0:
+        smoothrows.append((line[2], line[4], line[3]))
         if not line[7]:
-            derivfile.write(derivline)
+            derivrows.append((line[2], line[4], line[5], line[6]))
 
+smoothfile = open(smoothfilename,'w') #Opens a new curfile for writing
+smoothfile.write(curdata[0] + "".join(curlineformat.formatlines(smoothrows)))
 smoothfile.close()
+
+derivfile = open(derivfilename,'w') #Opens a new curfile for writing
+derivfile.write("  TEMP    TSUSC      1stDeriv      2ndDeriv\n" + "".join(derivlineformat.formatlines(derivrows)))
 derivfile.close()
 
 print("-----------------------------------------------\n")
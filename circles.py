@@ -27,20 +27,22 @@ class CourseException(Exception):
 
 
 
-def _gccalc(lon, lat, azimuth, maxdist=None):
+def _gccalc_array(lon, lat, azimuth, maxdist):
     """
     Original javascript on http://williams.best.vwh.net/gccalc.htm
-    Translated into python by Thomas Lecocq
-    This function is a black box, because trigonometry is difficult
-    
+    Translated into python by Thomas Lecocq, and made to work on arrays: lon, lat, azimuth and maxdist can be numbers
+    or arrays, and are broadcast against each other (e.g. a column of poles against a row of azimuths), so that every
+    azimuth of a circle is solved at once. Each element is iterated until it has converged on its own.
+    Returns arrays of (glon2, glat2, baz).
     """
+    lon, lat, azimuth, maxdist = np.broadcast_arrays(*[np.asarray(value, dtype=float) for value in (lon, lat, azimuth, maxdist)])
     glat1 = lat * np.pi / 180.
     glon1 = lon * np.pi / 180.
     s = maxdist / 1.852
     faz = azimuth * np.pi / 180.
- 
+
     EPS = 0.00000000005
-    if ((np.abs(np.cos(glat1)) < EPS) and not (np.abs(np.sin(faz)) < EPS)):
+    if np.any((np.abs(np.cos(glat1)) < EPS) & ~(np.abs(np.sin(faz)) < EPS)):
         raise CourseException("Only North-South courses are meaningful")
 
     a = 6378.13 / 1.852
@@ -49,10 +51,7 @@ def _gccalc(lon, lat, azimuth, maxdist=None):
     tu = r * np.tan(glat1)
     sf = np.sin(faz)
     cf = np.cos(faz)
-    if (cf == 0):
-        b = 0.
-    else:
-        b = 2. * np.arctan2 (tu, cf)
+    b = np.where(cf == 0, 0., 2. * np.arctan2(tu, cf))
 
     cu = 1. / np.sqrt(1 + tu * tu)
     su = tu * cu
@@ -64,18 +63,24 @@ def _gccalc(lon, lat, azimuth, maxdist=None):
     c = (x * x / 4. + 1.) / c
     d = (0.375 * x * x - 1.) * x
     tu = s / (r * a * c)
-    y = tu
+    y = tu.copy()
     c = y + 1
-    while (np.abs (y - c) > EPS):
-        sy = np.sin(y)
-        cy = np.cos(y)
-        cz = np.cos(b + y)
-        e = 2. * cz * cz - 1.
-        c = y
-        x = e * cy
-        y = e + e - 1.
-        y = (((sy * sy * 4. - 3.) * y * cz * d / 6. + x) *
-            d / 4. - cz) * sy * d + tu
+    sy = np.zeros(y.shape)
+    cy = np.zeros(y.shape)
+    cz = np.zeros(y.shape)
+    e = np.zeros(y.shape)
+    active = np.abs(y - c) > EPS   # elements still iterating
+    while active.any():
+        ya, ba, da = y[active], b[active], d[active]
+        sy[active] = sya = np.sin(ya)
+        cy[active] = cya = np.cos(ya)
+        cz[active] = cza = np.cos(ba + ya)
+        e[active] = ea = 2. * cza * cza - 1.
+        c[active] = ya
+        yn = ea + ea - 1.
+        y[active] = (((sya * sya * 4. - 3.) * yn * cza * da / 6. + ea * cya) *
+                     da / 4. - cza) * sya * da + tu[active]
+        active = np.abs(y - c) > EPS
 
     b = cu * cy * cf - su * sy
     c = r * np.sqrt(sa * sa + b * b)
@@ -107,12 +112,9 @@ def circle(m, centerlon, centerlat, radius, *args, **kwargs):
 
     glon1 = centerlon
     glat1 = centerlat
-    X = []
-    Y = []
-    for azimuth in range(0, 360):
-        glon2, glat2, baz = _gccalc(glon1, glat1, azimuth, radius)
-        X.append(glon2)
-        Y.append(glat2)
+    glon2s, glat2s, bazs = _gccalc_array(glon1, glat1, np.arange(0, 360), radius)   # every azimuth at once
+    X = glon2s.tolist()
+    Y = glat2s.tolist()
     X.append(X[0])
     Y.append(Y[0])
 
@@ -148,8 +150,12 @@ def circle_wrap(m, centerlon, centerlat, radius, midlon, boundary, lon_diff_angd
     else:
         pos = "west"
 
+    glon2s, glat2s, bazs = _gccalc_array(glon1, glat1, np.arange(0, 360), radius)   # every azimuth at once
+    glon2s = glon2s.tolist()
+    glat2s = glat2s.tolist()
     for azimuth in range(0, 360):
-        glon2, glat2, baz = _gccalc(glon1, glat1, azimuth, radius)
+        glon2 = glon2s[azimuth]
+        glat2 = glat2s[azimuth]
 
         p1_lon_rad = math.radians(centerlon)
         p2_lon_rad = math.radians(glon2)
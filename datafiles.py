@@ -0,0 +1,388 @@
+# -*- coding: utf-8 -*-
+"""
+datafiles.py
+Written by Casey Luskin
+
+Code shared by the scripts that rewrite paleomagnetic data files in place, so that every copy of it stays the same.
+
+replacefile (see FILES) writes a file next to the old one and only replaces the old file once the new one is complete,
+so that a run that is stopped part way never leaves a half-written file behind.
+
+The backup store (see BACKUPS) backs up the original data files into numbered backup folders (e.g. "Backup1", "Backup2")
+before they are overwritten. An index file next to the backup folders (e.g. "Backup.index") holds the last backup
+number and the hash of every file already stored, so that unchanged files are not stored twice and the folder tree is
+never walked to find the next backup number.
+
+Measurement (see MEASUREMENTS) holds one demagnetization step read from a data file, and readrapidstep reads it from
+a step line of a RAPID Squid sample file.
+
+The site cache (see SITE CACHE) saves the parsed data files of a site to SITE.cache in the site folder, so that files
+which have not changed since they were last read or written are not parsed again.
+
+FixedWidthFormat (see FIXED WIDTH) writes and reads back the fixed-width lines of these data files, and RAPID FORMAT
+holds the line layouts of the RAPID Squid files written by Combine-Convert-Full and Fix-SQUID-Data.
+
+Used by Combine-Convert-Full.crl.python2.py, Fix-SQUID-Data.crl.python2_v2.py, Smooth-IRMAcquisition-Data.crl.python2_v2.py
+and Smooth-ThermSuscept-Data-2nd-Deriv.crl.python2_v2.py, and (for replacefile only) by workbookreader.py and
+EvaluatePoles+PrintPoleBasemaps+EqArea.py, which must be in the same folder as this file.
+
+For support, please contact Casey Luskin at caseyl@uj.ac.za or casey.luskin@gmail.com
+"""
+import os
+import re
+import hashlib
+import cPickle as pickle
+from shutil import copy
+
+
+####################### FILES #######################
+
+def replacefile(filename, writer, mode='wb'):
+    """
+    Calls writer(f) to write the new contents of a file to FILENAME.temp, then replaces the old file with it,
+    so that the old file is only replaced once the new one is complete.
+    """
+    f = open(filename + ".temp", mode)
+    writer(f)
+    f.close()
+    if os.path.isfile(filename):
+        os.remove(filename)
+    os.rename(filename + ".temp", filename)
+
+####################### BACKUPS #######################
+
+def filedigest(filename):
+    """ Returns the SHA-1 hash of a file """
+    digest = hashlib.sha1()
+    with open(filename,'rb') as f:
+        for block in iter(lambda: f.read(1048576), b''):
+            digest.update(block)
+    return(digest.hexdigest())
+
+def loadbackupindex(dirpath, prefix):
+    """
+    Loads PREFIX.index from dirpath, the index of the backup folders PREFIX1, PREFIX2, ... kept there.
+    Returns a dictionary holding the prefix, the last backup number and a table of hash: path of the
+    stored copy (relative to dirpath). Without an index, the last backup number is taken from the
+    folder names directly inside dirpath, so the folder tree is never walked.
+    """
+    backupindex = {"prefix":prefix, "last":0, "files":{}}
+    indexname = os.path.join(dirpath, prefix + ".index")
+    if os.path.isfile(indexname):
+        f = open(indexname,'r')
+        for line in f:
+            words = line.rstrip('\n').split('\t')
+            if len(words) != 2:
+                continue
+            if words[0] == "last":
+                try:
+                    backupindex["last"] = int(words[1])
+                except ValueError:
+                    pass
+            else:
+                backupindex["files"][words[0]] = words[1]
+        f.close()
+    else:
+        for name in os.listdir(dirpath):
+            if (prefix in name) and os.path.isdir(os.path.join(dirpath, name)):
+                backupnum_str = re.sub('[^0-9]', "", name)
+                if (backupnum_str != '') and (int(backupnum_str) > backupindex["last"]):
+                    backupindex["last"] = int(backupnum_str)
+    return(backupindex)
+
+def savebackupindex(dirpath, backupindex):
+    """ Saves the backup index to PREFIX.index in dirpath """
+    def writeindex(f):
+        f.write("last\t%d\n" % backupindex["last"])
+        for digest, storedpath in sorted(backupindex["files"].items()):
+            f.write("%s\t%s\n" % (digest, storedpath))
+    replacefile(os.path.join(dirpath, backupindex["prefix"] + ".index"), writeindex, 'w')
+
+def nextbackupdirname(dirpath, backupindex):
+    """ Reserves the next backup number in the index and returns its folder name """
+    backupindex["last"] = backupindex["last"] + 1
+    while os.path.exists(os.path.join(dirpath, backupindex["prefix"] + str(backupindex["last"]))):
+        backupindex["last"] = backupindex["last"] + 1
+    return(backupindex["prefix"] + str(backupindex["last"]))
+
+def backupfiles(dirpath, backupdirname, filenames, backupindex):
+    """
+    Creates the backup folder in dirpath and backs up the listed files into it. A file whose content
+    is already stored in an earlier backup is hardlinked to that copy; where hardlinks are not
+    available (e.g. Python 2 on Windows), it is copied like any other file, so every backup folder
+    always holds all of its files.
+    Returns the number of unchanged files that were hardlinked instead of copied.
+    """
+    backupdirpath = os.path.join(dirpath, backupdirname)
+    os.makedirs(backupdirpath)
+    unchangedcount = 0
+    for filename in filenames:
+        basename = os.path.basename(filename)
+        digest = filedigest(filename)
+        storedpath = backupindex["files"].get(digest)
+        if (storedpath != None) and os.path.isfile(os.path.join(dirpath, storedpath)):
+            try:
+                os.link(os.path.join(dirpath, storedpath), os.path.join(backupdirpath, basename))
+                unchangedcount = unchangedcount + 1
+            except (AttributeError, OSError): # no hardlinks on this system or drive
+                copy(filename, backupdirpath)
+        else:
+            copy(filename, backupdirpath)
+            backupindex["files"][digest] = os.path.join(backupdirname, basename)
+    return(unchangedcount)
+
+####################### MEASUREMENTS #######################
+
+stepsort_dict = {'NRM':1, 'AF':2, 'TT':3}
+onetokensteplist = ["NRM","AF1000"] # Step names that are never followed by a separate step level.
+
+class Measurement(object):
+    """ One demagnetization step of one sample, stored as typed fields """
+    __slots__ = ('steptype','steplevel','source','geogdec','geoginc','tiltdec','tiltinc','coredec','coreinc','intensity','error','dataline','sortkey')
+    def __init__(step, steptype, steplevel, source, geogdec, geoginc, tiltdec, tiltinc, coredec, coreinc, intensity, error, dataline):
+        step.steptype = steptype    # "NRM", "AF" or "TT"
+        step.steplevel = steplevel  # mT or degrees C; 0 for NRM
+        step.source = source        # "Squid", "Spinner" or "2G"
+        step.geogdec = geogdec
+        step.geoginc = geoginc
+        step.tiltdec = tiltdec
+        step.tiltinc = tiltinc
+        step.coredec = coredec
+        step.coreinc = coreinc
+        step.intensity = intensity
+        step.error = error
+        step.dataline = dataline    # the step as a line of a RAPID Squid sample file
+        step.sortkey = (stepsort_dict[steptype] * 100000) + steplevel # NRM first, then AF, then TT steps, each in order of step level.
+
+def parsestepname(dmagstep):
+    """
+    Returns the step type ("NRM", "AF" or "TT") and the step level of a demag step name
+    such as "NRM", "AF10", "TT200" or "TT200p".
+    """
+    dmagstep_mod = re.sub('[0-9]', '', dmagstep)
+    if dmagstep_mod in ["TT","Tp","T","T."]:
+        dmagstep_type = "TT"
+        dmagstep_num = int(re.sub('[^0-9]','', dmagstep))
+    elif dmagstep_mod in ["AF","AFp","A","Ap","A."]:
+        dmagstep_type = "AF"
+        dmagstep_num = int(re.sub('[^0-9]','', dmagstep))
+    elif dmagstep_mod in ["NRM","NRMp"]:
+        dmagstep_type = "NRM"
+        dmagstep_num = 0
+    else:
+        dmagstep_type = dmagstep_mod
+        dmagstep_num = 0
+    return(dmagstep_type, dmagstep_num)
+
+def splitsteptokens(dataline_list):
+    """
+    Returns the demag step name of a split RAPID Squid step line and the index of its first
+    value. Squid steps are written as "AF   5"; Spinner steps and NRM as one word.
+    """
+    if (dataline_list[0] in onetokensteplist) or ("p" in dataline_list[0]) or (re.sub('[0-9]', '', dataline_list[0]) in ["NRMp","Tp","T","T.","AFp","A","Ap","A."]):
+        return(dataline_list[0], 1)
+    else:
+        return(dataline_list[0] + dataline_list[1], 2)
+
+def readrapidstep(dataline, source):
+    """
+    Reads one step line of a RAPID Squid sample file into a Measurement:
+    step, geog dec/inc, tilt dec/inc, intensity, error, core dec/inc, then anything else.
+    Values that are missing or run together with their neighbours are left as None.
+    """
+    dataline_list = dataline.split()
+    dmagstep, valueindex = splitsteptokens(dataline_list)
+    dmagstep_type, dmagstep_num = parsestepname(dmagstep)
+    values = [None] * 8
+    for itemindex, item in enumerate(dataline_list[valueindex:valueindex + 8]):
+        try:
+            values[itemindex] = float(item)
+        except ValueError:
+            pass
+    return(Measurement(dmagstep_type, dmagstep_num, source, values[0], values[1], values[2], values[3], values[6], values[7], values[4], values[5], dataline))
+
+def measurementtuple(step):
+    """ Returns the fields of a Measurement as a plain tuple, in the order Measurement() takes them """
+    return(tuple([getattr(step, name) for name in Measurement.__slots__[:-1]]))
+
+####################### SITE CACHE #######################
+
+sitecache_version = 1
+
+def filesignature(filename):
+    """ Returns the size, modification time and SHA-1 hash of a file """
+    filestat = os.stat(filename)
+    with open(filename,'rb') as f:
+        digest = hashlib.sha1(f.read()).hexdigest()
+    return(filestat.st_size, filestat.st_mtime, digest)
+
+def loadsitecache(sitename):
+    """
+    Loads the parsed data files of a site from SITE.cache in the current folder.
+    Returns a dictionary of filename: (size, mtime, hash, extrakey, parsed data);
+    it is empty if there is no usable cache.
+    """
+    try:
+        with open(sitename + ".cache",'rb') as f:
+            cache = pickle.load(f)
+        if cache["version"] == sitecache_version:
+            return(cache["files"])
+    except Exception:
+        pass
+    return({})
+
+def savesitecache(sitename, cachefiles):
+    """ Saves the cache dictionary to SITE.cache, dropping files that no longer exist """
+    for filename in list(cachefiles):
+        if not(os.path.isfile(filename)):
+            del cachefiles[filename]
+    replacefile(sitename + ".cache", lambda f: pickle.dump({"version":sitecache_version, "files":cachefiles}, f, 2))
+
+def cachedparse(cachefiles, filename, parser, extrakey=None):
+    """
+    Returns parser(filename), reusing the cached result when the file has the same size
+    and either the same modification time or the same hash as when it was last parsed.
+    extrakey holds anything else the parsed result depends on.
+    """
+    filestat = os.stat(filename)
+    entry = cachefiles.get(filename)
+    digest = None
+    if (entry != None) and (entry[0] == filestat.st_size) and (entry[3] == extrakey):
+        if entry[1] == filestat.st_mtime:
+            return(entry[4])
+        digest = filesignature(filename)[2]
+        if entry[2] == digest:
+            cachefiles[filename] = (entry[0], filestat.st_mtime, entry[2], entry[3], entry[4])
+            return(entry[4])
+    parsed = parser(filename)
+    if digest == None:
+        digest = filesignature(filename)[2]
+    cachefiles[filename] = (filestat.st_size, filestat.st_mtime, digest, extrakey, parsed)
+    return(parsed)
+
+def storecachedparse(cachefiles, filename, parsed, extrakey=None):
+    """
+    Records the parsed data of a file that has just been written. The measurements come from
+    the program rather than from the text, so Spinner columns that run together keep their values.
+    """
+    filesize, filemtime, digest = filesignature(filename)
+    cachefiles[filename] = (filesize, filemtime, digest, extrakey, parsed)
+
+def readsamplefile(filename):
+    """
+    Reads a RAPID Squid sample file into its first line, its orientation line and a list of
+    (dataline, measurement tuple) pairs, one per step line. The tuple is None for empty lines
+    and for Spinner lines whose step name cannot be read.
+    """
+    samplefile = open(filename,'r')
+    firstline = samplefile.readline()
+    secondline = samplefile.readline()
+    steplist = []
+    for dataline in samplefile:
+        dataline_list = dataline.split()
+        if dataline_list == []:
+            steptuple = None
+        elif dataline_list[-1] == "JR6":
+            try:
+                steptuple = measurementtuple(readrapidstep(dataline, "Spinner"))
+            except (KeyError, ValueError, IndexError):
+                steptuple = None
+        elif dataline_list[-1] == "2G":
+            steptuple = measurementtuple(readrapidstep(dataline, "2G"))
+        else:
+            steptuple = measurementtuple(readrapidstep(dataline, "Squid"))
+        steplist.append((dataline, steptuple))
+    samplefile.close()
+    return((firstline, secondline, steplist))
+
+####################### FIXED WIDTH #######################
+
+class FixedWidthFormat(object):
+    """
+    A fixed-width line layout, compiled once into a format string and the column slices used to read it back.
+    fields is a list of literal strings and (name, width, align, conversion) tuples. A field is padded with
+    spaces to width characters, on the left for ">" and on the right for "<", and is never cut; a width of 0
+    writes the value as it is. A "+" field is padded on the left so that it and the text field before it
+    together fill width. conversion is "s" for text or a number format such as ".1f".
+    """
+    def __init__(layout, fields):
+        layout.names = []
+        layout.slices = []          # (name, start, end) of the fields parse() reads back
+        layout.sharedwidths = []    # (value index, width) of the "+" fields
+        formatstring = ""
+        column = 0                  # None once the columns depend on the values
+        fieldstart = None
+        restfield = None            # a last field of variable width takes the rest of the line
+        for field in fields:
+            if isinstance(field, str):
+                formatstring = formatstring + field.replace("%","%%")
+                if column != None:
+                    column = column + len(field)
+                continue
+            name, width, align, conversion = field
+            restfield = None
+            if align == "+":
+                formatstring = formatstring + "%*" + conversion
+                layout.sharedwidths.append((len(layout.names), width))
+                if fieldstart != None:
+                    column = fieldstart + width
+                fieldstart = None
+            elif width == 0:
+                formatstring = formatstring + "%" + conversion
+                if column != None:
+                    restfield = (name, column, None)
+                fieldstart = column
+                column = None
+            else:
+                fieldstart = column
+                if align == "<":
+                    formatstring = formatstring + "%-" + str(width) + conversion
+                else:
+                    formatstring = formatstring + "%" + str(width) + conversion
+                if column != None:
+                    layout.slices.append((name, column, column + width))
+                    column = column + width
+            layout.names.append(name)
+        if restfield != None:
+            layout.slices.append(restfield)
+        layout.formatstring = formatstring
+
+    def format(layout, values):
+        """ Returns one line from a tuple of values in field order """
+        if layout.sharedwidths:
+            values = list(values)
+            for valueindex, width in reversed(layout.sharedwidths):
+                values.insert(valueindex, max(width - len(values[valueindex - 1]), 0))
+            values = tuple(values)
+        return(layout.formatstring % values)
+
+    def formatlines(layout, rows):
+        """ Returns a list of lines, one per tuple of values, ready to be written in one go """
+        if layout.sharedwidths:
+            return([layout.format(values) for values in rows])
+        formatstring = layout.formatstring
+        return([formatstring % values for values in rows])
+
+    def parse(layout, line):
+        """
+        Returns a dictionary of field name: text for the fields at fixed columns, with the padding removed.
+        A last field of variable width is returned as it is, up to the end of the line.
+        """
+        fields = {}
+        for name, start, end in layout.slices:
+            if end == None:
+                fields[name] = line[start:]
+            else:
+                fields[name] = line[start:end].strip()
+        return(fields)
+
+####################### RAPID FORMAT #######################
+
+# Line layouts of the RAPID Squid files (see FIXED WIDTH):
+samsitelineformat = FixedWidthFormat([("latitude",5,">","s"), ("longitude",6,">","s"), ("declination",6,">","s")])
+sampleheaderformat = FixedWidthFormat([("mode",7,">","s"), ("coreplatestrike",6,">",".1f"), ("coreplatedip",6,">",".1f"), ("beddingstrike",6,">",".1f"), ("beddingdip",6,">",".1f"), ("fold",6,">","s"), "\n"])
+squidstepformat = FixedWidthFormat([("step",6,"<","s"), ("geogdec",6,">",".1f"), ("geoginc",6,">",".1f"), ("tiltdec",6,">",".1f"), ("tiltinc",6,">",".1f"), ("intensity",9,">","s"),
+                                    ("error",6,">","s"), ("coredec",6,">","s"), ("coreinc",6,">","s"), " ", ("rest",0,"<","s")])
+spinnerstepformat = FixedWidthFormat([("step",0,"<","s"), ("geogdec",10,"+","s"), ("geoginc",6,">","s"), ("tiltdec",6,">","s"), ("tiltinc",6,">","s"), "   ", ("intensity",0,"<","s"),
+                                      ("error",6,">","s"), ("coredec",4,">","s"), ("coreinc",6,">","s"), "   0.00E+00 0.00E+00 0.00E+00 JR6\n"]) # Core dec is 4 wide, as in the files written so far.
+jr6orientationformat = FixedWidthFormat([("specimen",41,"<","s"), ("coreplatestrike",3,">","s"), " ", ("coreplatedip",3,">","s"), " ", ("beddingstrike",3,">","s"), " ", ("beddingdip",3,">","s")])
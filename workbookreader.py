@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+workbookreader.py
+Written by Casey Luskin
+
+Reads whole sheets of the Excel workbooks used by these scripts in one call, as one list of values per column,
+instead of reading cells one at a time. Each sheet is described by a schema: a list of (name, column, kind), where
+kind says how the cells of that column are converted (see cellkinds below).
+
+readsheetsnapshot() keeps the columns read from a workbook in a snapshot file next to it (e.g. "paleomagdata.snapshot"),
+stamped with the size, modification time and hash of the workbook, so that the workbook is only opened and read again
+once it has changed.
+
+Used by EvaluatePoles+PrintPoleBasemaps+EqArea.py, MakeEq+PoleDiagrams.py, Findnearbypoles.crl.python2.py and
+Convert-Excel-Sites-and-Dips+Strikes-to-KML.crl.python2.py, which must be in the same folder as this file.
+
+For support, please contact Casey Luskin at caseyl@uj.ac.za or casey.luskin@gmail.com
+"""
+import os
+import hashlib
+import cPickle as pickle
+from xlrd import open_workbook
+from datafiles import replacefile
+
+
+class SheetError(Exception):
+    """ Simple error class """
+    def __init__(self, value):
+        self.value = value
+    def __str__(self):
+        return repr(self.value)
+
+####################### SCHEMAS #######################
+
+# Poledata columns shared by "Prior Work--Quickbook.xlsx" and "paleomagdata.xlsx".
+poledatacolumns = [("unit",1,"text"), ("component",2,"text"),
+                   ("polelat",4,"number"), ("polelon",5,"number"), ("antipolelat",6,"number"), ("antipolelon",7,"number"),
+                   ("polea95",8,"optionalnumber"), ("polek",9,"optionalnumber"), ("poledp",10,"optionalnumber"), ("poledm",11,"optionalnumber"),
+                   ("paleolat",12,"number"), ("dec",13,"number"), ("inc",14,"number"),
+                   ("directiona95",15,"a95"), ("directionk",16,"optionalnumber"),
+                   ("ageprefix",17,"numbertext"), ("age",18,"roundint"), ("agepostfix",19,"inttext"),
+                   ("pmagref",20,"text"), ("ageref",21,"text")]
+
+# Poledata sheet of "Prior Work--Quickbook.xlsx", as read by Evaluate Poles.
+quickbookpoledata = poledatacolumns + [("code",3,"text"),
+                                       ("vvq1",22,"int"), ("vvq2",23,"int"), ("vvq3",24,"int"), ("vvq4",25,"int"), ("vvq5",26,"int"), ("vvq6",27,"int"),
+                                       ("vvqtotal",29,"int")]
+
+# Poledata sheet of "paleomagdata.xlsx", as read by MakeEq + Pole Diagrams. Rows with 0 in the first column are left out.
+paleomagpoledata = [("use",0,"use"), ("color",3,"text")] + poledatacolumns
+
+# Poledata sheet of the earlier layout of "Prior Work--Quickbook.xlsx", as read by Find Nearby Poles.
+nearbypoledata = [("unit",0,"raw"), ("component",1,"raw"),
+                  ("polelat",3,"number"), ("polelon",4,"number"), ("antipolelat",5,"number"), ("antipolelon",6,"number"),
+                  ("polea95",7,"raw"), ("poledp",9,"raw"), ("poledm",10,"raw"),
+                  ("age",16,"roundint"), ("ref",19,"raw"), ("plateid",27,"raw"), ("platerevision",28,"raw")]
+
+# Sites and Measurements sheets of "Site-Dip-and-Dip-Directions.xlsx", as read by the KML converter.
+sitesdata = [("sitenum",0,"roundint"), ("sitename",1,"raw"), ("latitude",2,"raw"), ("longitude",3,"raw"),
+             ("dipdir",6,"raw"), ("dip",10,"raw"), ("structuralnotes",11,"raw"), ("sitenotes",12,"raw")]
+measurementsdata = [("measnum",0,"roundint"), ("latitude",1,"raw"), ("longitude",2,"raw"), ("dip",4,"roundint"), ("dipdir",5,"roundint"),
+                    ("uncorrecteddipdir",6,"raw"), ("deccorrection",7,"raw"), ("measurementOK",8,"raw"),
+                    ("dec_explanation",9,"raw"), ("tripnotes",10,"raw"), ("lithnotes",11,"raw")]
+
+####################### CELL KINDS #######################
+
+def textcell(value, blank):  # Text as a latin-1 string; numbers as str() shows them.
+    if isinstance(value, unicode):
+        return(value.encode('latin1'))
+    return(str(value))
+
+def numbercell(value, blank):
+    return(float(value))
+
+def optionalnumbercell(value, blank):  # A blank cell (or 0) gives blank.
+    if value:
+        return(float(value))
+    return(blank)
+
+def a95cell(value, blank):  # A blank a95 is 0, and the text "90" is read as just over 90 so that the whole hemisphere is drawn.
+    if value == "":
+        return(0)
+    if value == "90":
+        return(90.0001)
+    return(float(value))
+
+def numbertextcell(value, blank):  # A number as str() shows a float (e.g. "2.0"), or the text in the cell.
+    try:
+        return(str(float(value)))
+    except (TypeError, ValueError):
+        return(value.encode('latin1'))
+
+def inttextcell(value, blank):  # A number as a whole number (e.g. "5"), or the text in the cell.
+    try:
+        return(str(int(float(value))))
+    except (TypeError, ValueError):
+        return(value.encode('latin1'))
+
+def intcell(value, blank):
+    return(int(value))
+
+def roundintcell(value, blank):
+    return(int(round(value)))
+
+def rawcell(value, blank):  # The value as xlrd gives it: a float, or unicode text.
+    return(value)
+
+cellkinds = {"text":textcell, "number":numbercell, "optionalnumber":optionalnumbercell, "a95":a95cell, "numbertext":numbertextcell,
+             "inttext":inttextcell, "int":intcell, "roundint":roundintcell, "raw":rawcell, "use":rawcell}
+
+####################### READER #######################
+
+def readsheet(wb, sheetname, schema, blank="", rowkeys=False):
+    """
+    Reads every row below the header of the sheet named sheetname in the xlrd workbook wb, one whole column at a time.
+    Returns a dictionary of lists, one for each column in schema, with the cells converted according to their kind;
+    blank is what optionalnumber cells give for a blank cell. If the schema has a "use" column, rows with 0 in it are
+    left out. If rowkeys is True, the "rowkey" list holds a hash of every cell of each row, so edited rows can be found.
+    A missing sheet gives empty lists.
+    """
+    columns = dict([(name, []) for name, col, kind in schema])
+    if rowkeys:
+        columns["rowkey"] = []
+    sheets = [sheet for sheet in wb.sheets() if sheet.name == sheetname]
+    if sheets == []:
+        return(columns)
+    sheet = sheets[0]
+    if sheet.nrows < 2:
+        return(columns)
+    for name, col, kind in schema:
+        if col >= sheet.ncols:
+            raise SheetError("The %s sheet has no column %s (%s)." % (sheetname, col + 1, name))
+
+    cells = [sheet.col_values(col, 1) for col in range(sheet.ncols)]   # every cell below the header, one list per column
+    userows = None
+    for name, col, kind in schema:
+        if kind == "use":
+            userows = [row for row, value in enumerate(cells[col]) if value != 0]
+    if userows != None:
+        cells = [[column[row] for row in userows] for column in cells]
+
+    for name, col, kind in schema:
+        convert = cellkinds[kind]
+        columns[name] = [convert(value, blank) for value in cells[col]]
+    if rowkeys:
+        columns["rowkey"] = [hashlib.sha1(repr(list(rowitems))).hexdigest() for rowitems in zip(*cells)]
+    return(columns)
+
+####################### SNAPSHOTS #######################
+
+snapshot_version = 1
+
+def snapshotname(excelfilename):  # Returns the name of the snapshot file of a workbook.
+    return(os.path.splitext(excelfilename)[0] + ".snapshot")
+
+def workbookhash(excelfilename):
+    with open(excelfilename,'rb') as f:
+        return(hashlib.sha1(f.read()).hexdigest())
+
+def loadsnapshot(excelfilename):
+    """
+    Loads the snapshot of a workbook. Returns a dictionary with the size, modification time and hash of the workbook
+    when the snapshot was made, and the columns read from it; or None if there is no usable snapshot.
+    """
+    try:
+        with open(snapshotname(excelfilename),'rb') as f:
+            snapshot = pickle.load(f)
+        if snapshot["version"] == snapshot_version:
+            return(snapshot)
+    except Exception:
+        pass
+    return(None)
+
+def savesnapshot(excelfilename, snapshot):
+    """ Saves the snapshot of a workbook """
+    snapshot["version"] = snapshot_version
+    replacefile(snapshotname(excelfilename), lambda f: pickle.dump(snapshot, f, 2))
+
+def readsheetsnapshot(excelfilename, sheetname, schema, blank="", rowkeys=False):
+    """
+    Returns the same columns as readsheet() for the workbook file excelfilename, taking them from its snapshot if the
+    workbook has the same size and either the same modification time or the same hash as when the snapshot was made.
+    Otherwise the workbook is opened and read, and the snapshot is made again. A snapshot holds the columns of every
+    sheet and schema read from the workbook, so scripts reading the same workbook differently can share it.
+    """
+    filestat = os.stat(excelfilename)
+    readkey = repr((sheetname, schema, blank, rowkeys))
+    snapshot = loadsnapshot(excelfilename)
+    changed = False
+    if (snapshot == None) or (snapshot["size"] != filestat.st_size):
+        snapshot = None
+    elif snapshot["mtime"] != filestat.st_mtime:
+        if snapshot["hash"] != workbookhash(excelfilename):
+            snapshot = None
+        else:   # the workbook was saved again without changes
+            snapshot["mtime"] = filestat.st_mtime
+            changed = True
+    if snapshot == None:
+        snapshot = {"size":filestat.st_size, "mtime":filestat.st_mtime, "hash":workbookhash(excelfilename), "sheets":{}}
+    if not(readkey in snapshot["sheets"]):
+        snapshot["sheets"][readkey] = readsheet(open_workbook(excelfilename), sheetname, schema, blank, rowkeys)
+        changed = True
+    if changed:
+        savesnapshot(excelfilename, snapshot)
+    return(snapshot["sheets"][readkey])
+
+def rowcount(columns):  # Returns the number of rows read by readsheet.
+    return(max([len(column) for column in columns.values()] + [0]))